@@ -3,3 +3,13 @@ from rest_framework.permissions import BasePermission
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
         return request.user.role == 'ADMIN'
+
+class CanViewExpenses(BasePermission):
+    """Admins and expense users, same as admin_or_expense_user_required"""
+    def has_permission(self, request, view):
+        return request.user.role in ['ADMIN', 'EXPENSE_USER']
+
+class CanViewIncome(BasePermission):
+    """Admins and income users, same as admin_or_income_user_required"""
+    def has_permission(self, request, view):
+        return request.user.role in ['ADMIN', 'INCOME_USER']
@@ -1,3 +1,25 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from arthsutra.testing import QueryBudgetMixin
+
+from .models import User
+
+
+class UserListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+        User.objects.bulk_create(
+            User(username=f'user{number}', role=('EXPENSE_USER', 'INCOME_USER')[number % 2]) for number in range(10)
+        )
+
+    def test_user_list_query_budget(self):
+        self.client.force_login(self.admin)
+
+        with self.assertMaxQueries(4):
+            response = self.client.get(reverse('user_list'))
+
+        self.assertEqual(response.context['total_users'], 11)
+        self.assertEqual(response.context['admin_count'], 1)
+        self.assertEqual(response.context['expense_count'], 5)
@@ -2,6 +2,7 @@ from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Count, Q
 from .models import User
 from .decorators import admin_required
 from django import forms
@@ -42,18 +43,17 @@ def logout_view(request):
 def user_list(request):
     users = User.objects.all().order_by('username')
 
-    # Calculate statistics
-    total_users = users.count()
-    admin_count = users.filter(role='ADMIN').count()
-    expense_count = users.filter(role='EXPENSE_USER').count()
-    income_count = users.filter(role='INCOME_USER').count()
+    # Calculate statistics in one query
+    stats = User.objects.aggregate(
+        total_users=Count('id'),
+        admin_count=Count('id', filter=Q(role='ADMIN')),
+        expense_count=Count('id', filter=Q(role='EXPENSE_USER')),
+        income_count=Count('id', filter=Q(role='INCOME_USER')),
+    )
 
     context = {
         'users': users,
-        'total_users': total_users,
-        'admin_count': admin_count,
-        'expense_count': expense_count,
-        'income_count': income_count,
+        **stats,
     }
 
     return render(request, 'accounts/user_list.html', context)
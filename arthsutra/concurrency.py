@@ -0,0 +1,57 @@
+"""
+Concurrent ORM queries for async views.
+
+Database connections belong to a thread, and the async ORM runs every query
+through sync_to_async() in one shared thread, so it still sends them one
+after another. run_concurrently() runs each callable in a bounded thread
+pool instead, where every thread has a connection of its own, and awaits them
+together: a page waits for its slowest query, not for the sum of them.
+
+CONCURRENT_QUERY_WORKERS caps the threads, and so the extra connections, per
+process. Pool threads outlive requests, so before every query they close
+connections the way Django does between requests: broken ones, and ones
+older than CONN_MAX_AGE, e.g. before MySQL's wait_timeout drops them. The
+next query reconnects, and runs the CONN_HEALTH_CHECKS check if enabled.
+With the default CONN_MAX_AGE of 0 that is a new connection per query.
+Below 2 the callables run one by one on the request's thread, which is also
+what tests need to see the data of their transaction.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .profiling import profile_queries
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='arthsutra-query')
+        return _executor
+
+
+def _run(query):
+    close_old_connections()
+    with profile_queries():
+        return query()
+
+
+async def run_concurrently(queries):
+    """Run ``{name: callable}`` at the same time and return ``{name: result}``"""
+    workers = getattr(settings, 'CONCURRENT_QUERY_WORKERS', 4)
+    if workers < 2:
+        return {name: await sync_to_async(query)() for name, query in queries.items()}
+
+    executor = _get_executor(workers)
+    results = await asyncio.gather(*(
+        sync_to_async(_run, thread_sensitive=False, executor=executor)(query) for query in queries.values()
+    ))
+    return dict(zip(queries, results))
@@ -0,0 +1,109 @@
+"""
+Read replica routing for reporting and listing traffic.
+
+Views wrapped in ``read_from_replica`` read the models of REPLICA_APPS from
+the REPLICA_DATABASE alias; everything else, all writes and reads inside a
+transaction stay on ``default``. The alias is held in a context variable, so
+concurrent requests in threads or tasks do not see each other's choice.
+
+Replicas lag behind the primary. After a POST (a create, edit or upload)
+ReplicaPinningMiddleware sets a short-lived cookie and the user's next
+requests read from the primary until it expires, so they see their own
+changes. Responses streamed after the view returns read from the primary.
+Async views are supported; the alias is copied into the threads their
+queries run in (see arthsutra.concurrency).
+"""
+import functools
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'arthsutra_primary'
+
+_read_alias = ContextVar('arthsutra_read_alias', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, None when reads are not routed"""
+    return getattr(settings, 'REPLICA_DATABASE', '') or None
+
+
+def reading_from_replica():
+    return _read_alias.get() is not None
+
+
+def _view_alias(request):
+    alias = replica_alias()
+    if alias is None or PIN_COOKIE in request.COOKIES:
+        return None
+    return alias
+
+
+def read_from_replica(view):
+    """Run ``view`` with its reads on the replica, unless the user is pinned to the primary"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_alias.set(_view_alias(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_alias.set(_view_alias(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or model._meta.app_label not in getattr(settings, 'REPLICA_APPS', []):
+            return None
+        # Reads inside a transaction on the primary must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Rows read from the replica are saved to the primary
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == replica_alias():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica rows are copies of primary rows
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema from the primary
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Pin a user to the primary for REPLICA_PIN_SECONDS after each request that may write"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10), httponly=True, samesite='Lax',
+            )
+        return response
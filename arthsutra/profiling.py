@@ -0,0 +1,120 @@
+"""
+Per-request SQL profiling.
+
+QueryProfilingMiddleware wraps every database connection for the duration of
+a request, then writes one JSON line to the ``arthsutra.sql`` logger with the
+query count, total DB time, every repeated statement and the slowest
+statements. A statement repeated SQL_PROFILING_DUPLICATE_THRESHOLD times or
+more is the usual sign of an N+1 loop and is logged as a warning.
+
+Connections belong to a thread, so the profile of the current request is
+also kept in a context variable: the pool threads of
+arthsutra.concurrency.run_concurrently() wrap their own connections with it
+through profile_queries(), and their queries count towards the request.
+
+Enable it with ARTHSUTRA_SQL_PROFILING=1 (see settings).
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('arthsutra.sql')
+
+# QueryProfile of the request being profiled, if any
+_current_profile = ContextVar('arthsutra_sql_profile', default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """SQL with literals and IN (...) lists collapsed, so repeats of one statement compare equal"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryProfile:
+    """Execute wrapper that times every statement run through it"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((context['connection'].alias, sql, time.perf_counter() - start))
+
+    @property
+    def total_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    def duplicates(self):
+        """(fingerprint, count) of statements run more than once, most repeated first"""
+        counts = Counter(fingerprint(sql) for _, sql, _ in self.queries)
+        return [(sql, count) for sql, count in counts.most_common() if count > 1]
+
+    def slowest(self, limit):
+        return sorted(self.queries, key=lambda query: query[2], reverse=True)[:limit]
+
+
+@contextmanager
+def profile_queries():
+    """Time the queries of this thread's connections into the current request's profile, if there is one"""
+    profile = _current_profile.get()
+    with ExitStack() as stack:
+        if profile is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+        yield
+
+
+class QueryProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slowest = getattr(settings, 'SQL_PROFILING_SLOWEST', 5)
+        self.duplicate_threshold = getattr(settings, 'SQL_PROFILING_DUPLICATE_THRESHOLD', 5)
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        token = _current_profile.set(profile)
+        try:
+            with profile_queries():
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+
+        self.log(request, response, profile)
+        return response
+
+    def log(self, request, response, profile):
+        duplicates = profile.duplicates()
+        suspects = [count for _, count in duplicates if count >= self.duplicate_threshold]
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': len(profile.queries),
+            'db_time_ms': round(profile.total_time * 1000, 2),
+            'duplicates': [{'sql': sql, 'count': count} for sql, count in duplicates],
+            'slowest': [
+                {'alias': alias, 'sql': sql, 'time_ms': round(duration * 1000, 2)}
+                for alias, sql, duration in profile.slowest(self.slowest)
+            ],
+            'n_plus_one': bool(suspects),
+        }
+        logger.log(logging.WARNING if suspects else logging.INFO, json.dumps(record))
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,6 +57,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-request SQL profiling, logged as JSON lines to the arthsutra.sql logger
+SQL_PROFILING = os.environ.get('ARTHSUTRA_SQL_PROFILING') == '1'
+SQL_PROFILING_SLOWEST = int(os.environ.get('ARTHSUTRA_SQL_PROFILING_SLOWEST', 5))
+SQL_PROFILING_DUPLICATE_THRESHOLD = int(os.environ.get('ARTHSUTRA_SQL_PROFILING_DUPLICATE_THRESHOLD', 5))
+
+if SQL_PROFILING:
+    MIDDLEWARE.insert(0, 'arthsutra.profiling.QueryProfilingMiddleware')
+
 ROOT_URLCONF = 'arthsutra.urls'
 
 TEMPLATES = [
@@ -75,6 +84,18 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'arthsutra.wsgi.application'
 
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+}
+
 AUTH_USER_MODEL = 'accounts.User'
 
 
@@ -96,6 +117,79 @@ DATABASES = {
     }
 }
 
+# Read replica for the reporting and listing views, see arthsutra.db_router.
+# ARTHSUTRA_REPLICA_HOST adds a 'replica' alias with the default credentials on
+# another host; ARTHSUTRA_REPLICA_DB names the alias to use instead (e.g. one
+# added by a local settings module). Unset, every query goes to default.
+
+REPLICA_DATABASE = os.environ.get('ARTHSUTRA_REPLICA_DB', '')
+if os.environ.get('ARTHSUTRA_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['ARTHSUTRA_REPLICA_HOST'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASE = REPLICA_DATABASE or 'replica'
+
+# Apps whose models are read from the replica, and seconds a user keeps
+# reading from the primary after a request that may have written
+REPLICA_APPS = ['finance']
+REPLICA_PIN_SECONDS = int(os.environ.get('ARTHSUTRA_REPLICA_PIN_SECONDS', 10))
+
+DATABASE_ROUTERS = ['arthsutra.db_router.ReplicaRouter']
+
+if REPLICA_DATABASE:
+    MIDDLEWARE.append('arthsutra.db_router.ReplicaPinningMiddleware')
+
+
+# Cache
+# ARTHSUTRA_CACHE_BACKEND=file shares entries between worker processes,
+# the default local-memory cache is per process (and what tests use).
+
+if os.environ.get('ARTHSUTRA_CACHE_BACKEND', 'locmem') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('ARTHSUTRA_CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'arthsutra',
+        }
+    }
+
+# Seconds a per-role dashboard stays cached, changes invalidate it earlier
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('ARTHSUTRA_DASHBOARD_CACHE_TIMEOUT', 300))
+
+
+# Async views
+# Under ASGI (arthsutra/asgi.py turns ARTHSUTRA_ASYNC_VIEWS on) the dashboard
+# and reports pages run their independent queries at the same time, on up to
+# CONCURRENT_QUERY_WORKERS threads (and database connections) per process.
+
+ASYNC_VIEWS = os.environ.get('ARTHSUTRA_ASYNC_VIEWS') == '1'
+CONCURRENT_QUERY_WORKERS = int(os.environ.get('ARTHSUTRA_CONCURRENT_QUERY_WORKERS', 4))
+
+
+# Background jobs
+# Queues polled by `manage.py process_uploads`, dotted paths to uploads.jobs.JobQueue objects
+
+BACKGROUND_JOB_QUEUES = [
+    'uploads.jobs.upload_queue',
+    'reports.jobs.export_queue',
+]
+
+# Seconds a job may stay PROCESSING before it is taken for one whose worker
+# died (crash, OOM kill) and marked FAILED
+BACKGROUND_JOB_TIMEOUT = int(os.environ.get('ARTHSUTRA_BACKGROUND_JOB_TIMEOUT', 3 * 60 * 60))
+
+# Processes per upload that validate chunks while earlier ones are written,
+# 0 reads, validates and writes one chunk after another (see uploads.pipeline)
+UPLOAD_PIPELINE_WORKERS = int(os.environ.get('ARTHSUTRA_UPLOAD_PIPELINE_WORKERS', 0))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -137,4 +231,33 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # Media files (User uploads)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Logging
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        # ARTHSUTRA_SQL_PROFILING_LOG=<path> writes the JSON lines to a file instead of stderr
+        'sql_profile': {
+            'class': 'logging.FileHandler',
+            'filename': os.environ['ARTHSUTRA_SQL_PROFILING_LOG'],
+            'formatter': 'message',
+        } if os.environ.get('ARTHSUTRA_SQL_PROFILING_LOG') else {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'arthsutra.sql': {
+            'handlers': ['sql_profile'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,24 @@
+"""Test helpers shared by the apps' tests.py"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from .profiling import fingerprint
+
+
+class QueryBudgetMixin:
+    """TestCase mixin failing a test when a block runs more queries than its budget"""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as captured:
+            yield captured
+
+        executed = len(captured.captured_queries)
+        if executed > budget:
+            statements = '\n'.join(
+                f'{number}. {fingerprint(query["sql"])}'
+                for number, query in enumerate(captured.captured_queries, start=1)
+            )
+            self.fail(f'{executed} queries executed, budget is {budget}:\n{statements}')
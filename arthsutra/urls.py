@@ -15,19 +15,26 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path, include
-from reports.views import dashboard
+from django.urls import path, re_path, include
+from reports.views import adashboard, dashboard
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.conf.urls.static import static
 
+# ASGI deployments serve the async dashboard, see settings.ASYNC_VIEWS
+dashboard_view = adashboard if settings.ASYNC_VIEWS else dashboard
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', login_required(dashboard), name='dashboard'),
+    path('', login_required(dashboard_view), name='dashboard'),
     path('accounts/', include('accounts.urls')),
     path('finance/', include('finance.urls')),
     path('reports/', include('reports.urls')),
     path('uploads/', include('uploads.urls')),
+
+    # Read-only JSON API, versioned in the path
+    re_path(r'^api/(?P<version>v1)/finance/', include('finance.api_urls')),
+    re_path(r'^api/(?P<version>v1)/reports/', include('reports.api_urls')),
 ]
 
 # Serve media files during development
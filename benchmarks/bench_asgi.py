@@ -0,0 +1,155 @@
+"""
+Dashboard and reports page latency under an ASGI server.
+
+    python benchmarks/bench_asgi.py --requests 200 --concurrency 8
+    python benchmarks/bench_asgi.py --query-delay 5
+
+Starts uvicorn (``pip install uvicorn``) on arthsutra.asgi twice against the
+benchmark database: once serving the sync views (ARTHSUTRA_ASYNC_VIEWS=0),
+once the async ones that run their queries concurrently. Each server gets
+the same requests as a benchmark admin, with the dashboard cache off so
+every request queries the database, and the median and p95 latency are
+reported per page.
+
+SQLite answers within the process, so its queries cost almost nothing to
+wait for. --query-delay adds a fixed delay to every query (see
+benchmarks/latency.py), like the round trip to a MySQL server, which is
+where running them concurrently pays off. Fill the database first with
+run_benchmarks.py or point ARTHSUTRA_BENCH_DB at an existing dataset.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from _django import ROOT, setup
+
+setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY  # noqa: E402
+from django.contrib.sessions.backends.db import SessionStore  # noqa: E402
+
+from accounts.models import User  # noqa: E402
+
+PAGES = {
+    'dashboard': '/',
+    'reports_view': '/reports/reports/',
+}
+
+
+def session_cookie():
+    """A session of the benchmark admin, as a Cookie header value"""
+    user, _ = User.objects.get_or_create(username='benchmark', defaults={'role': 'ADMIN'})
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(async_views, args):
+    port = free_port()
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+        'PYTHONPATH': str(ROOT),
+        'ARTHSUTRA_ASYNC_VIEWS': '1' if async_views else '0',
+        'ARTHSUTRA_DASHBOARD_CACHE_TIMEOUT': '0',
+        'ARTHSUTRA_CONCURRENT_QUERY_WORKERS': str(args.workers),
+    }
+    if args.query_delay:
+        env['ARTHSUTRA_BENCH_QUERY_DELAY_MS'] = str(args.query_delay)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'arthsutra.asgi:application', '--port', str(port), '--log-level', 'warning'],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit('uvicorn exited while starting, see its output above')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    sys.exit('uvicorn did not start listening within 30 seconds')
+
+
+def fetch(url, cookie):
+    request = urllib.request.Request(url, headers={'Cookie': cookie})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=120) as response:
+        response.read()
+        if response.url != url:
+            raise RuntimeError(f'{url} redirected to {response.url}, the session was not accepted')
+    return (time.perf_counter() - started) * 1000
+
+
+def measure(url, cookie, args):
+    fetch(url, cookie)  # warm-up, first connections and template loading
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        started = time.perf_counter()
+        latencies = sorted(pool.map(lambda _: fetch(url, cookie), range(args.requests)))
+        elapsed = time.perf_counter() - started
+    return {
+        'median_ms': statistics.median(latencies),
+        'p95_ms': latencies[max(int(len(latencies) * 0.95) - 1, 0)],
+        'requests_per_s': len(latencies) / elapsed,
+    }
+
+
+def run(label, async_views, cookie, args):
+    server, base = start_server(async_views, args)
+    try:
+        results = {}
+        for name, path in PAGES.items():
+            results[name] = measure(base + path, cookie, args)
+            print(f'{label:<6} {name:<14} median {results[name]["median_ms"]:>9.1f} ms  '
+                  f'p95 {results[name]["p95_ms"]:>9.1f} ms  {results[name]["requests_per_s"]:>7.1f} req/s')
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100, help='Timed requests per page and server')
+    parser.add_argument('--concurrency', type=int, default=4, help='Requests in flight at once')
+    parser.add_argument('--workers', type=int, default=4, help='CONCURRENT_QUERY_WORKERS of the async server')
+    parser.add_argument('--query-delay', type=float, default=0, help='Milliseconds added to every query')
+    args = parser.parse_args()
+
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        sys.exit('uvicorn is not installed: pip install uvicorn')
+
+    cookie = session_cookie()
+    sync = run('sync', False, cookie, args)
+    concurrent = run('async', True, cookie, args)
+
+    print('\nMedian latency, sync -> async:')
+    for name in PAGES:
+        before, after = sync[name]['median_ms'], concurrent[name]['median_ms']
+        print(f'  {name:<14} {before:>9.1f} ms -> {after:>9.1f} ms  ({before / max(after, 1e-9):.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
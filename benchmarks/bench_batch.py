@@ -0,0 +1,112 @@
+"""
+Wall time of a month-end batch of uploads, one worker against several.
+
+    python benchmarks/bench_batch.py --files 8 --rows 20000 --workers 4
+
+Queues a batch like the upload form does for a ZIP archive: one department
+file first, then expense and income files that reference its departments by
+name. The batch is processed by ``manage.py process_uploads --once``, first
+with one worker, then with --workers, against a copy of the benchmark
+database so the dataset stays untouched. Each run gets files of its own, so
+the second one is not skipped as re-uploaded rows.
+
+With enough cores the parallel wall time approaches the department file
+plus the slowest of the others; SQLite serialises the writes of the
+workers, so the MySQL server of a deployment gains more than shown here.
+"""
+
+import argparse
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from _django import ROOT, setup
+
+
+def write_batch(directory, run, files, rows):
+    """The department file and ``files`` expense/income files of one run, in queueing order"""
+    directory = Path(directory) / f'run-{run}'
+    directory.mkdir()
+    names = [f'Batch Department {number}' for number in range(files)]
+    batch = [('DEPARTMENT', directory / 'departments.csv', [['name'], *([name] for name in names)])]
+
+    # Each run books into a year of its own
+    start = date(2000 + run, 1, 1)
+    for number in range(files):
+        file_type, text_column, text = (
+            ('EXPENSE', 'expense_type', 'Medical Supplies') if number % 2 == 0 else ('INCOME', 'service_type', 'Consultation')
+        )
+        content = [['department', text_column, 'amount', 'date']]
+        content += [
+            [names[number], text, f'{100 + row % 5000}.50', start + timedelta(days=row % 365)] for row in range(rows)
+        ]
+        batch.append((file_type, directory / f'{file_type.lower()}-{number}.csv', content))
+
+    for _, path, content in batch:
+        with open(path, 'w', newline='') as handle:
+            csv.writer(handle).writerows(content)
+    return [(file_type, path) for file_type, path, _ in batch]
+
+
+def run_batch(label, batch, workers, user):
+    from django.core.files import File
+
+    from uploads.models import UploadedFile
+
+    ids = []
+    for file_type, path in batch:
+        with open(path, 'rb') as handle:
+            ids.append(UploadedFile.objects.create(user=user, file=File(handle, name=path.name), file_type=file_type).pk)
+
+    started = time.perf_counter()
+    worker = subprocess.run(
+        [sys.executable, 'manage.py', 'process_uploads', '--workers', str(workers), '--once', '--poll-interval', '0.2'],
+        cwd=ROOT, env=os.environ, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if worker.returncode:
+        sys.exit(worker.stderr)
+
+    uploads = list(UploadedFile.objects.filter(pk__in=ids))
+    failed = [upload for upload in uploads if upload.status != 'PROCESSED']
+    if failed:
+        sys.exit(f'{len(failed)} uploads did not finish: {failed[0].error_message or failed[0].status}')
+    durations = [(upload.finished_at - upload.started_at).total_seconds() for upload in uploads]
+    print(f'{label:<10} {workers} worker(s)  wall {wall:>7.1f} s  sum of files {sum(durations):>7.1f} s  '
+          f'slowest file {max(durations):>6.1f} s')
+    return wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=8, help='Expense and income files per batch')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows per expense/income file')
+    parser.add_argument('--workers', type=int, default=4, help='Upload workers of the parallel run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.environ.get('ARTHSUTRA_BENCH_DB', str(ROOT / 'benchmarks' / 'bench.sqlite3'))
+        database = Path(directory) / 'batch.sqlite3'
+        if os.path.exists(source):
+            shutil.copyfile(source, database)
+        os.environ['ARTHSUTRA_BENCH_DB'] = str(database)
+        os.environ['ARTHSUTRA_BENCH_MEDIA_ROOT'] = str(Path(directory) / 'media')
+        setup()
+
+        from accounts.models import User
+
+        user, _ = User.objects.get_or_create(username='benchmark', defaults={'role': 'ADMIN'})
+        print(f'Batch of 1 department file and {args.files} files of {args.rows} rows, on {os.cpu_count()} CPU(s)')
+        serial = run_batch('serial', write_batch(directory, 0, args.files, args.rows), 1, user)
+        parallel = run_batch('parallel', write_batch(directory, 1, args.files, args.rows), args.workers, user)
+        print(f'\nParallel batch {serial / max(parallel, 1e-9):.2f}x faster')
+
+
+if __name__ == '__main__':
+    main()
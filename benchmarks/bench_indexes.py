@@ -0,0 +1,102 @@
+"""
+Query plans and timings of the hot Expense/Income queries with and without
+the date indexes added in finance migration 0002.
+
+    python benchmarks/bench_indexes.py --rows 2000000
+
+The dataset is generated once into benchmarks/bench.sqlite3 and reused by
+later runs that ask for the same number of rows or fewer.
+"""
+
+import argparse
+import time
+from datetime import date, timedelta
+
+from _django import setup
+
+setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from finance.models import Department, Expense, Income  # noqa: E402
+from finance.synthetic import generate  # noqa: E402
+
+
+def queries(model):
+    today = date.today()
+    month_start = today.replace(day=1)
+    year_ago = today - timedelta(days=365)
+    department_id = Department.objects.order_by('id').values_list('id', flat=True).first()
+    return {
+        'monthly_sum': lambda: model.objects.filter(date__range=[month_start, today]).aggregate(Sum('amount')),
+        'department_month': lambda: model.objects.filter(
+            department_id=department_id, date__range=[month_start, today]
+        ).aggregate(Sum('amount')),
+        'department_group_year': lambda: list(
+            model.objects.filter(date__range=[year_ago, today]).values('department').annotate(total=Sum('amount'))
+        ),
+        'latest_page': lambda: list(model.objects.order_by('-date')[:50]),
+    }
+
+
+def explain(sql):
+    prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}')
+        return [' | '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+def measure(model, repeat):
+    results = {}
+    for name, run in queries(model).items():
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+        # Captured SQL has its parameters inlined, explain the exact statement that ran
+        results[name] = (min(timings), explain(captured.captured_queries[-1]['sql']))
+    return results
+
+
+def set_indexes(model, enabled):
+    with connection.schema_editor() as schema_editor:
+        for index in model._meta.indexes:
+            if enabled:
+                schema_editor.add_index(model, index)
+            else:
+                schema_editor.remove_index(model, index)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000000, help='Rows per table')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per query, the best is reported')
+    args = parser.parse_args()
+
+    print(f'Generating {args.rows} rows per table ...')
+    generate(rows=args.rows, loans=0)
+
+    for model in (Expense, Income):
+        set_indexes(model, enabled=False)
+        before = measure(model, args.repeat)
+        set_indexes(model, enabled=True)
+        after = measure(model, args.repeat)
+
+        print(f'\n== {model.__name__} ({model.objects.count()} rows) ==')
+        for name in before:
+            before_time, before_plan = before[name]
+            after_time, after_plan = after[name]
+            print(f'\n{name}: {before_time * 1000:.1f} ms -> {after_time * 1000:.1f} ms '
+                  f'({before_time / max(after_time, 1e-9):.1f}x)')
+            print('  before:', *before_plan, sep='\n    ')
+            print('  after:', *after_plan, sep='\n    ')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Boot time and memory of a web worker.
+
+    python benchmarks/bench_startup.py --repeat 10
+    python benchmarks/bench_startup.py --baseline /tmp/arthsutra-before
+
+Each run starts a fresh interpreter that does what a WSGI worker does before
+its first request: django.setup(), build the WSGI application and load the
+URLconf with every view module. It reports the wall time of the whole
+process, the boot time measured inside it, peak RSS and which of pandas,
+NumPy and openpyxl got imported.
+
+Without --baseline the comparison is a worker that imports pandas, NumPy and
+openpyxl up front, as the upload and finance views used to. --baseline boots
+another checkout instead, e.g. one made with
+``git worktree add /tmp/arthsutra-before <commit>``.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from _django import ROOT
+
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+BOOT = '''
+import json, resource, sys, time
+started = time.perf_counter()
+for name in {preload!r}:
+    __import__(name)
+import django
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import resolve
+resolve('/')
+boot_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{
+    'boot_ms': boot_ms,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def boot(root, preload=()):
+    """Boot one worker from the checkout at ``root`` and return its measurements"""
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+        'PYTHONPATH': str(root),
+    }
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', BOOT.format(preload=tuple(preload), heavy=HEAVY_MODULES)],
+        cwd=root, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def measure(label, root, preload, repeat):
+    runs = [boot(root, preload) for _ in range(repeat)]
+    summary = {
+        'process_ms': statistics.median(run['process_ms'] for run in runs),
+        'boot_ms': statistics.median(run['boot_ms'] for run in runs),
+        'max_rss_mb': max(run['max_rss_mb'] for run in runs),
+        'loaded': runs[-1]['loaded'],
+    }
+    print(f'{label:<10} process {summary["process_ms"]:>8.1f} ms  boot {summary["boot_ms"]:>8.1f} ms  '
+          f'RSS {summary["max_rss_mb"]:>7.1f} MB  loaded: {", ".join(summary["loaded"]) or "-"}')
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Workers booted per variant')
+    parser.add_argument('--baseline', help='Another checkout to compare against')
+    args = parser.parse_args()
+
+    if args.baseline:
+        before = measure('baseline', Path(args.baseline).resolve(), (), args.repeat)
+    else:
+        before = measure('eager', ROOT, HEAVY_MODULES, args.repeat)
+    after = measure('current', ROOT, (), args.repeat)
+
+    print(f'\nBoot {before["boot_ms"] / max(after["boot_ms"], 1e-9):.2f}x faster, '
+          f'{before["max_rss_mb"] - after["max_rss_mb"]:.1f} MB less peak RSS per worker')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Simulated database round trips for the benchmark server.
+
+SQLite answers from the same process in microseconds, while the MySQL
+server (or replica) of a deployment is a network hop away. Listed in
+INSTALLED_APPS by benchmarks/settings.py when ARTHSUTRA_BENCH_QUERY_DELAY_MS
+is set, this app makes every query on every connection wait that long first.
+"""
+import os
+import time
+
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def _delay(execute, sql, params, many, context):
+    time.sleep(float(os.environ['ARTHSUTRA_BENCH_QUERY_DELAY_MS']) / 1000)
+    return execute(sql, params, many, context)
+
+
+def _add_delay(sender, connection, **kwargs):
+    # The wrapper list outlives reconnects of the same DatabaseWrapper
+    if _delay not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_delay)
+
+
+class QueryLatencyConfig(AppConfig):
+    name = 'benchmarks.latency'
+    label = 'bench_latency'
+
+    def ready(self):
+        connection_created.connect(_add_delay)
@@ -0,0 +1,229 @@
+"""
+Timings of the hot views and the upload processors on a synthetic dataset.
+
+    python benchmarks/run_benchmarks.py --rows 1000000 --repeat 5
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<earlier run>.json
+
+Views are requested through the test client as an admin, processors import
+generated CSV files inside a transaction that is rolled back, so the dataset
+stays the same between runs. Each run is saved to benchmarks/results/ as JSON.
+"""
+
+import argparse
+import csv
+import functools
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from _django import ROOT, setup
+
+setup()
+
+import django  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection, transaction  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from accounts.models import User  # noqa: E402
+from arthsutra.profiling import QueryProfile  # noqa: E402
+from finance.models import Department, Expense, Income, Loan  # noqa: E402
+from finance.services import _schedule  # noqa: E402
+from finance.synthetic import generate  # noqa: E402
+from uploads.csv_processor import (  # noqa: E402
+    process_department_csv, process_expense_csv, process_income_csv, process_workbook,
+)
+from uploads.models import UploadedFile  # noqa: E402
+
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+
+
+def view_benchmarks(client):
+    loan_id = Loan.objects.order_by('-tenure_months', 'id').values_list('id', flat=True).first()
+
+    def get(url, before=None):
+        def run():
+            if before:
+                before()
+            response = client.get(url)
+            assert response.status_code == 200, f'{url} returned {response.status_code}'
+        return run
+
+    benchmarks = {
+        'dashboard': get(reverse('dashboard'), before=cache.clear),
+        'dashboard_cached': get(reverse('dashboard')),
+        'reports_view': get(reverse('reports_view')),
+        'finance_list': get(reverse('finance_list')),
+    }
+    if loan_id:
+        benchmarks['loan_emi_breakdown'] = get(reverse('loan_emi_breakdown', args=[loan_id]), before=_schedule.cache_clear)
+        benchmarks['loan_projection'] = get(reverse('loan_projection'))
+    return benchmarks
+
+
+def write_upload_files(directory, rows):
+    """Expense, income and department files of ``rows`` rows each"""
+    department_ids = list(Department.objects.values_list('id', flat=True))
+    start = date.today() - timedelta(days=365)
+    files = {}
+    for name, text_column, text in (('expense', 'expense_type', 'Medical Supplies'), ('income', 'service_type', 'Consultation')):
+        path = Path(directory) / f'{name}.csv'
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['department_id', text_column, 'amount', 'date'])
+            for number in range(rows):
+                writer.writerow([
+                    department_ids[number % len(department_ids)], text,
+                    f'{100 + number % 5000}.50', start + timedelta(days=number % 365),
+                ])
+        files[name] = path
+
+    path = Path(directory) / 'department.csv'
+    with open(path, 'w', newline='') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['name'])
+        for number in range(min(rows, 1000)):
+            writer.writerow([f'Benchmark Department {number}'])
+    files['department'] = path
+
+    # The same rows as one accounting workbook, with a sheet per file
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, name in (('Departments', 'department'), ('Expenses', 'expense'), ('Income', 'income')):
+        worksheet = workbook.create_sheet(title)
+        with open(files[name], newline='') as handle:
+            for row in csv.reader(handle):
+                worksheet.append(row)
+    path = Path(directory) / 'workbook.xlsx'
+    workbook.save(path)
+    files['workbook'] = path
+    return files
+
+
+def processor_benchmarks(user, files, pipeline_workers):
+    def process(processor, file_type, path):
+        def run():
+            with transaction.atomic():
+                uploaded_file = UploadedFile.objects.create(user=user, file=str(path), file_type=file_type)
+                processor(str(path), uploaded_file)
+                transaction.set_rollback(True)
+        return run
+
+    return {
+        'process_expense_csv': process(process_expense_csv, 'EXPENSE', files['expense']),
+        'process_income_csv': process(process_income_csv, 'INCOME', files['income']),
+        'process_department_csv': process(process_department_csv, 'DEPARTMENT', files['department']),
+        'process_workbook': process(process_workbook, 'WORKBOOK', files['workbook']),
+        'process_expense_pipelined': process(
+            functools.partial(process_expense_csv, workers=pipeline_workers), 'EXPENSE', files['expense'],
+        ),
+        'process_income_pipelined': process(
+            functools.partial(process_income_csv, workers=pipeline_workers), 'INCOME', files['income'],
+        ),
+    }
+
+
+def measure(run, repeat):
+    run()  # warm-up, imports and first connection
+    timings = []
+    for _ in range(repeat):
+        profile = QueryProfile()
+        with connection.execute_wrapper(profile):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+    return {
+        'min_ms': round(min(timings) * 1000, 2),
+        'median_ms': round(statistics.median(timings) * 1000, 2),
+        'mean_ms': round(statistics.mean(timings) * 1000, 2),
+        'runs': len(timings),
+        'queries': len(profile.queries),
+        'db_ms': round(profile.total_time * 1000, 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text())['benchmarks']
+    print(f'\nCompared with {baseline_path} (median):')
+    for name, result in results.items():
+        if name in baseline:
+            before, after = baseline[name]['median_ms'], result['median_ms']
+            print(f'  {name:<24} {before:>10.1f} ms -> {after:>10.1f} ms  ({before / max(after, 1e-9):.2f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='Expense and Income rows in the dataset, each')
+    parser.add_argument('--departments', type=int, default=20)
+    parser.add_argument('--loans', type=int, default=2000)
+    parser.add_argument('--upload-rows', type=int, default=50000, help='Rows per generated upload file')
+    parser.add_argument('--pipeline-workers', type=int, default=4, help='Validation processes of the pipelined uploads')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+    parser.add_argument('--only', help='Comma separated benchmark names')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    print(f'Preparing {args.rows} rows per table, {args.loans} loans ...')
+    generate(departments=args.departments, rows=args.rows, loans=args.loans)
+
+    user, _ = User.objects.get_or_create(username='benchmark', defaults={'role': 'ADMIN'})
+    client = Client()
+    client.force_login(user)
+
+    with tempfile.TemporaryDirectory() as directory:
+        benchmarks = {
+            **view_benchmarks(client),
+            **processor_benchmarks(user, write_upload_files(directory, args.upload_rows), args.pipeline_workers),
+        }
+        if args.only:
+            selected = args.only.split(',')
+            benchmarks = {name: run for name, run in benchmarks.items() if name in selected}
+
+        results = {}
+        for name, run in benchmarks.items():
+            results[name] = measure(run, args.repeat)
+            print(f'{name:<24} median {results[name]["median_ms"]:>10.1f} ms  '
+                  f'min {results[name]["min_ms"]:>10.1f} ms  {results[name]["queries"]} queries')
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': {
+            'departments': Department.objects.count(),
+            'expenses': Expense.objects.count(),
+            'incomes': Income.objects.count(),
+            'loans': Loan.objects.count(),
+            'upload_rows': args.upload_rows,
+        },
+        'benchmarks': results,
+    }
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    path = RESULTS_DIR / f'{datetime.now():%Y%m%d-%H%M%S}.json'
+    path.write_text(json.dumps(report, indent=2))
+    print(f'\nSaved {path}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
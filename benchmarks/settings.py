@@ -0,0 +1,41 @@
+"""
+Settings for the benchmark scripts.
+
+Benchmarks generate millions of rows, so they always run against their own
+SQLite file instead of the configured MySQL database. Point
+ARTHSUTRA_BENCH_DB at another path to keep several datasets around.
+"""
+
+import os
+
+from arthsutra.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('ARTHSUTRA_BENCH_DB', str(BASE_DIR / 'benchmarks' / 'bench.sqlite3')),
+        # Upload workers running in parallel wait for each other's writes
+        'OPTIONS': {'timeout': 60, 'transaction_mode': 'IMMEDIATE'},
+    }
+}
+
+# Uploaded files of the benchmarks, kept out of the application's media directory
+MEDIA_ROOT = os.environ.get('ARTHSUTRA_BENCH_MEDIA_ROOT', str(BASE_DIR / 'benchmarks' / 'media'))
+
+DEBUG = False
+
+# ARTHSUTRA_BENCH_REPLICA_DB=<path> reads the reporting views from a second
+# SQLite file, e.g. a copy of the benchmark database, to try replica routing
+if os.environ.get('ARTHSUTRA_BENCH_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['ARTHSUTRA_BENCH_REPLICA_DB'],
+    }
+    REPLICA_DATABASE = 'replica'
+    if 'arthsutra.db_router.ReplicaPinningMiddleware' not in MIDDLEWARE:
+        MIDDLEWARE = [*MIDDLEWARE, 'arthsutra.db_router.ReplicaPinningMiddleware']
+
+# ARTHSUTRA_BENCH_QUERY_DELAY_MS=<ms> makes every query wait, standing in for
+# the network round trip to a database server (see benchmarks/latency.py)
+if os.environ.get('ARTHSUTRA_BENCH_QUERY_DELAY_MS'):
+    INSTALLED_APPS = [*INSTALLED_APPS, 'benchmarks.latency.QueryLatencyConfig']
@@ -0,0 +1,116 @@
+"""
+Read-only JSON API (v1) for transactions, departments and loans.
+
+List endpoints select ``values()`` rows, never model instances, and page
+through them with the same keyset cursor as finance_list.
+"""
+
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.pagination import BasePagination
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from accounts.permissions import CanViewExpenses, CanViewIncome, IsAdmin
+from arthsutra.db_router import read_from_replica
+from .models import Department, Expense, Income, Loan
+from .pagination import PAGE_SIZE, InvalidCursor, keyset_page
+from .serializers import DepartmentSerializer, ExpenseSerializer, IncomeSerializer, LoanSerializer
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on the view's ``cursor_fields``, descending"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        fields = getattr(view, 'cursor_fields', ('id',))
+        try:
+            page_size = int(request.query_params.get('page_size', PAGE_SIZE))
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        try:
+            rows, self.next_cursor = keyset_page(queryset, request.query_params.get('cursor'), fields, page_size)
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return rows
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.next_cursor:
+            next_url = replace_query_param(self.request.build_absolute_uri(), 'cursor', self.next_cursor)
+        return Response({'next': next_url, 'results': data})
+
+
+def _parse_date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Expected a date in YYYY-MM-DD format.'})
+    return parsed
+
+
+def filter_transactions(queryset, params):
+    """Apply the ?date_from=, ?date_to= and ?department= filters"""
+    date_from = _parse_date_param(params, 'date_from')
+    date_to = _parse_date_param(params, 'date_to')
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+
+    department = params.get('department')
+    if department:
+        if not department.isdigit():
+            raise ValidationError({'department': 'Expected a department id.'})
+        queryset = queryset.filter(department_id=int(department))
+    return queryset
+
+
+@method_decorator(read_from_replica, name='dispatch')
+class TransactionListView(ListAPIView):
+    pagination_class = KeysetPagination
+    cursor_fields = ('date', 'id')
+    model = None
+    text_field = None
+
+    def get_queryset(self):
+        queryset = self.model.objects.values('id', 'department_id', 'department__name', self.text_field, 'amount', 'date')
+        return filter_transactions(queryset, self.request.query_params)
+
+
+class ExpenseListView(TransactionListView):
+    permission_classes = [IsAuthenticated, CanViewExpenses]
+    serializer_class = ExpenseSerializer
+    model = Expense
+    text_field = 'expense_type'
+
+
+class IncomeListView(TransactionListView):
+    permission_classes = [IsAuthenticated, CanViewIncome]
+    serializer_class = IncomeSerializer
+    model = Income
+    text_field = 'service_type'
+
+
+@method_decorator(read_from_replica, name='dispatch')
+class DepartmentListView(ListAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = DepartmentSerializer
+    pagination_class = KeysetPagination
+    queryset = Department.objects.values('id', 'name')
+
+
+@method_decorator(read_from_replica, name='dispatch')
+class LoanListView(ListAPIView):
+    permission_classes = [IsAuthenticated, IsAdmin]
+    serializer_class = LoanSerializer
+    pagination_class = KeysetPagination
+    queryset = Loan.objects.values('id', 'loan_name', 'principal', 'interest_rate', 'tenure_months', 'emi')
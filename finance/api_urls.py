@@ -0,0 +1,9 @@
+from django.urls import path
+from .api import ExpenseListView, IncomeListView, DepartmentListView, LoanListView
+
+urlpatterns = [
+    path('expenses/', ExpenseListView.as_view(), name='api_expenses'),
+    path('incomes/', IncomeListView.as_view(), name='api_incomes'),
+    path('departments/', DepartmentListView.as_view(), name='api_departments'),
+    path('loans/', LoanListView.as_view(), name='api_loans'),
+]
@@ -0,0 +1,104 @@
+"""
+Row fingerprints of Expense and Income, used to skip rows a file re-uploads.
+
+A fingerprint hashes (department, type, amount, date) plus the occurrence of
+that combination: the first identical row is occurrence 0, the next 1 and so
+on. Two genuinely identical transactions therefore keep distinct
+fingerprints, while uploading the same rows again reproduces fingerprints
+that already exist.
+"""
+import hashlib
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils.dateparse import parse_date
+
+# Fingerprints looked up per IN (...) query
+LOOKUP_BATCH_SIZE = 1000
+# Rows written per UPDATE batch by renumber_fingerprints
+UPDATE_BATCH_SIZE = 1000
+
+
+def row_key(department_id, text, amount, date):
+    """The values a fingerprint is built from, normalised to one string"""
+    if isinstance(date, str):
+        date = parse_date(date)
+    if isinstance(date, datetime):
+        date = date.date()
+    return f'{int(department_id)}|{str(text).strip()}|{Decimal(str(amount)):.2f}|{date.isoformat()}'
+
+
+def fingerprint(key, occurrence=0):
+    return hashlib.blake2b(f'{key}#{occurrence}'.encode(), digest_size=16).hexdigest()
+
+
+def fingerprints_for(rows, seen=None):
+    """
+    Fingerprints of ``rows`` of (department_id, text, amount, date), numbering
+    identical rows in order. ``seen`` counts the keys of earlier rows (e.g.
+    earlier chunks of the same file) and is updated in place.
+    """
+    seen = seen if seen is not None else Counter()
+    fingerprints = []
+    for row in rows:
+        key = row_key(*row)
+        fingerprints.append(fingerprint(key, seen[key]))
+        seen[key] += 1
+    return fingerprints
+
+
+def existing_fingerprints(model, fingerprints):
+    """The subset of ``fingerprints`` already stored for ``model``, one IN query per batch"""
+    fingerprints = list(fingerprints)
+    existing = set()
+    for start in range(0, len(fingerprints), LOOKUP_BATCH_SIZE):
+        existing.update(
+            model.objects.filter(fingerprint__in=fingerprints[start:start + LOOKUP_BATCH_SIZE])
+            .values_list('fingerprint', flat=True)
+        )
+    return existing
+
+
+def assign_fingerprint(instance, text_field):
+    """Set ``instance.fingerprint``, numbering it after the identical rows already stored"""
+    text = getattr(instance, text_field)
+    key = row_key(instance.department_id, text, instance.amount, instance.date)
+    identical = type(instance).objects.filter(
+        department_id=instance.department_id,
+        amount=Decimal(str(instance.amount)).quantize(Decimal('0.01')),
+        date=parse_date(key.rsplit('|', 1)[1]),
+        **{text_field: str(text).strip()},
+    )
+    if instance.pk:
+        identical = identical.exclude(pk=instance.pk)
+    taken = set(identical.values_list('fingerprint', flat=True))
+    occurrence = 0
+    while fingerprint(key, occurrence) in taken:
+        occurrence += 1
+    instance.fingerprint = fingerprint(key, occurrence)
+
+
+def renumber_fingerprints(queryset, text_field):
+    """
+    Recompute the fingerprints of every row in ``queryset``, numbering
+    identical rows by id. Used by migrations, which cannot call save().
+    """
+    rows = queryset.order_by('department_id', 'date', 'amount', 'id').only(
+        'id', 'department_id', text_field, 'amount', 'date'
+    )
+    # Identical rows share department, date and amount, so counting
+    # occurrences within one such group at a time is enough
+    group, seen, batch = None, Counter(), []
+    for row in rows.iterator(chunk_size=2000):
+        if (row.department_id, row.date, row.amount) != group:
+            group, seen = (row.department_id, row.date, row.amount), Counter()
+        key = row_key(row.department_id, getattr(row, text_field), row.amount, row.date)
+        row.fingerprint = fingerprint(key, seen[key])
+        seen[key] += 1
+        batch.append(row)
+        if len(batch) >= UPDATE_BATCH_SIZE:
+            queryset.model.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    if batch:
+        queryset.model.objects.bulk_update(batch, ['fingerprint'])
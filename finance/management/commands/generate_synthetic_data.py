@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from finance.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = 'Top the database up with synthetic departments, Expense/Income rows and loans for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=20, help='Departments to have in total')
+        parser.add_argument('--rows', type=int, default=1000000, help='Expense rows and Income rows to have in total, each')
+        parser.add_argument('--loans', type=int, default=2000, help='Loans to have in total')
+        parser.add_argument('--years', type=float, default=5, help='Years of history the rows are spread over')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, the same seed gives the same data')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Generating into {connection.settings_dict["NAME"]} ...')
+
+        def progress(model, created, total):
+            self.stdout.write(f'  {model.__name__}: {created}/{total}')
+
+        added = generate(
+            departments=options['departments'],
+            rows=options['rows'],
+            loans=options['loans'],
+            years=options['years'],
+            seed=options['seed'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Added ' + ', '.join(f'{count} {name}' for name, count in added.items())
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from finance.models import MonthlyDepartmentSummary
+from finance.summary import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the monthly department summary from all Expense and Income rows'
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {MonthlyDepartmentSummary.objects.count()} monthly summary rows'
+        ))
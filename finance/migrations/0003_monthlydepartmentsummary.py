@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_summary(apps, schema_editor):
+    MonthlyDepartmentSummary = apps.get_model('finance', 'MonthlyDepartmentSummary')
+    for kind, model_name in (('EXPENSE', 'Expense'), ('INCOME', 'Income')):
+        rows = (
+            apps.get_model('finance', model_name).objects.annotate(month=TruncMonth('date'))
+            .values('department_id', 'month')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by()
+        )
+        MonthlyDepartmentSummary.objects.bulk_create(
+            (MonthlyDepartmentSummary(kind=kind, **row) for row in rows.iterator()),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0002_expense_income_date_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyDepartmentSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('kind', models.CharField(choices=[('EXPENSE', 'Expense'), ('INCOME', 'Income')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('count', models.IntegerField(default=0)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finance.department')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'month'], name='summary_kind_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('department', 'month', 'kind'), name='unique_department_month_kind')],
+            },
+        ),
+        migrations.RunPython(populate_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_monthlydepartmentsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='start_date',
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+from finance.fingerprints import renumber_fingerprints
+
+
+def populate_fingerprints(apps, schema_editor):
+    for model_name, text_field in (('Expense', 'expense_type'), ('Income', 'service_type')):
+        renumber_fingerprints(apps.get_model('finance', model_name).objects.all(), text_field)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_loan_start_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='fingerprint',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='fingerprint',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=32),
+        ),
+        migrations.RunPython(populate_fingerprints, migrations.RunPython.noop),
+    ]
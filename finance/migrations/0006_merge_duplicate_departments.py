@@ -0,0 +1,61 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:03
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from finance.fingerprints import renumber_fingerprints
+from finance.names import department_key
+
+
+def merge_duplicate_departments(apps, schema_editor):
+    """
+    Merge departments whose names only differ by surrounding whitespace, case
+    or accents, i.e. that the unique index of 0007 would take for one, into
+    the oldest one, moving their transactions and rebuilding its summary rows.
+    """
+    Department = apps.get_model('finance', 'Department')
+    MonthlyDepartmentSummary = apps.get_model('finance', 'MonthlyDepartmentSummary')
+    transactions = (('EXPENSE', 'Expense', 'expense_type'), ('INCOME', 'Income', 'service_type'))
+
+    groups = defaultdict(list)
+    names = {}
+    for department_id, name in Department.objects.order_by('id').values_list('id', 'name'):
+        groups[department_key(name)].append(department_id)
+        names[department_id] = name.strip()
+
+    for keeper, *duplicates in groups.values():
+        name = names[keeper]
+        if not duplicates:
+            Department.objects.filter(pk=keeper).exclude(name=name).update(name=name)
+            continue
+
+        for kind, model_name, text_field in transactions:
+            model = apps.get_model('finance', model_name)
+            model.objects.filter(department_id__in=duplicates).update(department_id=keeper)
+            renumber_fingerprints(model.objects.filter(department_id=keeper), text_field)
+
+            MonthlyDepartmentSummary.objects.filter(department_id__in=[keeper, *duplicates], kind=kind).delete()
+            rows = (
+                model.objects.filter(department_id=keeper).annotate(month=TruncMonth('date'))
+                .values('department_id', 'month')
+                .annotate(total=Sum('amount'), count=Count('id'))
+                .order_by()
+            )
+            MonthlyDepartmentSummary.objects.bulk_create(MonthlyDepartmentSummary(kind=kind, **row) for row in rows)
+
+        Department.objects.filter(pk__in=duplicates).delete()
+        Department.objects.filter(pk=keeper).update(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_transaction_fingerprints'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_departments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_merge_duplicate_departments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='department',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
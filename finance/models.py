@@ -1,19 +1,52 @@
 from django.db import models
+from django.utils import timezone
+
+from .fingerprints import assign_fingerprint
 
 class Department(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
 
 class Expense(models.Model):
     department = models.ForeignKey(Department, on_delete=models.CASCADE)
     expense_type = models.CharField(max_length=100)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField()
+    # Identifies re-uploaded rows, see finance.fingerprints
+    fingerprint = models.CharField(max_length=32, db_index=True, editable=False, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='expense_date_idx'),
+            models.Index(fields=['department', 'date'], name='expense_dept_date_idx'),
+            models.Index(fields=['date', 'amount'], name='expense_date_amount_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        assign_fingerprint(self, 'expense_type')
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'fingerprint'}
+        super().save(*args, **kwargs)
 
 class Income(models.Model):
     department = models.ForeignKey(Department, on_delete=models.CASCADE)
     service_type = models.CharField(max_length=100)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField()
+    # Identifies re-uploaded rows, see finance.fingerprints
+    fingerprint = models.CharField(max_length=32, db_index=True, editable=False, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date'], name='income_date_idx'),
+            models.Index(fields=['department', 'date'], name='income_dept_date_idx'),
+            models.Index(fields=['date', 'amount'], name='income_date_amount_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        assign_fingerprint(self, 'service_type')
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'fingerprint'}
+        super().save(*args, **kwargs)
 
 class Loan(models.Model):
     loan_name = models.CharField(max_length=100)
@@ -21,3 +54,25 @@ class Loan(models.Model):
     interest_rate = models.FloatField()
     tenure_months = models.IntegerField()
     emi = models.DecimalField(max_digits=10, decimal_places=2)
+    start_date = models.DateField(default=timezone.localdate)  # first EMI falls due a month later
+
+class MonthlyDepartmentSummary(models.Model):
+    """Running totals of Expense/Income per department and month, maintained by finance.summary"""
+    KIND_CHOICES = (
+        ('EXPENSE', 'Expense'),
+        ('INCOME', 'Income'),
+    )
+
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    month = models.DateField()  # first day of the month
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['department', 'month', 'kind'], name='unique_department_month_kind'),
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'month'], name='summary_kind_month_idx'),
+        ]
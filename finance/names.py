@@ -0,0 +1,15 @@
+"""
+Department names compared the way the database compares them.
+
+The MySQL collation of Department.name ignores case, accents and trailing
+spaces, so 'ICU', 'icu ' and 'Medecine'/'Médecine' are one name to its unique
+index. department_key() folds names the same way for the lookups and merges
+done in Python, which would otherwise only match them exactly.
+"""
+import unicodedata
+
+
+def department_key(name):
+    """``name`` stripped, case folded and without accents"""
+    decomposed = unicodedata.normalize('NFKD', str(name).strip().casefold())
+    return ''.join(character for character in decomposed if not unicodedata.combining(character))
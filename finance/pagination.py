@@ -0,0 +1,91 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with ``WHERE (date, id) < (last_date, last_id)`` on an
+index instead of OFFSET, so page N costs the same as page 1.
+"""
+
+import base64
+import binascii
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = '|'.join(str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Malformed cursor')
+    if len(values) != size:
+        raise InvalidCursor('Malformed cursor')
+    return values
+
+
+def _after(fields, values):
+    """Rows strictly after ``values`` in descending ``fields`` order"""
+    condition = Q()
+    for position, field in enumerate(fields):
+        equal = {fields[i]: values[i] for i in range(position)}
+        condition |= Q(**equal, **{f'{field}__lt': values[position]})
+    return condition
+
+
+def _value(row, field):
+    return row[field] if isinstance(row, dict) else getattr(row, field)
+
+
+def keyset_page(queryset, cursor=None, fields=('date', 'id'), page_size=PAGE_SIZE):
+    """
+    One page of ``queryset`` ordered by ``fields`` descending.
+
+    Works on model and ``values()`` querysets as long as every field in
+    ``fields`` is selected. Returns ``(rows, next_cursor)``, ``next_cursor``
+    is None on the last page. Raises InvalidCursor for a tampered cursor.
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    queryset = queryset.order_by(*[f'-{field}' for field in fields])
+    if cursor:
+        try:
+            queryset = queryset.filter(_after(fields, decode_cursor(cursor, len(fields))))
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor('Malformed cursor')
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(_value(rows[-1], field) for field in fields)
+    return rows, next_cursor
+
+
+def keyset_iterator(queryset, fields=('date', 'id'), batch_size=5000):
+    """
+    Every row of ``queryset`` ordered by ``fields`` descending, fetched in
+    keyset batches of ``batch_size``.
+
+    Memory stays flat on every backend, MySQL drivers buffer a whole result
+    set even for ``.iterator()``, while each batch here is one indexed query.
+    """
+    queryset = queryset.order_by(*[f'-{field}' for field in fields])
+    batch = queryset
+    while True:
+        fetched = 0
+        for row in batch[:batch_size].iterator():
+            fetched += 1
+            yield row
+        if fetched < batch_size:
+            return
+        batch = queryset.filter(_after(fields, [_value(row, field) for field in fields]))
@@ -5,3 +5,40 @@ class LoanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Loan
         fields = '__all__'
+
+# The API serializes values() rows instead of model instances, the field
+# names below are the keys selected by the API querysets.
+
+class DepartmentSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+
+class ExpenseSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    department_id = serializers.IntegerField()
+    department = serializers.CharField(source='department__name')
+    expense_type = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    date = serializers.DateField()
+
+class IncomeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    department_id = serializers.IntegerField()
+    department = serializers.CharField(source='department__name')
+    service_type = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    date = serializers.DateField()
+
+class MonthlyTrendSerializer(serializers.Serializer):
+    month = serializers.CharField()
+    income = serializers.FloatField()
+    expense = serializers.FloatField()
+    profit = serializers.FloatField()
+
+class DepartmentTotalsSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    total_income = serializers.DecimalField(max_digits=16, decimal_places=2)
+    total_expense = serializers.DecimalField(max_digits=16, decimal_places=2)
+    income_count = serializers.IntegerField()
+    expense_count = serializers.IntegerField()
@@ -1,39 +1,370 @@
+import math
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from types import MappingProxyType
+
+from django.utils import timezone
+
+# NumPy is imported by the functions that need it, so importing the views
+# (and with them the URLconf) at worker start does not load it
+
+# Distinct (principal, rate, tenure) schedules kept in memory
+SCHEDULE_CACHE_SIZE = 256
+
+# Horizons offered by the portfolio projection, in months
+PROJECTION_HORIZONS = (12, 24, 36, 60, 120)
+
+# Upper bounds for the what-if EMI grid
+MAX_SCENARIO_STEPS = 1000
+MAX_SCENARIOS = 100000
+MAX_SCENARIO_TENURE = 1200
+# Monthly installments across the grid, the cost grows with these
+MAX_SCENARIO_INSTALLMENTS = 2000000
+
+AmortizationSchedule = namedtuple(
+    'AmortizationSchedule',
+    ['emi', 'principal_payment', 'interest_payment', 'remaining_balance',
+     'rows', 'total_principal', 'total_interest', 'total_amount'],
+)
+
+EmiScenarios = namedtuple(
+    'EmiScenarios',
+    ['principal', 'rate', 'months', 'emi', 'total_interest', 'total_amount'],
+)
+
+PortfolioProjection = namedtuple(
+    'PortfolioProjection',
+    ['months', 'emi', 'principal_payment', 'interest_payment', 'outstanding',
+     'active_loans', 'rows', 'total_principal', 'total_interest', 'total_amount'],
+)
+
+
 def calculate_emi(principal, rate, months):
+    if months <= 0:
+        raise ValueError('Tenure must be at least one month')
     r = rate / (12 * 100)
+    if r == 0:
+        return round(principal / months, 2)
     emi = (principal * r * (1 + r) ** months) / ((1 + r) ** months - 1)
     return round(emi, 2)
 
-def calculate_emi_breakdown(principal, rate, months):
+
+def _to_paise(values):
+    """Round a float array to whole paise, half up"""
+    import numpy as np
+    return np.floor(np.asarray(values) * 100 + 0.5).astype(np.int64)
+
+
+def _emi_paise(principal, rate, months):
     """
-    Calculate month-wise EMI breakdown showing principal, interest, and remaining balance
+    calculate_emi() of arrays of loans, in whole paise. Rounded half up like
+    _to_paise, except values within float error of half a paisa, which go
+    through round() itself so they tie the same way.
     """
-    r = rate / (12 * 100)  # Monthly interest rate
-    emi = calculate_emi(principal, rate, months)
+    import numpy as np
 
-    breakdown = []
-    remaining_balance = principal
+    r = rate / (12 * 100)
+    growth = (1 + r) ** months
+    with np.errstate(divide='ignore', invalid='ignore'):
+        emi = np.where(r == 0, principal / months, principal * r * growth / (growth - 1))
+    paise = _to_paise(emi)
+    scaled = emi * 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) <= np.abs(scaled) * 1e-12 + 1e-9
+    for position in np.flatnonzero(near_half):
+        paise.flat[position] = round(round(float(emi.flat[position]), 2) * 100)
+    return paise
 
-    for month in range(1, months + 1):
-        # Interest for this month
-        interest_payment = remaining_balance * r
 
-        # Principal for this month
-        principal_payment = emi - interest_payment
+def _to_decimal(paise):
+    return Decimal(int(paise)).scaleb(-2)
 
-        # Update remaining balance
-        remaining_balance -= principal_payment
 
-        # Ensure remaining balance doesn't go negative due to rounding
-        if remaining_balance < 0:
-            remaining_balance = 0
-            principal_payment = emi - interest_payment
+def _amortize(principal, rate, months, emi, length=None):
+    """
+    Schedules of several loans at once, as (loans x ``length``) arrays of
+    whole paise: EMI, principal, interest and remaining balance per month.
 
-        breakdown.append({
+    ``principal`` and ``rate`` are float arrays, ``months`` the tenures and
+    ``emi`` the EMIs in paise. ``length`` defaults to the longest tenure;
+    months past a loan's tenure are 0, its balance included.
+    """
+    import numpy as np
+
+    length = months.max() if length is None else length
+    r = rate[:, None] / (12 * 100)
+    n = months[:, None]
+    paid = np.arange(length)[None, :]
+    running = paid < n
+
+    # Opening balance of every month in closed form, no month-by-month loop
+    growth = (1 + r) ** paid
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        opening = principal[:, None] * growth - emi[:, None] / 100 * (growth - 1) / np.where(r == 0, 1, r)
+        interest_paise = np.where(running & (r != 0), _to_paise(np.maximum(opening, 0) * r), 0)
+
+    # Principal repaid so far can never exceed the loan, the last month takes
+    # whatever is left so the schedule adds up to the paisa
+    principal_paise = _to_paise(principal)[:, None]
+    emi_paise = np.where(running, emi[:, None], 0)
+    repaid = np.minimum(np.cumsum(emi_paise - interest_paise, axis=1), principal_paise)
+    repaid = np.where(paid >= n - 1, principal_paise, repaid)
+    principal_payment = np.diff(repaid, axis=1, prepend=0)
+    emi_paise = np.where(paid == n - 1, principal_payment + interest_paise, emi_paise)
+    return emi_paise, principal_payment, interest_paise, principal_paise - repaid
+
+
+def _schedule_paise(principal, rate, months):
+    """EMI, principal, interest and remaining-balance arrays of one schedule, in whole paise"""
+    import numpy as np
+
+    emi = _to_paise(calculate_emi(principal, rate, months))
+    arrays = tuple(
+        array[0].copy() for array in
+        _amortize(np.array([principal], dtype=float), np.array([rate], dtype=float), np.array([months]), np.array([emi]))
+    )
+    for array in arrays:
+        array.setflags(write=False)
+    return arrays
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def _schedule(principal, rate, months):
+    arrays = _schedule_paise(principal, rate, months)
+    emi_paise, principal_payment, interest_paise, remaining_balance = arrays
+
+    rows = tuple(
+        MappingProxyType({
             'month': month,
-            'emi': round(emi, 2),
-            'principal_payment': round(principal_payment, 2),
-            'interest_payment': round(interest_payment, 2),
-            'remaining_balance': round(remaining_balance, 2)
+            'emi': _to_decimal(month_emi),
+            'principal_payment': _to_decimal(month_principal),
+            'interest_payment': _to_decimal(month_interest),
+            'remaining_balance': _to_decimal(month_balance),
         })
+        for month, month_emi, month_principal, month_interest, month_balance
+        in zip(range(1, months + 1), *(array.tolist() for array in arrays))
+    )
+
+    return AmortizationSchedule(
+        *arrays,
+        rows=rows,
+        total_principal=_to_decimal(principal_payment.sum()),
+        total_interest=_to_decimal(interest_paise.sum()),
+        total_amount=_to_decimal(emi_paise.sum()),
+    )
+
+
+def amortization_schedule(principal, rate, months):
+    """
+    Month-wise amortization schedule, memoized per (principal, rate, tenure).
+
+    Amounts are computed as NumPy arrays of whole paise: the EMI, principal,
+    interest and remaining-balance columns, plus ``rows`` (read-only mappings
+    of Decimals for templates) and Decimal totals. The last month absorbs
+    rounding so the principal column sums exactly to the principal and the
+    balance ends at 0. The returned schedule is shared between callers, so its
+    arrays and rows cannot be written to.
+    """
+    return _schedule(round(float(principal), 2), float(rate), int(months))
+
+
+def scenario_values(start, stop, step, integer=False):
+    """Inclusive range ``start, start + step, ..., stop`` for one axis of the scenario grid"""
+    import numpy as np
 
-    return breakdown
+    try:
+        start, stop, step = (int(value) if integer else float(value) for value in (start, stop, step))
+    except ValueError:
+        raise ValueError('Range values must be numbers') from None
+    if not integer and not all(math.isfinite(value) for value in (start, stop, step)):
+        raise ValueError('Range values must be finite numbers')
+    if step <= 0:
+        raise ValueError('Step must be greater than zero')
+    if stop < start:
+        raise ValueError('Range end must not be below its start')
+    # Checked before dividing, a tiny step would overflow the count
+    if stop - start >= step * MAX_SCENARIO_STEPS:
+        raise ValueError(f'At most {MAX_SCENARIO_STEPS} values per range')
+    count = int((stop - start) / step + 1e-9) + 1
+    values = start + step * np.arange(count)
+    return values if integer else np.round(values, 2)
+
+
+def emi_scenarios(principals, rates, months):
+    """
+    EMI and total interest for every principal x rate x tenure combination.
+
+    The three axes are broadcast against each other, so the whole grid is a
+    handful of array operations per month of the longest tenure, on the
+    tenures still running; the cost follows the number of installments,
+    capped by MAX_SCENARIO_INSTALLMENTS. Totals add up the way
+    ``amortization_schedule`` does, interest rounded to paise per month and
+    the last installment adjusted, so a grid row matches the schedule of that
+    loan. Results are flattened principal-major (then rate, then tenure), in
+    whole paise.
+    """
+    import numpy as np
+
+    principals = np.asarray(principals, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    months = np.asarray(months, dtype=np.int64)
+    if (principals <= 0).any() or (rates < 0).any() or (months <= 0).any():
+        raise ValueError('Principal and tenure must be positive and rates not negative')
+    if principals.size * rates.size * months.size > MAX_SCENARIOS:
+        raise ValueError(f'At most {MAX_SCENARIOS} combinations per request')
+
+    if months.max() > MAX_SCENARIO_TENURE:
+        raise ValueError(f'Tenure must be at most {MAX_SCENARIO_TENURE} months')
+    if principals.size * rates.size * int(months.sum()) > MAX_SCENARIO_INSTALLMENTS:
+        raise ValueError(
+            f'At most {MAX_SCENARIO_INSTALLMENTS} monthly installments per request, use fewer or shorter tenures'
+        )
+
+    # Tenures in ascending order, so the tenures still running in a month are
+    # one contiguous slice of the grid; put back in the caller's order at the end
+    order = np.argsort(months, kind='stable')
+    months = months[order]
+    p = principals[:, None, None]
+    r = rates[None, :, None] / (12 * 100)
+    n = months[None, None, :]
+    emi = _emi_paise(p, rates[None, :, None], n)
+
+    # Interest of every month rounded to paise like _amortize does, one month
+    # at a time for the tenures still running: the months before the last,
+    # and the last
+    principal_paise = _to_paise(p)
+    emi_rupees = emi / 100
+    safe_r = np.where(r == 0, 1, r)
+    growth = (1 + r[0, :, 0, None]) ** np.arange(months[-1])
+    interest_before = np.zeros(emi.shape, dtype=np.int64)
+    interest_last = np.zeros(emi.shape, dtype=np.int64)
+    first = 0
+    for paid in range(months[-1]):
+        first = np.searchsorted(months, paid, side='right')
+        g = growth[None, :, paid, None]
+        # _to_paise(np.maximum(opening, 0) * r) in place, the same operations
+        # in the same order; at 0% the opening balance times r is 0 already
+        amount = emi_rupees[:, :, first:] * (g - 1)
+        amount /= safe_r
+        np.subtract(p * g, amount, out=amount)
+        np.maximum(amount, 0, out=amount)
+        amount *= r
+        amount *= 100
+        amount += 0.5
+        interest = np.floor(amount, out=amount).astype(np.int64)
+        # Tenures ending this month form the front of the slice
+        ending = np.searchsorted(months, paid + 1, side='right') - first
+        interest_last[:, :, first:first + ending] = interest[:, :, :ending]
+        interest_before[:, :, first + ending:] += interest[:, :, ending:]
+
+    # The last installment takes whatever principal is left, as in the schedule
+    repaid_before = np.minimum(emi * (n - 1) - interest_before, principal_paise)
+    total_amount = emi * (n - 1) + principal_paise - repaid_before + interest_last
+    total_interest = interest_before + interest_last
+
+    restore = np.argsort(order)
+    emi, total_interest, total_amount = (array[:, :, restore] for array in (emi, total_interest, total_amount))
+    n = n[:, :, restore]
+
+    shape = emi.shape
+    return EmiScenarios(
+        principal=np.broadcast_to(p, shape).ravel(),
+        rate=np.broadcast_to(rates[None, :, None], shape).ravel(),
+        months=np.broadcast_to(n, shape).ravel(),
+        emi=emi.ravel(),
+        total_interest=total_interest.ravel(),
+        total_amount=total_amount.ravel(),
+    )
+
+
+def calculate_emi_breakdown(principal, rate, months):
+    """
+    Calculate month-wise EMI breakdown showing principal, interest, and remaining balance
+    """
+    return [dict(row) for row in amortization_schedule(principal, rate, months).rows]
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def portfolio_projection(loans, months=60, start=None):
+    """
+    Combined month-by-month cash flow of every loan over the next ``months``.
+
+    ``loans`` is an iterable of (principal, annual rate, tenure, start date)
+    tuples, e.g. ``Loan.objects.values_list('principal', 'interest_rate',
+    'tenure_months', 'start_date')``. Installment ``i`` of a loan falls due
+    ``i`` months after its start date. All loans are amortized together as
+    one loans x months matrix by ``_amortize``, in whole paise like
+    ``amortization_schedule`` (the adjusted last installment included), each
+    row is shifted by its loan's start month and the columns summed.
+    ``outstanding`` is the balance left at the end of each month, counting
+    loans from the month they start.
+    """
+    import numpy as np
+
+    start = start or timezone.localdate()
+    first_month = _month_index(start)
+    month_starts = [
+        date(index // 12, index % 12 + 1, 1)
+        for index in range(first_month, first_month + months)
+    ]
+
+    loans = [loan for loan in loans if loan[2] > 0]
+    if not loans:
+        zeros = np.zeros(months, dtype=np.int64)
+        return _projection(month_starts, zeros, zeros, zeros, zeros, zeros)
+
+    principal, rate, tenure, started = zip(*loans)
+    principal = np.round(np.array(principal, dtype=float), 2)
+    rate = np.array(rate, dtype=float)
+    tenure = np.array(tenure, dtype=np.int64)
+    started = np.array([_month_index(day) for day in started], dtype=np.int64)
+
+    emi = _emi_paise(principal, rate, tenure)
+
+    # Schedule index of the installment due in each projected month, per loan;
+    # -1 is the month the loan starts, before its first installment
+    index = (first_month - started - 1)[:, None] + np.arange(months)
+    length = int(min(tenure.max(), max(index.max() + 1, 1)))
+    schedules = _amortize(principal, rate, tenure, emi, length)
+
+    active = (index >= 0) & (index < tenure[:, None])
+    position = np.clip(index, 0, length - 1)
+    emi_paid, principal_paid, interest_paid, balance = (
+        np.where(active, np.take_along_axis(array, position, axis=1), 0) for array in schedules
+    )
+    outstanding = balance + np.where(index == -1, _to_paise(principal)[:, None], 0)
+
+    return _projection(
+        month_starts,
+        emi_paid.sum(axis=0),
+        principal_paid.sum(axis=0),
+        interest_paid.sum(axis=0),
+        outstanding.sum(axis=0),
+        active.sum(axis=0),
+    )
+
+
+def _projection(month_starts, emi, principal_payment, interest_payment, outstanding, active_loans):
+    rows = tuple(
+        {
+            'month': month,
+            'emi': _to_decimal(month_emi),
+            'principal_payment': _to_decimal(month_principal),
+            'interest_payment': _to_decimal(month_interest),
+            'outstanding': _to_decimal(month_outstanding),
+            'active_loans': int(month_active),
+        }
+        for month, month_emi, month_principal, month_interest, month_outstanding, month_active
+        in zip(month_starts, *(array.tolist() for array in (emi, principal_payment, interest_payment, outstanding, active_loans)))
+    )
+    return PortfolioProjection(
+        month_starts, emi, principal_payment, interest_payment, outstanding, active_loans,
+        rows=rows,
+        total_principal=_to_decimal(principal_payment.sum()),
+        total_interest=_to_decimal(interest_payment.sum()),
+        total_amount=_to_decimal(emi.sum()),
+    )
@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import summary
+from .models import Expense, Income
+
+
+@receiver(pre_save, sender=Expense)
+@receiver(pre_save, sender=Income)
+def remember_previous_values(sender, instance, **kwargs):
+    """Keep the stored values of an edited row so the summary can move them"""
+    instance._summary_previous = None
+    if instance.pk:
+        instance._summary_previous = (
+            sender.objects.filter(pk=instance.pk).values_list('department_id', 'amount', 'date').first()
+        )
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+def add_to_summary(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_summary_previous', None)
+    if previous:
+        department_id, amount, date = previous
+        summary.record(instance, sign=-1, department_id=department_id, amount=amount, date=date)
+    summary.record(instance)
+
+
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+def remove_from_summary(sender, instance, **kwargs):
+    summary.record(instance, sign=-1)
@@ -0,0 +1,112 @@
+"""
+Maintenance of the MonthlyDepartmentSummary rollup.
+
+Single row changes are applied by the signal handlers in finance.signals,
+bulk uploads apply one delta per (department, month) per chunk and
+``python manage.py rebuild_monthly_summary`` recomputes everything from the
+raw Expense/Income rows, e.g. after a QuerySet.update() that bypassed both.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_date
+
+from .models import Expense, Income, MonthlyDepartmentSummary
+
+KIND_MODELS = {
+    'EXPENSE': Expense,
+    'INCOME': Income,
+}
+
+CENTS = Decimal('0.01')
+
+
+def kind_for(model):
+    return 'EXPENSE' if issubclass(model, Expense) else 'INCOME'
+
+
+def summary_for(kind):
+    return MonthlyDepartmentSummary.objects.filter(kind=kind)
+
+
+def month_of(value):
+    """First day of the month of a date, accepting the ISO strings views assign before saving"""
+    if isinstance(value, str):
+        value = parse_date(value)
+    return value.replace(day=1)
+
+
+def to_decimal(amount):
+    if isinstance(amount, Decimal):
+        return amount.quantize(CENTS)
+    return Decimal(str(amount)).quantize(CENTS)
+
+
+def apply_deltas(kind, deltas):
+    """
+    Add ``{(department_id, month): (amount, count)}`` to the summary.
+
+    Negative deltas only touch existing rows: when a department is deleted its
+    summary rows may already be gone by the time its transactions are.
+    """
+    for (department_id, month), (amount, count) in deltas.items():
+        rows = MonthlyDepartmentSummary.objects.filter(department_id=department_id, month=month, kind=kind)
+        updated = rows.update(total=F('total') + amount, count=F('count') + count)
+        if updated or count <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                MonthlyDepartmentSummary.objects.create(
+                    department_id=department_id, month=month, kind=kind, total=amount, count=count
+                )
+        except IntegrityError:
+            # A concurrent writer created the row first
+            rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def record(instance, sign=1, department_id=None, amount=None, date=None):
+    """Apply one Expense/Income row to the summary, ``sign=-1`` removes it"""
+    department_id = department_id if department_id is not None else instance.department_id
+    amount = to_decimal(amount if amount is not None else instance.amount)
+    month = month_of(date if date is not None else instance.date)
+    apply_deltas(kind_for(type(instance)), {(department_id, month): (sign * amount, sign)})
+
+
+def deltas_from_rows(rows):
+    """Per (department, month) deltas of cleaned upload rows of (department_id, amount, date)"""
+    deltas = defaultdict(lambda: (Decimal(0), 0))
+    for department_id, amount, row_date in rows:
+        key = (int(department_id), row_date.replace(day=1))
+        total, count = deltas[key]
+        deltas[key] = (total + to_decimal(amount), count + 1)
+    return deltas
+
+
+def rebuild():
+    """Recompute the whole summary from Expense and Income"""
+    with transaction.atomic():
+        MonthlyDepartmentSummary.objects.all().delete()
+        for kind, model in KIND_MODELS.items():
+            rows = (
+                model.objects.annotate(month=TruncMonth('date'))
+                .values('department_id', 'month')
+                .annotate(total=Sum('amount'), count=Count('id'))
+                .order_by()
+            )
+            MonthlyDepartmentSummary.objects.bulk_create(
+                (
+                    MonthlyDepartmentSummary(
+                        department_id=row['department_id'],
+                        month=row['month'],
+                        kind=kind,
+                        total=row['total'],
+                        count=row['count'],
+                    )
+                    for row in rows.iterator()
+                ),
+                batch_size=1000,
+            )
@@ -0,0 +1,177 @@
+"""
+Synthetic data for performance work.
+
+generate() tops the database up to a number of departments, Expense and
+Income rows and loans, so a dataset can be grown between benchmark runs and
+reused. Rows are drawn from a seeded NumPy generator:
+
+- every department has its own typical amount, amounts are log-normal around it
+- dates follow a slow upward trend, a yearly season and quieter weekends
+- loans mix common tenures with log-normal principals and 7-16% rates
+
+Rows are written with bulk_create, which skips the summary signals, so the
+monthly summary is rebuilt once at the end.
+"""
+from collections import Counter
+from datetime import date, timedelta
+
+import numpy as np
+
+from . import summary
+from .fingerprints import fingerprints_for
+from .models import Department, Expense, Income, Loan
+from .services import calculate_emi
+
+BATCH_SIZE = 10000
+
+DEPARTMENT_NAMES = (
+    'Cardiology', 'Radiology', 'Pharmacy', 'Emergency', 'Orthopedics', 'Pediatrics',
+    'Oncology', 'Neurology', 'Pathology', 'General Surgery', 'Gynecology', 'Dermatology',
+    'Nephrology', 'Ophthalmology', 'ENT', 'Anesthesiology', 'Physiotherapy', 'Dental',
+    'Psychiatry', 'Urology',
+)
+
+EXPENSE_TYPES = (
+    ('Medical Supplies', 0.30), ('Salaries', 0.20), ('Equipment Maintenance', 0.12),
+    ('Utilities', 0.10), ('Pharmaceuticals', 0.15), ('Housekeeping', 0.08), ('Training', 0.05),
+)
+
+SERVICE_TYPES = (
+    ('Consultation', 0.35), ('Diagnostics', 0.20), ('Surgery', 0.10), ('Inpatient Stay', 0.15),
+    ('Pharmacy Sales', 0.12), ('Therapy Session', 0.08),
+)
+
+LOAN_TENURES = (
+    (12, 0.10), (24, 0.12), (36, 0.18), (48, 0.10), (60, 0.20), (84, 0.10),
+    (120, 0.10), (180, 0.06), (240, 0.04),
+)
+
+# Amounts stay inside the DecimalField limits of Expense/Income and Loan
+MAX_AMOUNT = 10 ** 7
+MAX_PRINCIPAL = 5 * 10 ** 8
+
+
+def ensure_departments(count):
+    """Ids of at least ``count`` departments, creating the missing ones"""
+    number = Department.objects.count()
+    while (existing := Department.objects.count()) < count:
+        # Generated names may already be taken, keep numbering until enough are new
+        missing = count - existing
+        Department.objects.bulk_create(
+            (Department(name=_department_name(n)) for n in range(number, number + missing)),
+            ignore_conflicts=True,
+        )
+        number += missing
+    return list(Department.objects.order_by('id').values_list('id', flat=True))
+
+
+def _department_name(number):
+    name = DEPARTMENT_NAMES[number % len(DEPARTMENT_NAMES)]
+    return name if number < len(DEPARTMENT_NAMES) else f'{name} {number // len(DEPARTMENT_NAMES) + 1}'
+
+
+def _day_weights(days, start):
+    """Relative activity of each day: trend, season and weekends"""
+    offsets = np.arange(days)
+    trend = 0.6 + 0.4 * offsets / max(days - 1, 1)
+    season = 1 + 0.15 * np.sin(2 * np.pi * offsets / 365.25)
+    weekday = (start.weekday() + offsets) % 7
+    weights = trend * season * np.where(weekday >= 5, 0.6, 1.0)
+    return weights / weights.sum()
+
+
+def _choices(rng, options, size):
+    values, weights = zip(*options)
+    return rng.choice(np.array(values, dtype=object), size=size, p=np.array(weights) / sum(weights))
+
+
+def generate_transactions(model, rows, department_ids, years=5, rng=None, batch_size=BATCH_SIZE, progress=None):
+    """Add ``rows`` Expense or Income rows spread over the last ``years`` years"""
+    rng = rng if rng is not None else np.random.default_rng()
+    text_field, options, scale = (
+        ('expense_type', EXPENSE_TYPES, 7.5) if model is Expense else ('service_type', SERVICE_TYPES, 8.0)
+    )
+    start = date.today() - timedelta(days=int(years * 365))
+    days = (date.today() - start).days + 1
+    day_weights = _day_weights(days, start)
+    department_ids = np.array(department_ids)
+    # Typical amount per department, some departments bill far more than others
+    department_scale = rng.normal(scale, 0.6, size=len(department_ids))
+
+    created = 0
+    seen = Counter()
+    while created < rows:
+        size = min(batch_size, rows - created)
+        departments = rng.integers(len(department_ids), size=size)
+        amounts = np.clip(np.round(rng.lognormal(department_scale[departments], 0.9), 2), 1, MAX_AMOUNT - 1)
+        offsets = rng.choice(days, size=size, p=day_weights)
+        texts = _choices(rng, options, size)
+
+        batch = [
+            (int(department_ids[department]), text, f'{amount:.2f}', start + timedelta(days=int(offset)))
+            for department, amount, offset, text in zip(departments, amounts, offsets, texts)
+        ]
+        model.objects.bulk_create([
+            model(
+                department_id=department_id,
+                amount=amount,
+                date=row_date,
+                fingerprint=fingerprint,
+                **{text_field: text},
+            )
+            for (department_id, text, amount, row_date), fingerprint in zip(batch, fingerprints_for(batch, seen))
+        ])
+        created += size
+        if progress:
+            progress(model, created, rows)
+
+
+def generate_loans(count, years=5, rng=None):
+    """Add ``count`` loans started over the last ``years`` years"""
+    rng = rng if rng is not None else np.random.default_rng()
+    principals = np.clip(np.round(rng.lognormal(np.log(2 * 10 ** 6), 1.0, size=count), -3), 10 ** 4, MAX_PRINCIPAL)
+    rates = np.round(np.clip(rng.normal(10.5, 2, size=count), 7, 16), 2)
+    tenures = _choices(rng, LOAN_TENURES, count)
+    starts = rng.integers(int(years * 365), size=count)
+    today = date.today()
+
+    Loan.objects.bulk_create(
+        (
+            Loan(
+                loan_name=f'Loan {number + 1}',
+                principal=f'{principal:.2f}',
+                interest_rate=float(rate),
+                tenure_months=int(tenure),
+                emi=calculate_emi(float(principal), float(rate), int(tenure)),
+                start_date=today - timedelta(days=int(start)),
+            )
+            for number, (principal, rate, tenure, start) in enumerate(zip(principals, rates, tenures, starts))
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def generate(departments=20, rows=1000000, loans=2000, years=5, seed=42, progress=None):
+    """
+    Top the database up to ``departments`` departments, ``rows`` Expense and
+    ``rows`` Income rows, and ``loans`` loans. Returns the number of rows
+    added per model name.
+    """
+    rng = np.random.default_rng(seed)
+    department_ids = ensure_departments(departments)
+    added = {}
+
+    for model in (Expense, Income):
+        missing = rows - model.objects.count()
+        if missing > 0:
+            generate_transactions(model, missing, department_ids, years, rng, progress=progress)
+        added[model.__name__] = max(missing, 0)
+
+    missing = loans - Loan.objects.count()
+    if missing > 0:
+        generate_loans(missing, years, rng)
+    added[Loan.__name__] = max(missing, 0)
+
+    if added[Expense.__name__] or added[Income.__name__]:
+        summary.rebuild()
+    return added
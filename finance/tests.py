@@ -1,3 +1,409 @@
-from django.test import TestCase
+import importlib
+import io
+import time
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from arthsutra.testing import QueryBudgetMixin
+
+from .models import Department, Expense, Income, Loan, MonthlyDepartmentSummary
+from .services import (
+    MAX_SCENARIO_INSTALLMENTS, amortization_schedule, calculate_emi, calculate_emi_breakdown, emi_scenarios, portfolio_projection, scenario_values,
+)
+
+
+class FinanceListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """The first page of every table must not load departments row by row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        departments = Department.objects.bulk_create(Department(name=f'Department {number}') for number in range(5))
+        for number in range(60):
+            department = departments[number % len(departments)]
+            Expense.objects.create(department=department, expense_type='Supplies', amount=40, date=date(2024, 1, number % 28 + 1))
+            Income.objects.create(department=department, service_type='Consultation', amount=100, date=date(2024, 2, number % 28 + 1))
+        Loan.objects.bulk_create(
+            Loan(loan_name=f'Loan {number}', principal=100000, interest_rate=9, tenure_months=24, emi=4568.46)
+            for number in range(60)
+        )
+
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def test_finance_list_query_budget(self):
+        self.client.force_login(self.admin)
+
+        with self.assertMaxQueries(8):
+            response = self.client.get(reverse('finance_list'))
+
+        self.assertEqual(len(response.context['expenses']), 50)
+
+
+class DateIndexTests(TestCase):
+    """The date and department/date indexes exist in the migrated schema and serve range queries"""
+
+    expected = {
+        '{}_date_idx': ['date'],
+        '{}_dept_date_idx': ['department_id', 'date'],
+        '{}_date_amount_idx': ['date', 'amount'],
+    }
+
+    def test_migrations_create_the_indexes(self):
+        for model in (Expense, Income):
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            prefix = model._meta.model_name
+            for name, columns in self.expected.items():
+                name = name.format(prefix)
+                with self.subTest(index=name):
+                    self.assertIn(name, constraints)
+                    self.assertEqual(constraints[name]['columns'], columns)
+                    self.assertTrue(constraints[name]['index'])
+
+    def test_models_match_the_migrations(self):
+        call_command('makemigrations', 'finance', check=True, dry_run=True, stdout=io.StringIO())
+
+    def test_range_queries_use_the_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('other planners may prefer a table scan on a tiny test table')
+        department = Department.objects.create(name='Cardiology')
+        in_march = {'date__range': (date(2024, 3, 1), date(2024, 3, 31))}
+
+        self.assertIn('expense_date_idx', Expense.objects.filter(**in_march).explain())
+        self.assertIn('income_dept_date_idx', Income.objects.filter(department=department, **in_march).explain())
+
+
+class AmortizationScheduleTests(SimpleTestCase):
+    def assertAddsUp(self, schedule, principal_paise):
+        self.assertEqual(schedule.principal_payment.sum(), principal_paise)
+        self.assertEqual(schedule.remaining_balance[-1], 0)
+        self.assertEqual(schedule.total_principal * 100, principal_paise)
+        self.assertEqual((schedule.emi - schedule.principal_payment - schedule.interest_payment).tolist(), [0] * len(schedule.emi))
+        self.assertEqual(schedule.total_amount, schedule.total_principal + schedule.total_interest)
+
+    def test_principal_is_repaid_to_the_paisa(self):
+        for principal, rate, months in ((100000, 9, 24), (123456.78, 7.25, 60), (999.99, 18, 7), (5000000, 11, 240)):
+            with self.subTest(principal=principal, rate=rate, months=months):
+                self.assertAddsUp(amortization_schedule(principal, rate, months), round(principal * 100))
+
+    def test_zero_rate(self):
+        schedule = amortization_schedule(100000, 0, 7)
+
+        self.assertAddsUp(schedule, 10000000)
+        self.assertEqual(schedule.total_interest, 0)
+        self.assertEqual(schedule.emi.tolist(), [1428571] * 6 + [1428574])
+
+    def test_last_installment_absorbs_rounding(self):
+        schedule = amortization_schedule(100000, 9, 24)
+
+        self.assertEqual(schedule.emi[:-1].tolist(), [int(calculate_emi(100000, 9, 24) * 100)] * 23)
+        self.assertEqual(schedule.rows[-1]['emi'], Decimal('4568.56'))
+        self.assertEqual(schedule.rows[-2]['remaining_balance'], Decimal('4534.55'))
+        self.assertEqual(schedule.total_interest, Decimal('9643.37'))
+
+    def test_shared_schedule_cannot_be_changed_by_a_caller(self):
+        schedule = amortization_schedule(100000, 9, 24)
+        self.assertIs(amortization_schedule(Decimal('100000.00'), Decimal('9.00'), 24), schedule)
+
+        with self.assertRaises(ValueError):
+            schedule.emi[0] = 0
+        with self.assertRaises(TypeError):
+            schedule.rows[0]['emi'] = 0
+
+        breakdown = calculate_emi_breakdown(100000, 9, 24)
+        breakdown[0]['emi'] = 0
+        breakdown.pop()
+        self.assertEqual(len(calculate_emi_breakdown(100000, 9, 24)), 24)
+        self.assertEqual(calculate_emi_breakdown(100000, 9, 24)[0]['emi'], Decimal('4568.47'))
+
+
+class FinanceListRowsTests(TestCase):
+    """The JSON pages of finance_list must continue exactly where the last one ended"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cardiology = Department.objects.create(name='Cardiology')
+        # 120 rows on 3 dates, so every page boundary falls between rows of the same date
+        Expense.objects.bulk_create(
+            Expense(department=cardiology, expense_type='Supplies', amount=number, date=date(2024, 3, number % 3 + 1))
+            for number in range(120)
+        )
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def test_cursor_pages_through_equal_dates(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('finance_list'))
+        ids = [expense.id for expense in response.context['expenses']]
+        cursor = response.context['expenses_cursor']
+
+        while cursor:
+            response = self.client.get(reverse('finance_list_rows', args=['expenses']), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids += [row['id'] for row in data['rows']]
+            cursor = data['next_cursor']
+
+        self.assertEqual(ids, list(Expense.objects.order_by('-date', '-id').values_list('id', flat=True)))
+        self.assertEqual(len(set(ids)), 120)
+
+    def test_malformed_cursor_is_not_found(self):
+        self.client.force_login(self.admin)
+
+        for cursor in ('not a cursor', 'MjAyNC0wMy0wMQ==', 'bm90LWEtZGF0ZXwx'):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('finance_list_rows', args=['expenses']), {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class EmiScenarioTests(SimpleTestCase):
+    """Grid totals must add up like the month-wise schedule of the same loan"""
+
+    def test_zero_rate_has_no_interest(self):
+        grid = emi_scenarios([100000, 99999.99], [0], [7, 24, 37])
+
+        self.assertEqual(grid.total_interest.tolist(), [0] * 6)
+        self.assertEqual(grid.total_amount.tolist(), [10000000] * 3 + [9999999] * 3)
+
+    def test_totals_match_the_schedule(self):
+        grid = emi_scenarios([100000], [9], [24])
+        schedule = amortization_schedule(100000, 9, 24)
+
+        self.assertEqual(grid.total_interest[0], 964337)
+        self.assertEqual(schedule.total_interest, Decimal('9643.37'))
+        self.assertEqual(grid.total_amount[0], int(schedule.emi.sum()))
+
+    def test_every_row_matches_its_schedule(self):
+        # Tenures out of order, and a 0% EMI of half a paisa (1009387.50 / 60)
+        grid = emi_scenarios([50000, 123456.78, 1009387.50], [0, 7.5, 12], [59, 1, 12, 60])
+
+        for principal, rate, months, emi, total_interest, total_amount in zip(*grid):
+            schedule = amortization_schedule(principal, rate, months)
+            self.assertEqual(emi, round(calculate_emi(float(principal), float(rate), int(months)) * 100))
+            self.assertEqual(total_interest, schedule.interest_payment.sum())
+            self.assertEqual(total_amount, schedule.emi.sum())
+
+    def test_largest_grid_is_fast_and_larger_ones_rejected(self):
+        principals, rates = np.arange(1, 201) * 10000.0, np.arange(1, 101) / 10
+        months = [MAX_SCENARIO_INSTALLMENTS // (principals.size * rates.size)]
+
+        started = time.perf_counter()
+        grid = emi_scenarios(principals, rates, months)
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(grid.months.sum(), MAX_SCENARIO_INSTALLMENTS)
+
+        with self.assertRaisesMessage(ValueError, 'monthly installments'):
+            emi_scenarios(principals, rates, [months[0] + 1])
+
+
+class ScenarioRangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def test_ranges_that_cannot_be_counted_are_rejected(self):
+        for start, stop, step in (('1', 'inf', '1'), ('nan', '10', '1'), ('1', '10', '1e-320'), ('1', '1e308', '1e-300')):
+            with self.subTest(start=start, stop=stop, step=step), self.assertRaises(ValueError):
+                scenario_values(start, stop, step)
+
+        self.assertEqual(len(scenario_values('1', '1000', '1')), 1000)
+        with self.assertRaises(ValueError):
+            scenario_values('1', '1001', '1')
+
+    def test_invalid_ranges_are_reported_not_raised(self):
+        self.client.force_login(self.admin)
+
+        response = self.client.get(reverse('loan_scenarios'), {'principal_to': 'inf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['scenario_count'], 0)
+        self.assertIn('Invalid scenario ranges', str(list(response.context['messages'])[0]))
+
+        for name in ('loan_scenarios_data', 'loan_scenarios_csv'):
+            response = self.client.get(reverse(name), {'rate_step': '1e-320'})
+            self.assertEqual(response.status_code, 400)
+
+
+class MergeDuplicateDepartmentsTests(TestCase):
+    """Migration 0006 must merge every pair of names the unique index of 0007 rejects on MySQL"""
+
+    def test_names_differing_by_case_accents_or_spaces_are_merged(self):
+        icu, _, medecine, _, _ = Department.objects.bulk_create(
+            Department(name=name) for name in ('ICU', 'icu ', 'Médecine', 'Medecine', 'MEDECINE')
+        )
+        Expense.objects.bulk_create(
+            Expense(department=department, expense_type='Supplies', amount=40, date=date(2024, 1, 1))
+            for department in Department.objects.all()
+        )
+
+        migration = importlib.import_module('finance.migrations.0006_merge_duplicate_departments')
+        migration.merge_duplicate_departments(apps, None)
+
+        self.assertEqual(sorted(Department.objects.values_list('pk', 'name')), [(icu.pk, 'ICU'), (medecine.pk, 'Médecine')])
+        self.assertEqual(Expense.objects.filter(department=icu).count(), 2)
+        self.assertEqual(Expense.objects.filter(department=medecine).count(), 3)
+
+
+class PortfolioProjectionTests(SimpleTestCase):
+    def test_one_loan_projects_its_own_schedule(self):
+        schedule = amortization_schedule(100000, 9, 24)
+
+        projection = portfolio_projection([(Decimal('100000.00'), Decimal('9.00'), 24, date(2024, 1, 15))], 30, date(2024, 1, 1))
+
+        # Nothing is due in the month the loan starts, its installments follow
+        self.assertEqual(projection.outstanding[0], 10000000)
+        self.assertEqual(projection.active_loans.tolist(), [0] + [1] * 24 + [0] * 5)
+        for column in ('emi', 'principal_payment', 'interest_payment'):
+            self.assertEqual(getattr(projection, column)[1:25].tolist(), getattr(schedule, column).tolist(), column)
+            self.assertEqual(getattr(projection, column)[25:].tolist(), [0] * 5, column)
+        self.assertEqual(projection.outstanding[1:].tolist(), schedule.remaining_balance.tolist() + [0] * 5)
+        self.assertEqual(projection.total_interest, schedule.total_interest)
+        self.assertEqual(projection.total_amount, schedule.total_amount)
+
+    def test_half_paisa_emis_round_like_the_schedule(self):
+        # 1009387.50 / 60 is 16823.125, which calculate_emi rounds to 16823.12
+        loans = [(Decimal('1009387.50'), Decimal('0'), 60, date(2024, 1, 1)), (Decimal('100000'), Decimal('9'), 24, date(2024, 6, 1))]
+
+        projection = portfolio_projection(loans, 84, date(2024, 1, 1))
+
+        expected = np.zeros(84, dtype=np.int64)
+        expected[1:61] += amortization_schedule(Decimal('1009387.50'), 0, 60).emi
+        expected[6:30] += amortization_schedule(100000, 9, 24).emi
+        self.assertEqual(projection.emi.tolist(), expected.tolist())
+
+    def test_projection_starting_mid_loan(self):
+        schedule = amortization_schedule(50000, 12, 12)
+
+        projection = portfolio_projection([(50000, 12, 12, date(2024, 1, 1)), (50000, 12, 12, date(2024, 1, 1))], 6, date(2024, 11, 1))
+
+        self.assertEqual(projection.emi.tolist(), [2 * value for value in schedule.emi[9:].tolist()] + [0] * 3)
+        self.assertEqual(projection.outstanding.tolist(), [2 * value for value in schedule.remaining_balance[9:].tolist()] + [0] * 3)
+
+
+class FinanceApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology, cls.radiology = Department.objects.bulk_create(
+            [Department(name='Cardiology'), Department(name='Radiology')]
+        )
+        # Several rows per date, so pages end between rows of the same date
+        for number in range(9):
+            department = cls.cardiology if number % 3 else cls.radiology
+            Expense.objects.create(department=department, expense_type='Supplies', amount=10 + number, date=date(2024, 3, number // 3 + 1))
+        Income.objects.create(department=cls.cardiology, service_type='Consultation', amount=100, date=date(2024, 3, 1))
+        Loan.objects.create(loan_name='Equipment', principal=100000, interest_rate=9, tenure_months=24, emi=4568.47)
+
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+        cls.expense_user = User.objects.create_user(username='expenses', password='pass', role='EXPENSE_USER')
+        cls.income_user = User.objects.create_user(username='income', password='pass', role='INCOME_USER')
+
+    def get(self, name, user=None, **params):
+        self.client.force_login(user or self.admin)
+        return self.client.get(reverse(name, kwargs={'version': 'v1'}), params)
+
+    def test_roles_only_see_their_own_kind(self):
+        expected = {
+            self.admin: {'api_expenses': 200, 'api_incomes': 200, 'api_loans': 200, 'api_departments': 200},
+            self.expense_user: {'api_expenses': 200, 'api_incomes': 403, 'api_loans': 403, 'api_departments': 200},
+            self.income_user: {'api_expenses': 403, 'api_incomes': 200, 'api_loans': 403, 'api_departments': 200},
+        }
+        for user, statuses in expected.items():
+            for name, status in statuses.items():
+                with self.subTest(user=user.role, endpoint=name):
+                    self.assertEqual(self.get(name, user).status_code, status)
+
+    def test_date_and_department_filters(self):
+        def amounts(**params):
+            response = self.get('api_expenses', **params)
+            self.assertEqual(response.status_code, 200)
+            return sorted(float(row['amount']) for row in response.json()['results'])
+
+        self.assertEqual(amounts(date_from='2024-03-02', date_to='2024-03-02'), [13, 14, 15])
+        self.assertEqual(amounts(date_from='2024-03-03'), [16, 17, 18])
+        self.assertEqual(amounts(department=self.radiology.pk), [10, 13, 16])
+        self.assertEqual(amounts(department=self.radiology.pk, date_to='2024-03-02'), [10, 13])
+
+    def test_invalid_filters_are_bad_requests(self):
+        for params in ({'date_from': '2024-02-30'}, {'date_to': 'March'}, {'department': 'Cardiology'}, {'page_size': 'all'}):
+            with self.subTest(**params):
+                response = self.get('api_expenses', **params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.json())
+
+        self.assertEqual(self.get('api_expenses', cursor='not a cursor').status_code, 404)
+
+    def test_cursor_pages_through_every_row_once(self):
+        ids, response = [], self.get('api_expenses', page_size=2)
+        while True:
+            body = response.json()
+            ids += [row['id'] for row in body['results']]
+            if not body['next']:
+                break
+            response = self.client.get(body['next'])
+            self.assertEqual(response.status_code, 200)
+
+        expected = list(Expense.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(set(ids)), 9)
+
+
+class MonthlySummaryTests(TestCase):
+    """The summary must always equal the totals of the raw rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.radiology = Department.objects.create(name='Radiology')
+        for day in (1, 15, 28):
+            Expense.objects.create(department=cls.cardiology, expense_type='Supplies', amount=40.25, date=date(2024, 3, day))
+            Income.objects.create(department=cls.cardiology, service_type='Consultation', amount=100, date=date(2024, 3, day))
+        Income.objects.create(department=cls.radiology, service_type='Scan', amount=250.50, date=date(2024, 4, 2))
+
+    def assertSummaryMatchesRows(self):
+        expected = {}
+        for kind, model in (('EXPENSE', Expense), ('INCOME', Income)):
+            rows = (
+                model.objects.annotate(month=TruncMonth('date')).values('department_id', 'month')
+                .annotate(total=Sum('amount'), count=Count('id')).order_by()
+            )
+            expected.update({(row['department_id'], row['month'], kind): (row['total'], row['count']) for row in rows})
+
+        summary = MonthlyDepartmentSummary.objects.values_list('department_id', 'month', 'kind', 'total', 'count')
+        # Rows emptied by edits may stay behind with nothing in them
+        self.assertEqual([row for row in summary if row[4] == 0 and row[3] != 0], [])
+        self.assertEqual({row[:3]: (row[3], row[4]) for row in summary if row[4]}, expected)
+
+    def test_summary_follows_every_change(self):
+        self.assertSummaryMatchesRows()
+        expense = Expense.objects.filter(department=self.cardiology).first()
+        income = Income.objects.filter(department=self.cardiology).first()
+
+        changes = [
+            ('amount', lambda: (setattr(expense, 'amount', Decimal('99.99')), expense.save())),
+            ('month', lambda: (setattr(expense, 'date', '2024-05-31'), expense.save())),
+            ('department', lambda: (setattr(income, 'department', self.radiology), income.save())),
+            ('department and month', lambda: (setattr(income, 'department', self.cardiology), setattr(income, 'date', date(2023, 12, 1)), income.save())),
+            ('delete', expense.delete),
+            ('delete department', self.radiology.delete),
+        ]
+        for name, change in changes:
+            with self.subTest(change=name):
+                change()
+                self.assertSummaryMatchesRows()
+
+    def test_rebuild_command_repairs_the_summary(self):
+        # QuerySet.update() sends no signals, the summary falls behind
+        Expense.objects.update(amount=10)
+        Income.objects.filter(department=self.radiology).update(department=self.cardiology, date=date(2025, 1, 1))
+        MonthlyDepartmentSummary.objects.filter(kind='INCOME', month=date(2024, 3, 1)).update(total=0)
+
+        call_command('rebuild_monthly_summary', stdout=io.StringIO())
+
+        self.assertSummaryMatchesRows()
@@ -1,5 +1,8 @@
 from django.urls import path
-from .views import loan_create, expense_create, income_create, finance_list, loan_emi_breakdown, department_create
+from .views import (
+    loan_create, expense_create, income_create, finance_list, finance_list_rows, loan_emi_breakdown, loan_projection, loan_projection_data,
+    loan_scenarios, loan_scenarios_data, loan_scenarios_csv, department_create,
+)
 
 urlpatterns = [
     path('loan/', loan_create, name='loan'),
@@ -7,5 +10,11 @@ urlpatterns = [
     path('income/', income_create, name='income'),
     path('department/', department_create, name='department'),
     path('list/', finance_list, name='finance_list'),
+    path('list/<str:table>/rows/', finance_list_rows, name='finance_list_rows'),
     path('loan/<int:loan_id>/breakdown/', loan_emi_breakdown, name='loan_emi_breakdown'),
+    path('loan/projection/', loan_projection, name='loan_projection'),
+    path('loan/projection/data/', loan_projection_data, name='loan_projection_data'),
+    path('loan/scenarios/', loan_scenarios, name='loan_scenarios'),
+    path('loan/scenarios/data/', loan_scenarios_data, name='loan_scenarios_data'),
+    path('loan/scenarios/csv/', loan_scenarios_csv, name='loan_scenarios_csv'),
 ]
@@ -1,21 +1,37 @@
+import csv
+
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from .models import Loan, Expense, Income, Department
-from .services import calculate_emi, calculate_emi_breakdown
+from .services import (
+    PROJECTION_HORIZONS, amortization_schedule, calculate_emi, emi_scenarios, portfolio_projection, scenario_values,
+)
+from .pagination import InvalidCursor, keyset_page
 from django.db.models import Sum
 from datetime import datetime
 from django.utils import timezone
 from accounts.decorators import admin_required, admin_or_expense_user_required, admin_or_income_user_required
+from arthsutra.db_router import read_from_replica
+from reports.services import summary_total, visible_summaries
 
 @admin_required
 def department_create(request):
     if request.method == 'POST':
         name = request.POST.get('name', '').strip()
         if name:
-            Department.objects.create(name=name)
-            messages.success(request, f'Department "{name}" created successfully!')
-            return redirect('dashboard')
+            try:
+                with transaction.atomic():
+                    Department.objects.create(name=name)
+            except IntegrityError:
+                messages.error(request, f'Department "{name}" already exists.')
+            else:
+                messages.success(request, f'Department "{name}" created successfully!')
+                return redirect('dashboard')
         else:
             messages.error(request, 'Department name cannot be empty.')
 
@@ -34,6 +50,8 @@ def loan_create(request):
             rate = float(request.POST['rate'])
             months = int(request.POST['months'])
 
+            start_date = request.POST.get('start_date') or timezone.localdate()
+
             emi = calculate_emi(principal, rate, months)
 
             Loan.objects.create(
@@ -41,14 +59,17 @@ def loan_create(request):
                 principal=principal,
                 interest_rate=rate,
                 tenure_months=months,
-                emi=emi
+                emi=emi,
+                start_date=start_date
             )
             messages.success(request, 'Loan created successfully!')
             return redirect('dashboard')
+        except ValidationError:
+            messages.error(request, 'Please enter a valid start date.')
         except ValueError:
             messages.error(request, 'Please enter valid numeric values.')
 
-    return render(request, 'finance/loan_new.html')
+    return render(request, 'finance/loan_new.html', {'today': timezone.localdate()})
 
 @admin_or_expense_user_required
 def expense_create(request):
@@ -114,38 +135,41 @@ def income_create(request):
 
     return render(request, 'finance/income_new.html', context)
 
+def _visible_transactions(user_role):
+    """Expense, income and loan querysets a role may list"""
+    if user_role == 'ADMIN':
+        return Expense.objects.all(), Income.objects.all(), Loan.objects.all()
+    elif user_role == 'EXPENSE_USER':
+        return Expense.objects.all(), Income.objects.none(), Loan.objects.none()
+    elif user_role == 'INCOME_USER':
+        return Expense.objects.none(), Income.objects.all(), Loan.objects.none()
+    # Fallback for any other roles
+    return Expense.objects.none(), Income.objects.none(), Loan.objects.none()
+
 @login_required
+@read_from_replica
 def finance_list(request):
     user_role = request.user.role
 
-    # Filter data based on user role
-    if user_role == 'ADMIN':
-        expenses = Expense.objects.select_related('department').order_by('-date')
-        incomes = Income.objects.select_related('department').order_by('-date')
-        loans = Loan.objects.all()
-    elif user_role == 'EXPENSE_USER':
-        expenses = Expense.objects.select_related('department').order_by('-date')
-        incomes = Income.objects.none()  # Empty queryset
-        loans = Loan.objects.none()  # Empty queryset
-    elif user_role == 'INCOME_USER':
-        expenses = Expense.objects.none()  # Empty queryset
-        incomes = Income.objects.select_related('department').order_by('-date')
-        loans = Loan.objects.none()  # Empty queryset
-    else:
-        # Fallback for any other roles
-        expenses = Expense.objects.none()
-        incomes = Income.objects.none()
-        loans = Loan.objects.none()
-
-    # Calculate totals based on visible data
-    total_expenses = expenses.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_income = incomes.aggregate(Sum('amount'))['amount__sum'] or 0
+    # Filter data based on user role, only the first page of each table is rendered
+    expenses, incomes, loans = _visible_transactions(user_role)
+    expense_page, expenses_cursor = keyset_page(expenses.select_related('department'))
+    income_page, incomes_cursor = keyset_page(incomes.select_related('department'))
+    loan_page, loans_cursor = keyset_page(loans, fields=('id',))
+
+    # Calculate totals based on visible data, from the monthly summary
+    income_summary, expense_summary = visible_summaries(user_role)
+    total_expenses = summary_total(expense_summary)
+    total_income = summary_total(income_summary)
     total_loans = loans.aggregate(Sum('principal'))['principal__sum'] or 0
 
     context = {
-        'expenses': expenses,
-        'incomes': incomes,
-        'loans': loans,
+        'expenses': expense_page,
+        'incomes': income_page,
+        'loans': loan_page,
+        'expenses_cursor': expenses_cursor,
+        'incomes_cursor': incomes_cursor,
+        'loans_cursor': loans_cursor,
         'total_expenses': total_expenses,
         'total_income': total_income,
         'total_loans': total_loans,
@@ -155,20 +179,187 @@ def finance_list(request):
     return render(request, 'finance/list.html', context)
 
 @login_required
+@read_from_replica
+def finance_list_rows(request, table):
+    """Next page of one finance_list table as JSON, requested as the user scrolls"""
+    expenses, incomes, loans = _visible_transactions(request.user.role)
+    cursor = request.GET.get('cursor')
+
+    try:
+        if table == 'expenses':
+            rows, next_cursor = keyset_page(
+                expenses.values('id', 'date', 'department__name', 'expense_type', 'amount'), cursor
+            )
+        elif table == 'incomes':
+            rows, next_cursor = keyset_page(
+                incomes.values('id', 'date', 'department__name', 'service_type', 'amount'), cursor
+            )
+        elif table == 'loans':
+            rows, next_cursor = keyset_page(
+                loans.values('id', 'loan_name', 'principal', 'interest_rate', 'tenure_months', 'emi'), cursor, fields=('id',)
+            )
+            for row in rows:
+                row['breakdown_url'] = reverse('loan_emi_breakdown', args=[row['id']])
+        else:
+            raise Http404('Unknown table')
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=404)
+
+    return JsonResponse({'rows': rows, 'next_cursor': next_cursor})
+
+@login_required
+@read_from_replica
 def loan_emi_breakdown(request, loan_id):
     loan = get_object_or_404(Loan, id=loan_id)
-    emi_breakdown = calculate_emi_breakdown(
-        float(loan.principal),
-        loan.interest_rate,
-        loan.tenure_months
-    )
+    schedule = amortization_schedule(loan.principal, loan.interest_rate, loan.tenure_months)
 
     context = {
         'loan': loan,
-        'emi_breakdown': emi_breakdown,
-        'total_principal': loan.principal,
-        'total_interest': sum(item['interest_payment'] for item in emi_breakdown),
-        'total_amount': sum(item['emi'] for item in emi_breakdown),
+        'emi_breakdown': schedule.rows,
+        'total_principal': schedule.total_principal,
+        'total_interest': schedule.total_interest,
+        'total_amount': schedule.total_amount,
     }
 
     return render(request, 'finance/loan_breakdown.html', context)
+
+def _projection_horizon(request):
+    """Months requested with ?months=, limited to PROJECTION_HORIZONS"""
+    try:
+        months = int(request.GET.get('months', 60))
+    except ValueError:
+        return 60
+    return months if months in PROJECTION_HORIZONS else 60
+
+def _loan_projection(request):
+    loans = Loan.objects.values_list('principal', 'interest_rate', 'tenure_months', 'start_date')
+    return portfolio_projection(loans, _projection_horizon(request))
+
+@admin_required
+@read_from_replica
+def loan_projection(request):
+    projection = _loan_projection(request)
+
+    context = {
+        'projection': projection.rows,
+        'months': len(projection.months),
+        'horizons': PROJECTION_HORIZONS,
+        'loan_count': Loan.objects.count(),
+        'total_principal': projection.total_principal,
+        'total_interest': projection.total_interest,
+        'total_amount': projection.total_amount,
+    }
+
+    return render(request, 'finance/loan_projection.html', context)
+
+@admin_required
+@read_from_replica
+def loan_projection_data(request):
+    projection = _loan_projection(request)
+
+    return JsonResponse({
+        'months': [
+            {
+                'month': row['month'].strftime('%Y-%m'),
+                'emi': float(row['emi']),
+                'principal_payment': float(row['principal_payment']),
+                'interest_payment': float(row['interest_payment']),
+                'outstanding': float(row['outstanding']),
+                'active_loans': row['active_loans'],
+            }
+            for row in projection.rows
+        ],
+        'total_principal': float(projection.total_principal),
+        'total_interest': float(projection.total_interest),
+        'total_amount': float(projection.total_amount),
+    })
+
+# Default what-if ranges: (start, stop, step) per axis
+SCENARIO_DEFAULTS = {
+    'principal': ('100000', '1000000', '100000'),
+    'rate': ('8', '12', '0.5'),
+    'months': ('12', '60', '12'),
+}
+# Scenarios rendered in the page table, the rest are in the CSV
+SCENARIO_TABLE_ROWS = 200
+
+def _scenario_params(request):
+    """(start, stop, step) strings per axis from ?principal_from=&principal_to=&principal_step=..."""
+    return {
+        axis: tuple(
+            request.GET.get(f'{axis}_{part}', default)
+            for part, default in zip(('from', 'to', 'step'), defaults)
+        )
+        for axis, defaults in SCENARIO_DEFAULTS.items()
+    }
+
+def _scenario_grid(params):
+    return emi_scenarios(
+        scenario_values(*params['principal']),
+        scenario_values(*params['rate']),
+        scenario_values(*params['months'], integer=True),
+    )
+
+def _scenario_columns(grid, limit=None):
+    columns = (
+        grid.principal[:limit], grid.rate[:limit], grid.months[:limit],
+        grid.emi[:limit] / 100, grid.total_interest[:limit] / 100, grid.total_amount[:limit] / 100,
+    )
+    return [column.tolist() for column in columns]
+
+@admin_required
+def loan_scenarios(request):
+    params = _scenario_params(request)
+    rows = []
+    count = 0
+    try:
+        grid = _scenario_grid(params)
+        count = len(grid.emi)
+        rows = [
+            dict(zip(('principal', 'rate', 'months', 'emi', 'total_interest', 'total_amount'), values))
+            for values in zip(*_scenario_columns(grid, SCENARIO_TABLE_ROWS))
+        ]
+    except (ValueError, OverflowError) as e:
+        messages.error(request, f'Invalid scenario ranges: {e}')
+
+    context = {
+        'params': params,
+        'scenarios': rows,
+        'scenario_count': count,
+        'truncated': count > len(rows),
+        'query': request.GET.urlencode(),
+    }
+
+    return render(request, 'finance/loan_scenarios.html', context)
+
+@admin_required
+def loan_scenarios_data(request):
+    try:
+        grid = _scenario_grid(_scenario_params(request))
+    except (ValueError, OverflowError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    principal, rate, months, emi, total_interest, total_amount = _scenario_columns(grid)
+    return JsonResponse({
+        'count': len(emi),
+        'principal': principal,
+        'rate': rate,
+        'months': months,
+        'emi': emi,
+        'total_interest': total_interest,
+        'total_amount': total_amount,
+    })
+
+@admin_required
+def loan_scenarios_csv(request):
+    try:
+        grid = _scenario_grid(_scenario_params(request))
+    except (ValueError, OverflowError) as e:
+        return HttpResponse(f'Invalid scenario ranges: {e}', status=400, content_type='text/plain')
+
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="emi_scenarios.csv"'
+    writer = csv.writer(response)
+    writer.writerow(['Principal', 'Rate (%)', 'Tenure (Months)', 'EMI', 'Total Interest', 'Total Amount'])
+    writer.writerows(zip(*_scenario_columns(grid)))
+    return response
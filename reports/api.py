@@ -0,0 +1,32 @@
+"""Read-only JSON API (v1) for the aggregates behind the dashboard and reports pages"""
+
+from django.utils.decorators import method_decorator
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from arthsutra.db_router import read_from_replica
+from finance.serializers import DepartmentTotalsSerializer, MonthlyTrendSerializer
+from .services import get_trend_window, monthly_trends, visible_department_totals, visible_summaries
+
+
+@method_decorator(read_from_replica, name='dispatch')
+class MonthlyAggregateView(APIView):
+    """Income, expense and profit per month, ?months=6|12|24|36"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, version=None):
+        income_summary, expense_summary = visible_summaries(request.user.role)
+        months = get_trend_window(request, default=12)
+        trends = monthly_trends(income_summary, expense_summary, months, label_format='%Y-%m')
+        return Response({'months': months, 'results': MonthlyTrendSerializer(trends, many=True).data})
+
+
+@method_decorator(read_from_replica, name='dispatch')
+class DepartmentAggregateView(APIView):
+    """Income and expense totals per department, limited to what the role may see"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, version=None):
+        departments = visible_department_totals(request.user.role)
+        return Response({'results': DepartmentTotalsSerializer(departments, many=True).data})
@@ -0,0 +1,7 @@
+from django.urls import path
+from .api import MonthlyAggregateView, DepartmentAggregateView
+
+urlpatterns = [
+    path('monthly/', MonthlyAggregateView.as_view(), name='api_monthly'),
+    path('departments/', DepartmentAggregateView.as_view(), name='api_department_totals'),
+]
@@ -0,0 +1,133 @@
+"""
+Per-role cache of the dashboard context.
+
+Every user with the same role sees the same dashboard, so the computed
+context is cached per (role, trend window) and dropped for the affected
+roles whenever Expense/Income/Loan/Department rows change, a chunk of an
+upload is written or an upload finishes (see reports.signals). Changes made
+in a transaction drop it once that commits: dropped earlier, a request
+could cache the old data again before the commit makes the new data
+visible. Hit and miss counters live in the cache too, so with the file
+backend they add up across workers.
+
+A context built from a read replica right after a change may predate it, so
+it is not cached until REPLICA_PIN_SECONDS have passed since the last change.
+"""
+
+import itertools
+import logging
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from accounts.models import User
+from arthsutra.db_router import reading_from_replica, replica_alias
+from .services import TREND_WINDOWS
+
+logger = logging.getLogger(__name__)
+
+ALL_ROLES = [role for role, _ in User.ROLE_CHOICES]
+
+# Roles whose dashboard shows data of each kind. Expense users also see the
+# per-department income chart, so income changes reach every role.
+ROLES_BY_KIND = {
+    'EXPENSE': ['ADMIN', 'EXPENSE_USER'],
+    'INCOME': ALL_ROLES,
+    'LOAN': ['ADMIN'],
+    'DEPARTMENT': ALL_ROLES,
+}
+
+HITS_KEY = 'dashboard:stats:hits'
+MISSES_KEY = 'dashboard:stats:misses'
+# Set while a replica may still lag behind the last change
+CHANGED_KEY = 'dashboard:recently_changed'
+
+
+def _key(role, months):
+    return f'dashboard:context:{role}:{months}'
+
+
+def _count(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def get_dashboard_context(role, months):
+    """The cached context for ``role`` and ``months`` or None, counted as a hit or a miss"""
+    context = cache.get(_key(role, months))
+    _count(HITS_KEY if context is not None else MISSES_KEY)
+    return context
+
+
+def set_dashboard_context(role, months, context):
+    if not (reading_from_replica() and cache.get(CHANGED_KEY)):
+        cache.set(_key(role, months), context, timeout=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+
+
+def cached_dashboard_context(role, months, build):
+    """Return the cached context for ``role`` and ``months``, calling ``build()`` on a miss"""
+    context = get_dashboard_context(role, months)
+    if context is None:
+        context = build()
+        set_dashboard_context(role, months, context)
+    return context
+
+
+def invalidate_dashboard(kind):
+    """Drop the cached dashboards of every role that shows data of ``kind``"""
+    roles = ROLES_BY_KIND.get(kind, ALL_ROLES)
+    cache.delete_many([_key(role, months) for role in roles for months in TREND_WINDOWS])
+    if replica_alias():
+        cache.set(CHANGED_KEY, True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+    logger.debug(f"Dashboard cache invalidated for {kind} ({', '.join(roles)})")
+
+
+# Registration order of invalidate_dashboard_on_commit() calls, and per thread
+# the last one of each kind and the last one already carried out
+_sequence = itertools.count()
+_local = threading.local()
+
+
+def _registered():
+    if not hasattr(_local, 'latest'):
+        _local.latest, _local.done = {}, {}
+    return _local.latest, _local.done
+
+
+def invalidate_dashboard_on_commit(kind):
+    """
+    invalidate_dashboard(``kind``) once the current transaction commits, or
+    right away outside of one. However many rows of ``kind`` the transaction
+    changed, e.g. a department deleted with its expenses, the first callback
+    to run drops the cache for all of them and the others do nothing.
+    """
+    latest, _ = _registered()
+    latest[kind] = sequence = next(_sequence)
+    transaction.on_commit(partial(_invalidate_once, kind, sequence))
+
+
+def _invalidate_once(kind, sequence):
+    latest, done = _registered()
+    # Callbacks registered up to latest[kind] are committed together by now
+    if done.get(kind, -1) >= sequence:
+        return
+    done[kind] = latest[kind]
+    invalidate_dashboard(kind)
+
+
+def dashboard_cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 3) if total else None,
+    }
@@ -0,0 +1,57 @@
+import logging
+import os
+import tempfile
+
+from django.core.files import File
+from django.utils import timezone
+
+from uploads.jobs import JobQueue, claim_next
+from .exports import count_rows, visible_sources
+from .models import ReportExport
+from .workbooks import build_workbook
+
+logger = logging.getLogger(__name__)
+
+
+def claim_next_export():
+    return claim_next(ReportExport, 'requested_at')
+
+
+def _report_progress(export, rows_written):
+    progress = min(99, rows_written * 100 // export.total_rows) if export.total_rows else 0
+    ReportExport.objects.filter(pk=export.pk).update(rows_written=rows_written, progress=progress)
+
+
+def run_export(export):
+    """Build the workbook of a claimed export into MEDIA_ROOT and record the outcome on it"""
+    user_role = export.user.role
+    try:
+        export.total_rows = count_rows(visible_sources(user_role, export.date_from, export.date_to))
+        ReportExport.objects.filter(pk=export.pk).update(total_rows=export.total_rows)
+
+        # Built next to the other temporary files, then moved into storage
+        handle, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(handle)
+        try:
+            export.rows_written = build_workbook(
+                path, user_role, export.date_from, export.date_to,
+                progress=lambda rows_written: _report_progress(export, rows_written),
+            )
+            with open(path, 'rb') as workbook:
+                export.file.save(f'arthsutra_report_{export.pk}.xlsx', File(workbook), save=False)
+        finally:
+            os.remove(path)
+
+        export.status = 'PROCESSED'
+        export.progress = 100
+    except Exception as e:
+        logger.exception(f"Export {export.pk} failed")
+        export.status = 'FAILED'
+        export.error_message = f'Error building workbook: {e}'
+
+    export.finished_at = timezone.now()
+    export.save(update_fields=['file', 'status', 'progress', 'rows_written', 'error_message', 'finished_at'])
+    return export
+
+
+export_queue = JobQueue('export', claim_next_export, run_export)
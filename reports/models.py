@@ -1,3 +1,28 @@
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+class ReportExport(models.Model):
+    """An Excel workbook built in the background worker, see reports.jobs"""
+    STATUS_CHOICES = (
+        ('PENDING', 'Queued'),
+        ('PROCESSING', 'Processing'),
+        ('PROCESSED', 'Ready'),
+        ('FAILED', 'Failed'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+    file = models.FileField(upload_to='report_exports/', blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    total_rows = models.IntegerField(default=0)
+    rows_written = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Workbook {self.pk} - {self.get_status_display()}"
@@ -0,0 +1,134 @@
+from datetime import date
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from finance.models import Department, MonthlyDepartmentSummary
+from finance.summary import summary_for
+
+# Trend windows (in months) offered on the dashboard and reports pages
+TREND_WINDOWS = (6, 12, 24, 36)
+
+
+def visible_summaries(user_role):
+    """Income and expense summary rows a role may see, the same split the views apply to raw rows"""
+    income_summary = summary_for('INCOME') if user_role in ['ADMIN', 'INCOME_USER'] else MonthlyDepartmentSummary.objects.none()
+    expense_summary = summary_for('EXPENSE') if user_role in ['ADMIN', 'EXPENSE_USER'] else MonthlyDepartmentSummary.objects.none()
+    return income_summary, expense_summary
+
+
+def get_trend_window(request, default):
+    """Months requested with ?months=, limited to TREND_WINDOWS"""
+    try:
+        months = int(request.GET.get('months', default))
+    except ValueError:
+        return default
+    return months if months in TREND_WINDOWS else default
+
+
+def month_starts(months, today=None):
+    """First day of each of the last ``months`` months, oldest first and ending with the current month"""
+    today = today or timezone.now().date()
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(months):
+        starts.append(date(year, month, 1))
+        month -= 1
+        if month == 0:
+            month = 12
+            year -= 1
+    return starts[::-1]
+
+
+def next_month(month_start):
+    if month_start.month == 12:
+        return date(month_start.year + 1, 1, 1)
+    return date(month_start.year, month_start.month + 1, 1)
+
+
+def monthly_totals(summary_queryset, starts):
+    """
+    Sum of the MonthlyDepartmentSummary totals for each month in ``starts``
+    using a single GROUP BY query.
+
+    Months without rows are filled with 0 here rather than in SQL.
+    """
+    rows = (
+        summary_queryset.filter(month__gte=starts[0], month__lte=starts[-1])
+        .values('month')
+        .annotate(month_total=Sum('total'))
+        .order_by()
+    )
+    totals = {row['month']: row['month_total'] for row in rows}
+    return [totals.get(start) or 0 for start in starts]
+
+
+def monthly_trends(income_summary, expense_summary, months, label_format='%b %Y'):
+    """Income, expense and profit per month for the last ``months`` months, two queries in total"""
+    starts = month_starts(months)
+    income = monthly_totals(income_summary, starts)
+    expense = monthly_totals(expense_summary, starts)
+    return trend_rows(starts, income, expense, label_format)
+
+
+def trend_rows(starts, income, expense, label_format='%b %Y'):
+    """Rows of monthly_trends() from the monthly_totals() of each kind"""
+    return [
+        {
+            'month': start.strftime(label_format),
+            'income': float(month_income),
+            'expense': float(month_expense),
+            'profit': float(month_income - month_expense),
+        }
+        for start, month_income, month_expense in zip(starts, income, expense)
+    ]
+
+
+def summary_total(summary_queryset):
+    return summary_queryset.aggregate(Sum('total'))['total__sum'] or 0
+
+
+def department_totals():
+    """
+    Income and expense totals and counts per department.
+
+    Each kind is aggregated on its own (GROUP BY department, kind over the
+    monthly summary) and merged in Python. Annotating Sum() over both reverse
+    relations in one query joins every income row with every expense row of
+    the department, which inflates the sums and grows quadratically.
+    """
+    departments = {
+        department_id: {
+            'id': department_id,
+            'name': name,
+            'total_income': 0,
+            'total_expense': 0,
+            'income_count': 0,
+            'expense_count': 0,
+        }
+        for department_id, name in Department.objects.order_by('id').values_list('id', 'name')
+    }
+    rows = (
+        MonthlyDepartmentSummary.objects.values('department_id', 'kind')
+        .annotate(kind_total=Sum('total'), kind_count=Sum('count'))
+        .order_by()
+    )
+    for row in rows:
+        department = departments.get(row['department_id'])
+        if department is None:
+            continue
+        prefix = row['kind'].lower()
+        department[f'total_{prefix}'] = row['kind_total'] or 0
+        department[f'{prefix}_count'] = row['kind_count'] or 0
+    return list(departments.values())
+
+
+def visible_department_totals(user_role):
+    """department_totals() with the kinds a role may not see zeroed"""
+    departments = department_totals()
+    for department in departments:
+        if user_role not in ['ADMIN', 'INCOME_USER']:
+            department['total_income'], department['income_count'] = 0, 0
+        if user_role not in ['ADMIN', 'EXPENSE_USER']:
+            department['total_expense'], department['expense_count'] = 0, 0
+    return departments
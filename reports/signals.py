@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from finance.models import Department, Expense, Income, Loan
+from uploads.signals import rows_imported, upload_processed
+from .cache import invalidate_dashboard, invalidate_dashboard_on_commit
+
+KIND_BY_MODEL = {
+    Expense: 'EXPENSE',
+    Income: 'INCOME',
+    Loan: 'LOAN',
+    Department: 'DEPARTMENT',
+}
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_save, sender=Income)
+@receiver(post_save, sender=Loan)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Expense)
+@receiver(post_delete, sender=Income)
+@receiver(post_delete, sender=Loan)
+@receiver(post_delete, sender=Department)
+def invalidate_on_change(sender, **kwargs):
+    invalidate_dashboard_on_commit(KIND_BY_MODEL[sender])
+
+
+@receiver(rows_imported)
+def invalidate_on_import(sender, **kwargs):
+    # Bulk inserts send no model signals, uploads send this once per chunk
+    invalidate_dashboard_on_commit(KIND_BY_MODEL[sender])
+
+
+@receiver(upload_processed)
+def invalidate_on_upload(sender, uploaded_file, **kwargs):
+    # Sent outside of any transaction, after the last chunk has been committed
+    invalidate_dashboard(uploaded_file.file_type)
@@ -1,3 +1,489 @@
-from django.test import TestCase
+import json
+import tempfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, router
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, modify_settings, override_settings
+from asgiref.sync import async_to_sync
+from django.urls import path, reverse
+from openpyxl import load_workbook
+
+from accounts.models import User
+from arthsutra.concurrency import run_concurrently
+from arthsutra.db_router import PIN_COOKIE, ReplicaPinningMiddleware, read_from_replica
+from arthsutra.testing import QueryBudgetMixin
+from finance.models import Department, Expense, Income, Loan
+from finance.summary import summary_for
+from uploads.csv_processor import process_expense_csv
+from uploads.tests import process_rows
+
+from . import cache as dashboard_cache
+from .jobs import claim_next_export, run_export
+from .models import ReportExport
+from .services import department_totals, month_starts, monthly_totals, monthly_trends
+from .views import adashboard, areports_view
+
+
+class DepartmentTotalsTests(TestCase):
+    """Department totals must not multiply income rows by expense rows"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.radiology = Department.objects.create(name='Radiology')
+        cls.pharmacy = Department.objects.create(name='Pharmacy')
+
+        for amount in (100, 200, 300):
+            Income.objects.create(department=cls.cardiology, service_type='Consultation', amount=amount, date=date(2024, 1, 10))
+        for amount in (50, 25):
+            Expense.objects.create(department=cls.cardiology, expense_type='Supplies', amount=amount, date=date(2024, 2, 5))
+        Expense.objects.create(department=cls.radiology, expense_type='Maintenance', amount=Decimal('80.50'), date=date(2024, 1, 20))
+
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+        cls.expense_user = User.objects.create_user(username='expense', password='pass', role='EXPENSE_USER')
+
+    def test_totals_and_counts_per_department(self):
+        totals = {row['name']: row for row in department_totals()}
+
+        self.assertEqual(totals['Cardiology']['total_income'], Decimal('600.00'))
+        self.assertEqual(totals['Cardiology']['total_expense'], Decimal('75.00'))
+        self.assertEqual(totals['Cardiology']['income_count'], 3)
+        self.assertEqual(totals['Cardiology']['expense_count'], 2)
+        self.assertEqual(totals['Radiology']['total_income'], 0)
+        self.assertEqual(totals['Radiology']['total_expense'], Decimal('80.50'))
+        self.assertEqual(totals['Pharmacy']['income_count'] + totals['Pharmacy']['expense_count'], 0)
+
+    def test_reports_view_department_report(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('reports_view'))
+
+        report = {row['name']: row for row in response.context['department_report']}
+        self.assertEqual(report['Cardiology']['income_total'], Decimal('600.00'))
+        self.assertEqual(report['Cardiology']['expense_total'], Decimal('75.00'))
+        self.assertEqual(report['Cardiology']['transaction_count'], 5)
+        self.assertEqual(report['Cardiology']['net_profit'], Decimal('525.00'))
+
+    def test_dashboard_filters_departments_by_role(self):
+        self.client.force_login(self.expense_user)
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.context['department_labels'], '["Cardiology", "Radiology"]')
+
+
+class ReportsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query counts of the dashboard and reports must not grow with departments or months"""
+
+    @classmethod
+    def setUpTestData(cls):
+        departments = Department.objects.bulk_create(Department(name=f'Department {number}') for number in range(8))
+        for department in departments:
+            for month in range(1, 13):
+                Income.objects.create(department=department, service_type='Consultation', amount=100, date=date(2024, month, 3))
+                Expense.objects.create(department=department, expense_type='Supplies', amount=40, date=date(2024, month, 9))
+
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_dashboard_query_budget(self):
+        with self.assertMaxQueries(12):
+            self.client.get(reverse('dashboard'))
+
+    def test_cached_dashboard_query_budget(self):
+        self.client.get(reverse('dashboard'))
+
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('dashboard'))
+
+    def test_reports_view_query_budget(self):
+        with self.assertMaxQueries(6):
+            self.client.get(reverse('reports_view'))
+
+
+class MonthlyTrendTests(TestCase):
+    """Trends cover every month of the window, zero-filled, across year ends"""
+
+    today = date(2025, 2, 14)
+
+    @classmethod
+    def setUpTestData(cls):
+        cardiology = Department.objects.create(name='Cardiology')
+        radiology = Department.objects.create(name='Radiology')
+        for department, amount, day in (
+            (cardiology, 100, date(2024, 11, 5)),
+            (radiology, 50, date(2024, 11, 30)),
+            (cardiology, 300, date(2025, 1, 1)),
+            (cardiology, 80, date(2025, 2, 14)),
+            (cardiology, 70, date(2023, 3, 1)),  # first month of the 24-month window
+            (cardiology, 60, date(2022, 3, 31)),  # first month of the 36-month window
+            (cardiology, 999, date(2022, 2, 28)),  # before every window
+            (cardiology, 999, date(2025, 3, 1)),  # after the current month
+        ):
+            Income.objects.create(department=department, service_type='Consultation', amount=amount, date=day)
+        Expense.objects.create(department=cardiology, expense_type='Supplies', amount=40, date=date(2024, 12, 31))
+
+    def test_month_starts_cross_the_year_end(self):
+        starts = month_starts(6, self.today)
+
+        self.assertEqual(
+            [start.strftime('%b %Y') for start in starts],
+            ['Sep 2024', 'Oct 2024', 'Nov 2024', 'Dec 2024', 'Jan 2025', 'Feb 2025'],
+        )
+        for months, first in ((12, date(2024, 3, 1)), (24, date(2023, 3, 1)), (36, date(2022, 3, 1))):
+            starts = month_starts(months, self.today)
+            self.assertEqual((len(starts), starts[0], starts[-1]), (months, first, date(2025, 2, 1)))
+            self.assertEqual(len(set(starts)), months)
+        self.assertEqual(month_starts(2, date(2025, 1, 31)), [date(2024, 12, 1), date(2025, 1, 1)])
+
+    def test_gaps_are_zero_filled_in_one_query(self):
+        for months in (6, 24, 36):
+            starts = month_starts(months, self.today)
+            with self.assertNumQueries(1):
+                income = monthly_totals(summary_for('INCOME'), starts)
+            with self.assertNumQueries(1):
+                expense = monthly_totals(summary_for('EXPENSE'), starts)
+
+            self.assertEqual(len(income), months)
+            self.assertEqual(income[-6:], [0, 0, 150, 0, 300, 80])
+            self.assertEqual(expense, [0] * (months - 3) + [40, 0, 0])
+            if months >= 24:
+                self.assertEqual(income[months - 24], 70)
+            self.assertEqual(sum(income), {6: 530, 24: 600, 36: 660}[months])
+
+    def test_monthly_trends_labels_and_totals(self):
+        now = datetime(2025, 2, 14, 12, tzinfo=timezone.utc)
+        with patch('django.utils.timezone.now', return_value=now), self.assertNumQueries(2):
+            rows = monthly_trends(summary_for('INCOME'), summary_for('EXPENSE'), 24)
+
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(rows[0], {'month': 'Mar 2023', 'income': 70.0, 'expense': 0.0, 'profit': 70.0})
+        self.assertEqual(
+            rows[-3:],
+            [
+                {'month': 'Dec 2024', 'income': 0.0, 'expense': 40.0, 'profit': -40.0},
+                {'month': 'Jan 2025', 'income': 300.0, 'expense': 0.0, 'profit': 300.0},
+                {'month': 'Feb 2025', 'income': 80.0, 'expense': 0.0, 'profit': 80.0},
+            ],
+        )
+        self.assertEqual([row['income'] for row in rows[1:20]], [0.0] * 19)
+
+
+class TransactionExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cardiology = Department.objects.create(name='Cardiology')
+        for day in range(1, 8):
+            Income.objects.create(department=cardiology, service_type='Consultation', amount=100, date=date(2024, 3, day))
+            Expense.objects.create(department=cardiology, expense_type='Supplies', amount=40, date=date(2024, 3, day))
+
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+        cls.income_user = User.objects.create_user(username='income', password='pass', role='INCOME_USER')
+
+    def export(self, user, **params):
+        self.client.force_login(user)
+        response = self.client.get(reverse('export_transactions'), params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    @patch('reports.exports.EXPORT_BATCH_SIZE', 3)
+    def test_streams_every_row_newest_first_across_batches(self):
+        lines = self.export(self.admin)
+
+        self.assertEqual(lines[0], 'Date,Type,Department,Category,Amount')
+        self.assertEqual(len(lines), 15)
+        dates = [line.split(',')[0] for line in lines[1:]]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_filters_by_role_and_date(self):
+        lines = self.export(self.income_user, date_from='2024-03-05')
+
+        self.assertEqual(len(lines), 4)
+        self.assertEqual({line.split(',')[1] for line in lines[1:]}, {'Income'})
+
+
+class WorkbookExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cardiology = Department.objects.create(name='Cardiology')
+        radiology = Department.objects.create(name='Radiology: Imaging')
+        Income.objects.create(department=cardiology, service_type='Consultation', amount=100, date=date(2024, 3, 1))
+        Expense.objects.create(department=cardiology, expense_type='Supplies', amount=40, date=date(2024, 3, 2))
+        Expense.objects.create(department=radiology, expense_type='Maintenance', amount=75, date=date(2024, 4, 2))
+
+        cls.expense_user = User.objects.create_user(username='expense', password='pass', role='EXPENSE_USER')
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def test_worker_builds_a_sheet_per_department(self):
+        ReportExport.objects.create(user=self.expense_user)
+
+        export = run_export(claim_next_export())
+
+        self.assertEqual(export.status, 'PROCESSED')
+        self.assertEqual(export.rows_written, 2)
+        workbook = load_workbook(export.file.path, read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Monthly Summary', 'Cardiology', 'Radiology Imaging'])
+        cardiology = list(workbook['Cardiology'].iter_rows(values_only=True))
+        self.assertEqual([row[1:3] for row in cardiology], [('Type', 'Category'), ('Expense', 'Supplies')])
+        summary = list(workbook['Monthly Summary'].iter_rows(values_only=True))
+        self.assertEqual(summary[1][:4], ('2024-03', 'Cardiology', 0, 40))
+        workbook.close()
+
+
+@override_settings(REPLICA_DATABASE='replica', REPLICA_APPS=['finance'])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Decorated views read finance models from the replica unless the user just wrote"""
+
+    def read_aliases(self, request):
+        aliases = {}
+
+        @read_from_replica
+        def view(request):
+            aliases['expense'] = router.db_for_read(Expense)
+            aliases['user'] = router.db_for_read(User)
+            aliases['write'] = router.db_for_write(Expense)
+            return HttpResponse()
+
+        view(request)
+        return aliases
+
+    def test_reads_go_to_replica_only_inside_decorated_views(self):
+        aliases = self.read_aliases(RequestFactory().get('/'))
+
+        self.assertEqual(aliases, {'expense': 'replica', 'user': 'default', 'write': 'default'})
+        self.assertEqual(router.db_for_read(Expense), 'default')
+
+    def test_pinned_user_reads_from_primary(self):
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+
+        self.assertEqual(self.read_aliases(request)['expense'], 'default')
+
+    def test_writes_pin_the_user(self):
+        middleware = ReplicaPinningMiddleware(lambda request: HttpResponse())
+
+        self.assertNotIn(PIN_COOKIE, middleware(RequestFactory().get('/')).cookies)
+        self.assertIn(PIN_COOKIE, middleware(RequestFactory().post('/')).cookies)
+
+
+@override_settings(CONCURRENT_QUERY_WORKERS=1)
+class AsyncViewTests(TestCase):
+    """The async dashboard and reports views render the same context as the sync ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cardiology = Department.objects.create(name='Cardiology')
+        Income.objects.create(department=cardiology, service_type='Consultation', amount=100, date=date.today())
+        Expense.objects.create(department=cardiology, expense_type='Supplies', amount=40, date=date.today())
+
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_async(self, view, path):
+        request = RequestFactory().get(path)
+        request.user = self.admin
+
+        async def auser():
+            return self.admin
+        request.auser = auser
+        return async_to_sync(view)(request)
+
+    def assertSameContext(self, async_view, path, keys):
+        self.client.force_login(self.admin)
+        expected = self.client.get(path).context
+        cache.clear()
+
+        with patch('reports.views.render') as render:
+            render.return_value = HttpResponse()
+            self.get_async(async_view, path)
+
+        context = render.call_args.args[2]
+        for key in keys:
+            self.assertEqual(context[key], expected[key], key)
+
+    def test_async_dashboard(self):
+        self.assertSameContext(
+            adashboard, reverse('dashboard'),
+            ['total_income', 'total_expenses', 'monthly_income', 'monthly_expenses', 'department_data', 'recent_expenses'],
+        )
+
+    def test_async_reports_view(self):
+        self.assertSameContext(
+            areports_view, reverse('reports_view'),
+            ['department_report', 'monthly_trends'],
+        )
+
+
+@override_settings(CONCURRENT_QUERY_WORKERS=2)
+class ConcurrentQueryTests(SimpleTestCase):
+    def test_pool_threads_drop_old_connections_before_querying(self):
+        calls = []
+
+        with patch('arthsutra.concurrency.close_old_connections', side_effect=lambda: calls.append('close')):
+            results = async_to_sync(run_concurrently)({'total': lambda: calls.append('query') or 42})
+
+        self.assertEqual(results, {'total': 42})
+        self.assertEqual(calls, ['close', 'query'])
+
+
+def expense_departments_view(request):
+    """Reads each expense's department separately: the N+1 loop the profiler should flag"""
+    return HttpResponse(', '.join(expense.department.name for expense in Expense.objects.order_by('pk')))
+
+
+def department_rows_view(request):
+    for department in Department.objects.all():
+        list(department.expense_set.all())
+        list(department.income_set.all())
+    return HttpResponse()
+
+
+def pooled_queries_view(request):
+    def select_one():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0]
+
+    results = async_to_sync(run_concurrently)({'first': select_one, 'second': select_one})
+    return HttpResponse(str(sum(results.values())))
+
+
+urlpatterns = [
+    path('expense-departments/', expense_departments_view),
+    path('department-rows/', department_rows_view),
+    path('pooled-queries/', pooled_queries_view),
+]
+
+
+@override_settings(ROOT_URLCONF='reports.tests', SQL_PROFILING_SLOWEST=1, SQL_PROFILING_DUPLICATE_THRESHOLD=3)
+@modify_settings(MIDDLEWARE={'prepend': 'arthsutra.profiling.QueryProfilingMiddleware'})
+class QueryProfilingMiddlewareTests(TestCase):
+    """The profiler logs one JSON record per request, including queries run in pool threads"""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Cardiology', 'Radiology', 'Pharmacy'):
+            department = Department.objects.create(name=name)
+            Expense.objects.create(department=department, expense_type='Supplies', amount=10, date=date(2024, 1, 10))
+        Department.objects.create(name='Oncology')
+
+    def get_record(self, url):
+        with self.assertLogs('arthsutra.sql') as logs:
+            self.client.get(url)
+
+        self.assertEqual(len(logs.records), 1)
+        return logs.records[0], json.loads(logs.records[0].getMessage())
+
+    def test_repeated_statements_are_flagged_as_n_plus_one(self):
+        log_record, record = self.get_record('/expense-departments/')
+
+        self.assertEqual(log_record.levelname, 'WARNING')
+        self.assertEqual(record['path'], '/expense-departments/')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries'], 4)
+        self.assertEqual(len(record['duplicates']), 1)
+        self.assertEqual(record['duplicates'][0]['count'], 3)
+        self.assertIn('finance_department', record['duplicates'][0]['sql'])
+        self.assertEqual(record['n_plus_one'], True)
+        self.assertEqual(len(record['slowest']), 1)
+
+    def test_duplicates_are_not_cut_to_the_slowest_limit(self):
+        _, record = self.get_record('/department-rows/')
+
+        self.assertEqual(sorted(duplicate['count'] for duplicate in record['duplicates']), [4, 4])
+        self.assertEqual(len(record['slowest']), 1)
+
+    @override_settings(CONCURRENT_QUERY_WORKERS=2)
+    def test_queries_in_pool_threads_are_counted(self):
+        log_record, record = self.get_record('/pooled-queries/')
+
+        self.assertEqual(record['queries'], 2)
+        self.assertEqual(record['duplicates'], [{'sql': 'SELECT ?', 'count': 2}])
+        self.assertEqual(record['n_plus_one'], False)
+        self.assertEqual(log_record.levelname, 'INFO')
+
+
+class DashboardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def setUp(self):
+        cache.clear()
+
+    def fill(self):
+        for role in dashboard_cache.ALL_ROLES:
+            dashboard_cache.set_dashboard_context(role, 6, {'role': role})
+
+    def cached_roles(self):
+        return {role for role in dashboard_cache.ALL_ROLES if cache.get(dashboard_cache._key(role, 6)) is not None}
+
+    def test_changes_drop_the_roles_that_see_them_on_commit(self):
+        expense = Expense(department=self.cardiology, expense_type='Supplies', amount=40, date=date(2024, 3, 1))
+        income = Income(department=self.cardiology, service_type='Consultation', amount=100, date=date(2024, 3, 1))
+        loan = Loan(loan_name='Equipment', principal=100000, interest_rate=9, tenure_months=24, emi=4568.47)
+        kept = [
+            (expense, {'INCOME_USER'}),
+            (income, set()),
+            (loan, {'EXPENSE_USER', 'INCOME_USER'}),
+        ]
+        for instance, roles in kept:
+            for change in (instance.save, instance.delete):
+                with self.subTest(model=type(instance).__name__, change=change.__name__):
+                    self.fill()
+                    with self.captureOnCommitCallbacks(execute=True):
+                        change()
+                        # Still cached until the change is visible to other requests
+                        self.assertEqual(self.cached_roles(), set(dashboard_cache.ALL_ROLES))
+                    self.assertEqual(self.cached_roles(), roles)
+
+    def test_one_invalidation_per_transaction_and_kind(self):
+        Expense.objects.bulk_create(
+            Expense(department=self.cardiology, expense_type='Supplies', amount=40, date=date(2024, 3, day)) for day in range(1, 11)
+        )
+
+        with patch('reports.cache.invalidate_dashboard', wraps=dashboard_cache.invalidate_dashboard) as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.cardiology.delete()
+
+        self.assertEqual(sorted(call.args[0] for call in invalidate.call_args_list), ['DEPARTMENT', 'EXPENSE'])
+
+    def test_uploads_invalidate_once_per_chunk(self):
+        rows = [f'{self.cardiology.pk},Supplies,{amount},2024-03-01' for amount in range(1, 6)]
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            process_rows(self, process_expense_csv, 'EXPENSE', 'department_id,expense_type,amount,date', rows)
+
+        # Five rows in chunks of two
+        self.assertEqual(len(callbacks), 3)
+        self.fill()
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.cached_roles(), {'INCOME_USER'})
+
+    def test_hit_and_miss_counters(self):
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {'built': len(builds)}
+
+        self.assertEqual(dashboard_cache.cached_dashboard_context('ADMIN', 6, build), {'built': 1})
+        self.assertEqual(dashboard_cache.cached_dashboard_context('ADMIN', 6, build), {'built': 1})
+        self.assertEqual(dashboard_cache.cached_dashboard_context('ADMIN', 12, build), {'built': 2})
+        self.assertEqual(dashboard_cache.dashboard_cache_stats(), {'hits': 1, 'misses': 2, 'hit_rate': 0.333})
+
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('dashboard_cache_status')).json()['hits'], 1)
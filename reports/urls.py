@@ -1,7 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from .views import dashboard, reports_view
+from .views import (
+    adashboard, areports_view, dashboard, reports_view, dashboard_cache_status, export_transactions, export_department_report,
+    export_monthly_report, report_exports, report_export_status, report_export_download,
+)
+
+# ASGI deployments serve the async views, see settings.ASYNC_VIEWS
+dashboard_view = adashboard if settings.ASYNC_VIEWS else dashboard
+reports_page_view = areports_view if settings.ASYNC_VIEWS else reports_view
 
 urlpatterns = [
-    path('', dashboard, name='reports'),
-    path('reports/', reports_view, name='reports_view'),
+    path('', dashboard_view, name='reports'),
+    path('reports/', reports_page_view, name='reports_view'),
+    path('cache-stats/', dashboard_cache_status, name='dashboard_cache_status'),
+    path('export/transactions.csv', export_transactions, name='export_transactions'),
+    path('export/departments.csv', export_department_report, name='export_department_report'),
+    path('export/monthly.csv', export_monthly_report, name='export_monthly_report'),
+    path('exports/', report_exports, name='report_exports'),
+    path('exports/status/', report_export_status, name='report_export_status'),
+    path('exports/<int:export_id>/download/', report_export_download, name='report_export_download'),
 ]
@@ -1,16 +1,57 @@
-from django.shortcuts import render
-from django.db.models import Sum, Count
-from finance.models import Income, Expense, Department, Loan
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect, get_object_or_404
+from django.db.models import Sum
+from finance.models import Income, Expense, Loan
 from django.contrib.auth.decorators import login_required
-from django.utils import timezone
-from datetime import timedelta, date
 import json
 from accounts.decorators import admin_required
+from arthsutra.concurrency import run_concurrently
+from arthsutra.db_router import read_from_replica
+from django.contrib import messages
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from finance.api import filter_transactions
+from .cache import cached_dashboard_context, dashboard_cache_stats, get_dashboard_context, set_dashboard_context
+from .exports import TRANSACTION_HEADER, streaming_csv_response, transaction_rows, visible_sources
+from .models import ReportExport
+from .services import (
+    TREND_WINDOWS, department_totals, get_trend_window, month_starts, monthly_totals, monthly_trends, summary_total,
+    trend_rows, visible_department_totals, visible_summaries,
+)
 
 @login_required
+@read_from_replica
 def dashboard(request):
     user_role = request.user.role
+    trend_months = get_trend_window(request, default=6)
 
+    # The context only depends on the role and window, so it is shared by all users with that role
+    context = cached_dashboard_context(
+        user_role, trend_months, lambda: build_dashboard_context(user_role, trend_months)
+    )
+    return render(request, 'dashboard/dashboard_new.html', context)
+
+@login_required
+@read_from_replica
+async def adashboard(request):
+    """dashboard() for ASGI, running the independent queries of a cache miss at the same time"""
+    user = await request.auser()
+    trend_months = get_trend_window(request, default=6)
+
+    context = await sync_to_async(get_dashboard_context)(user.role, trend_months)
+    if context is None:
+        results = await run_concurrently(dashboard_queries(user.role, trend_months))
+        context = dashboard_context(user.role, trend_months, results)
+        await sync_to_async(set_dashboard_context)(user.role, trend_months, context)
+    return await sync_to_async(render)(request, 'dashboard/dashboard_new.html', context)
+
+def build_dashboard_context(user_role, trend_months):
+    queries = dashboard_queries(user_role, trend_months)
+    return dashboard_context(user_role, trend_months, {name: query() for name, query in queries.items()})
+
+def dashboard_queries(user_role, trend_months):
+    """The dashboard's independent queries by name, each a callable returning evaluated results"""
     # Filter data based on user role
     if user_role == 'ADMIN':
         # Show all data
@@ -33,72 +74,50 @@ def dashboard(request):
         expense_queryset = Expense.objects.none()
         loan_queryset = Loan.objects.none()
 
-    # Overall totals
-    total_income = income_queryset.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_expense = expense_queryset.aggregate(Sum('amount'))['amount__sum'] or 0
-    total_profit = total_income - total_expense
+    # Totals and trends come from the monthly summary, not the raw rows
+    income_summary, expense_summary = visible_summaries(user_role)
+    starts = month_starts(trend_months)
+
+    queries = {
+        'total_income': lambda: summary_total(income_summary),
+        'total_expense': lambda: summary_total(expense_summary),
+        'monthly_income': lambda: monthly_totals(income_summary, starts),
+        'monthly_expense': lambda: monthly_totals(expense_summary, starts),
+        'departments': department_totals,
+        # Recent transactions (filtered by role), evaluated so the context can be cached
+        'recent_expenses': lambda: list(expense_queryset.select_related('department').order_by('-date')[:10]),
+        'recent_income': lambda: list(income_queryset.select_related('department').order_by('-date')[:10]),
+    }
 
-    # Monthly data (last 6 months)
-    today = timezone.now().date()
-    months_data = []
-    for i in range(5, -1, -1):
-        month_start = today.replace(day=1) - timedelta(days=30*i)
-        month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    # Loan summary (only for admins)
+    if user_role == 'ADMIN':
+        queries['total_loans'] = lambda: loan_queryset.aggregate(Sum('principal'))['principal__sum'] or 0
+        queries['active_loans'] = loan_queryset.count
+    return queries
 
-        monthly_income = income_queryset.filter(date__range=[month_start, month_end]).aggregate(Sum('amount'))['amount__sum'] or 0
-        monthly_expense = expense_queryset.filter(date__range=[month_start, month_end]).aggregate(Sum('amount'))['amount__sum'] or 0
+def dashboard_context(user_role, trend_months, results):
+    """Template context from the results of dashboard_queries()"""
+    total_income = results['total_income']
+    total_expense = results['total_expense']
+    total_profit = total_income - total_expense
 
-        months_data.append({
-            'month': month_start.strftime('%b %Y'),
-            'income': float(monthly_income),
-            'expense': float(monthly_expense),
-            'profit': float(monthly_income - monthly_expense)
-        })
+    # Monthly data (last 6 months by default)
+    months_data = trend_rows(month_starts(trend_months), results['monthly_income'], results['monthly_expense'])
 
     # Department-wise summary (filtered by user role)
-    if user_role == 'ADMIN':
-        departments = list(Department.objects.annotate(
-            total_income=Sum('income__amount'),
-            total_expense=Sum('expense__amount'),
-            income_count=Count('income'),
-            expense_count=Count('expense')
-        ).values('name', 'total_income', 'total_expense', 'income_count', 'expense_count'))
-    elif user_role == 'EXPENSE_USER':
-        departments = list(Department.objects.annotate(
-            total_income=Sum('income__amount'),
-            total_expense=Sum('expense__amount'),
-            income_count=Count('income'),
-            expense_count=Count('expense')
-        ).values('name', 'total_income', 'total_expense', 'income_count', 'expense_count'))
+    departments = results['departments']
+    if user_role == 'EXPENSE_USER':
         # For expense users, show departments with expenses
-        departments = [d for d in departments if d['total_expense'] and d['total_expense'] > 0]
+        departments = [d for d in departments if d['total_expense'] > 0]
     elif user_role == 'INCOME_USER':
-        departments = list(Department.objects.annotate(
-            total_income=Sum('income__amount'),
-            total_expense=Sum('expense__amount'),
-            income_count=Count('income'),
-            expense_count=Count('expense')
-        ).values('name', 'total_income', 'total_expense', 'income_count', 'expense_count'))
         # For income users, show departments with income
-        departments = [d for d in departments if d['total_income'] and d['total_income'] > 0]
+        departments = [d for d in departments if d['total_income'] > 0]
 
     # Convert to JSON-serializable format
     for dept in departments:
         dept['total_income'] = float(dept['total_income'] or 0)
         dept['total_expense'] = float(dept['total_expense'] or 0)
 
-    # Recent transactions (filtered by role)
-    recent_expenses = expense_queryset.select_related('department').order_by('-date')[:10]
-    recent_income = income_queryset.select_related('department').order_by('-date')[:10]
-
-    # Loan summary (only for admins)
-    if user_role == 'ADMIN':
-        total_loans = loan_queryset.aggregate(Sum('principal'))['principal__sum'] or 0
-        active_loans = loan_queryset.count()
-    else:
-        total_loans = 0
-        active_loans = 0
-
     context = {
         'total_income': total_income,
         'total_expenses': total_expense,
@@ -108,90 +127,166 @@ def dashboard(request):
         'monthly_expenses': json.dumps([item['expense'] for item in months_data]),
         'department_labels': json.dumps([dept['name'] for dept in departments]),
         'department_data': json.dumps([dept['total_income'] for dept in departments]),
-        'recent_expenses': recent_expenses,
-        'recent_income': recent_income,
-        'total_loans': total_loans,
-        'active_loans': active_loans,
+        'recent_expenses': results['recent_expenses'],
+        'recent_income': results['recent_income'],
+        'total_loans': results.get('total_loans', 0),
+        'active_loans': results.get('active_loans', 0),
+        'trend_months': trend_months,
+        'trend_windows': TREND_WINDOWS,
         'user_role': user_role,
     }
 
-    return render(request, 'dashboard/dashboard_new.html', context)
+    return context
 
 @login_required
+@read_from_replica
 def reports_view(request):
     user_role = request.user.role
+    trend_months = get_trend_window(request, default=12)
 
-    # Filter data based on user role
-    if user_role == 'ADMIN':
-        income_queryset = Income.objects
-        expense_queryset = Expense.objects
-    elif user_role == 'EXPENSE_USER':
-        income_queryset = Income.objects.none()
-        expense_queryset = Expense.objects
-    elif user_role == 'INCOME_USER':
-        income_queryset = Income.objects
-        expense_queryset = Expense.objects.none()
-    else:
-        income_queryset = Income.objects.none()
-        expense_queryset = Expense.objects.none()
+    queries = reports_queries(user_role, trend_months)
+    context = reports_context(user_role, trend_months, {name: query() for name, query in queries.items()})
+    return render(request, 'reports/reports_new.html', context)
+
+@login_required
+@read_from_replica
+async def areports_view(request):
+    """reports_view() for ASGI, running its independent queries at the same time"""
+    user = await request.auser()
+    trend_months = get_trend_window(request, default=12)
+
+    results = await run_concurrently(reports_queries(user.role, trend_months))
+    context = reports_context(user.role, trend_months, results)
+    return await sync_to_async(render)(request, 'reports/reports_new.html', context)
+
+def reports_queries(user_role, trend_months):
+    """The reports page's independent queries by name, each a callable returning evaluated results"""
+    # Monthly trends - Last 12 months by default
+    income_summary, expense_summary = visible_summaries(user_role)
+    starts = month_starts(trend_months)
+    return {
+        'departments': department_totals,
+        'monthly_income': lambda: monthly_totals(income_summary, starts),
+        'monthly_expense': lambda: monthly_totals(expense_summary, starts),
+    }
 
+def reports_context(user_role, trend_months, results):
+    """Template context from the results of reports_queries()"""
     # Generate various reports
-    department_report = Department.objects.annotate(
-        income_total=Sum('income__amount'),
-        expense_total=Sum('expense__amount'),
-        transaction_count=Count('income') + Count('expense')
-    ).values('name', 'income_total', 'expense_total', 'transaction_count')
-
-    # Convert to list and calculate net profit
-    department_report = list(department_report)
-    for dept in department_report:
-        income = dept['income_total'] or 0
-        expense = dept['expense_total'] or 0
-        dept['net_profit'] = income - expense
+    department_report = [
+        {
+            'id': dept['id'],
+            'name': dept['name'],
+            'income_total': dept['total_income'],
+            'expense_total': dept['total_expense'],
+            'transaction_count': dept['income_count'] + dept['expense_count'],
+            'net_profit': dept['total_income'] - dept['total_expense'],
+        }
+        for dept in results['departments']
+    ]
 
     # Filter department report based on user role
     if user_role == 'EXPENSE_USER':
-        department_report = [d for d in department_report if d['expense_total'] and d['expense_total'] > 0]
+        department_report = [d for d in department_report if d['expense_total'] > 0]
     elif user_role == 'INCOME_USER':
-        department_report = [d for d in department_report if d['income_total'] and d['income_total'] > 0]
+        department_report = [d for d in department_report if d['income_total'] > 0]
 
-    # Monthly trends - Last 12 months
-    monthly_trends = []
-    today = timezone.now().date()
+    monthly_trends_data = trend_rows(
+        month_starts(trend_months), results['monthly_income'], results['monthly_expense'], label_format='%B %Y'
+    )
 
-    for i in range(11, -1, -1):  # From 11 months ago to current month
-        # Calculate the target month
-        year = today.year
-        month = today.month - i
+    context = {
+        'department_report': department_report,
+        'monthly_trends': monthly_trends_data,
+        'monthly_trends_json': json.dumps(monthly_trends_data),
+        'trend_months': trend_months,
+        'trend_windows': TREND_WINDOWS,
+        'user_role': user_role,
+    }
 
-        # Adjust for year wraparound
-        while month <= 0:
-            month += 12
-            year -= 1
+    return context
 
-        month_start = date(year, month, 1)
+@admin_required
+def dashboard_cache_status(request):
+    """Hit/miss counters of the per-role dashboard cache"""
+    return JsonResponse(dashboard_cache_stats())
 
-        # Calculate month end
-        if month == 12:
-            month_end = date(year + 1, 1, 1) - timedelta(days=1)
-        else:
-            month_end = date(year, month + 1, 1) - timedelta(days=1)
+@login_required
+def export_transactions(request):
+    """Expense and income rows the role may see as CSV, ?type=expense|income, ?date_from=, ?date_to=, ?department="""
+    kind = request.GET.get('type')
+    sources = [
+        source for source in visible_sources(request.user.role)
+        if kind in (None, '', source[0].lower())
+    ]
 
-        income = income_queryset.filter(date__range=[month_start, month_end]).aggregate(Sum('amount'))['amount__sum'] or 0
-        expense = expense_queryset.filter(date__range=[month_start, month_end]).aggregate(Sum('amount'))['amount__sum'] or 0
+    try:
+        sources = [(label, filter_transactions(queryset, request.GET), field) for label, queryset, field in sources]
+    except ValidationError as e:
+        return HttpResponseBadRequest('; '.join(f'{name}: {error}' for name, error in e.detail.items()))
 
-        monthly_trends.append({
-            'month': month_start.strftime('%B %Y'),
-            'income': float(income),
-            'expense': float(expense),
-            'profit': float(income - expense)
-        })
+    return streaming_csv_response('arthsutra_transactions.csv', TRANSACTION_HEADER, transaction_rows(sources))
 
-    context = {
-        'department_report': department_report,
-        'monthly_trends': monthly_trends,
-        'monthly_trends_json': json.dumps(monthly_trends),
-        'user_role': user_role,
-    }
+@login_required
+def export_department_report(request):
+    departments = visible_department_totals(request.user.role)
+    rows = (
+        (
+            dept['name'], round(dept['total_income'], 2), round(dept['total_expense'], 2),
+            round(dept['total_income'] - dept['total_expense'], 2), dept['income_count'] + dept['expense_count'],
+        )
+        for dept in departments
+    )
+    return streaming_csv_response(
+        'arthsutra_department_report.csv',
+        ['Department', 'Total Income', 'Total Expenses', 'Net Profit', 'Transactions'],
+        rows,
+    )
 
-    return render(request, 'reports/reports_new.html', context)
+@login_required
+def export_monthly_report(request):
+    trend_months = get_trend_window(request, default=12)
+    income_summary, expense_summary = visible_summaries(request.user.role)
+    trends = monthly_trends(income_summary, expense_summary, trend_months, label_format='%Y-%m')
+    rows = ((item['month'], item['income'], item['expense'], item['profit']) for item in trends)
+    return streaming_csv_response(
+        'arthsutra_monthly_report.csv', ['Month', 'Income', 'Expenses', 'Profit'], rows,
+    )
+
+def _parse_export_date(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+@login_required
+def report_exports(request):
+    """Request an Excel workbook and list the user's workbooks, built by the background worker"""
+    if request.method == 'POST':
+        date_from = _parse_export_date(request.POST.get('date_from'))
+        date_to = _parse_export_date(request.POST.get('date_to'))
+        if date_from and date_to and date_from > date_to:
+            messages.error(request, 'The start date must not be after the end date.')
+        else:
+            ReportExport.objects.create(user=request.user, date_from=date_from, date_to=date_to)
+            messages.info(request, 'Workbook queued. It will be ready to download here once it is built.')
+        return redirect('report_exports')
+
+    exports = ReportExport.objects.filter(user=request.user).order_by('-requested_at')[:50]
+    return render(request, 'reports/exports.html', {'exports': exports})
+
+@login_required
+def report_export_status(request):
+    """Progress of the current user's workbooks, polled by the exports page"""
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.isdigit()]
+    exports = ReportExport.objects.filter(user=request.user, id__in=ids).values(
+        'id', 'status', 'progress', 'rows_written', 'error_message'
+    )
+    return JsonResponse({'exports': list(exports)})
+
+@login_required
+def report_export_download(request, export_id):
+    export = get_object_or_404(ReportExport, id=export_id, user=request.user, status='PROCESSED')
+    if not export.file:
+        raise Http404('Workbook not found')
+    return FileResponse(export.file.open('rb'), as_attachment=True, filename=f'arthsutra_report_{export.pk}.xlsx')
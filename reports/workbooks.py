@@ -0,0 +1,110 @@
+"""
+Excel workbooks of the transactions a role may see.
+
+Workbooks are written with openpyxl in write-only mode: rows are appended to
+temporary worksheet files as they arrive and never held as cells in memory.
+Rows come from the same keyset batches as the CSV export, so a workbook of
+millions of rows is built in constant memory.
+"""
+import re
+
+from openpyxl import Workbook
+
+from finance.models import Department, MonthlyDepartmentSummary
+from finance.summary import month_of
+from .exports import transaction_rows, visible_sources
+
+# Rows per worksheet Excel can open, including the header
+EXCEL_MAX_ROWS = 1048576
+# Rows written between two progress reports
+PROGRESS_EVERY = 5000
+
+SHEET_HEADER = ['Date', 'Type', 'Category', 'Amount']
+SUMMARY_HEADER = ['Month', 'Department', 'Income', 'Expenses', 'Net', 'Income Transactions', 'Expense Transactions']
+
+_INVALID_TITLE = re.compile(r'[\[\]:*?/\\]')
+
+
+def sheet_title(name, used):
+    """A valid worksheet title for ``name``, unique among ``used`` (which it is added to)"""
+    base = ' '.join(_INVALID_TITLE.sub(' ', name).split())[:31] or 'Department'
+    title, number = base, 1
+    while title.lower() in used:
+        number += 1
+        suffix = f' ({number})'
+        title = base[:31 - len(suffix)] + suffix
+    used.add(title.lower())
+    return title
+
+
+def _summary_rows(user_role, date_from, date_to):
+    """One row per department and month from the monthly summary, oldest month first"""
+    kinds = [kind for kind, roles in (('INCOME', ['ADMIN', 'INCOME_USER']), ('EXPENSE', ['ADMIN', 'EXPENSE_USER']))
+             if user_role in roles]
+    summaries = MonthlyDepartmentSummary.objects.filter(kind__in=kinds)
+    if date_from:
+        summaries = summaries.filter(month__gte=month_of(date_from))
+    if date_to:
+        summaries = summaries.filter(month__lte=date_to)
+    summaries = summaries.order_by('month', 'department__name', 'department_id').values_list(
+        'month', 'department_id', 'department__name', 'kind', 'total', 'count'
+    )
+
+    current, row = None, None
+    for month, department_id, name, kind, total, count in summaries.iterator():
+        if (month, department_id) != current:
+            if row:
+                yield _summary_row(row)
+            current, row = (month, department_id), {'month': month, 'name': name}
+        row[kind] = (total, count)
+    if row:
+        yield _summary_row(row)
+
+
+def _summary_row(row):
+    income, income_count = row.get('INCOME', (0, 0))
+    expense, expense_count = row.get('EXPENSE', (0, 0))
+    return [row['month'].strftime('%Y-%m'), row['name'], income, expense, income - expense, income_count, expense_count]
+
+
+def build_workbook(path, user_role, date_from=None, date_to=None, progress=None):
+    """
+    Write a workbook to ``path``: a monthly summary sheet, then one sheet per
+    department with its transactions, newest first. A department with more
+    rows than a sheet holds continues on further sheets.
+
+    ``progress(rows_written)`` is called every PROGRESS_EVERY rows. Returns
+    the number of transaction rows written.
+    """
+    workbook = Workbook(write_only=True)
+    used = set()
+
+    summary_sheet = workbook.create_sheet(sheet_title('Monthly Summary', used))
+    summary_sheet.append(SUMMARY_HEADER)
+    for row in _summary_rows(user_role, date_from, date_to):
+        summary_sheet.append(row)
+
+    written = 0
+    sources = visible_sources(user_role, date_from, date_to)
+    for department_id, name in Department.objects.order_by('name', 'id').values_list('id', 'name'):
+        department_sources = [
+            (label, queryset.filter(department_id=department_id), text_field)
+            for label, queryset, text_field in sources
+        ]
+        sheet, sheet_rows = None, EXCEL_MAX_ROWS
+        for row_date, label, _, category, amount in transaction_rows(department_sources):
+            if sheet_rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(sheet_title(name, used))
+                sheet.append(SHEET_HEADER)
+                sheet_rows = 1
+            sheet.append([row_date, label, category, amount])
+            sheet_rows += 1
+            written += 1
+            if progress and written % PROGRESS_EVERY == 0:
+                progress(written)
+        if sheet is None:
+            sheet = workbook.create_sheet(sheet_title(name, used))
+            sheet.append(SHEET_HEADER)
+
+    workbook.save(path)
+    return written
@@ -0,0 +1,136 @@
+"""
+Batch uploads: several files, or ZIP archives of them, in one request.
+
+Archives are unpacked in the request and every data file becomes an
+UploadedFile of its own, with its type read from its header row, or WORKBOOK
+for .xlsx files with the sheets of an accounting workbook. The upload
+workers then process them in parallel, except that expense and income files
+wait for the department files their user queued with or before them (see
+uploads.jobs.departments_settled).
+"""
+import csv
+import io
+import os
+import zipfile
+import zlib
+
+from django.core.files.base import ContentFile
+
+from .csv_processor import WORKBOOK_SHEETS
+
+ALLOWED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+# Archives are unpacked in memory, these bound what one may expand to
+MAX_ARCHIVE_FILES = 100
+MAX_ARCHIVE_SIZE = 100 * 1024 * 1024
+
+# Raised by ZipFile.read() for corrupt, encrypted or unsupported members
+MEMBER_ERRORS = (zipfile.BadZipFile, zlib.error, RuntimeError, NotImplementedError, EOFError)
+
+# Position of each file type in the queue, files that others depend on go first
+QUEUE_ORDER = {'DEPARTMENT': 0, 'WORKBOOK': 1}
+
+# Header columns that identify a file type, checked in this order
+TYPE_COLUMNS = (
+    ('expense_type', 'EXPENSE'),
+    ('service_type', 'INCOME'),
+    ('name', 'DEPARTMENT'),
+)
+
+
+def _is_hidden(path):
+    # Skips e.g. __MACOSX/ resource forks and .DS_Store
+    return any(part.startswith(('.', '__')) for part in path.split('/'))
+
+
+def expand_archives(files):
+    """
+    ``files`` with every ``.zip`` replaced by the files it contains, and a list
+    of error messages for the archives and members that could not be unpacked.
+    """
+    expanded, errors = [], []
+    for file in files:
+        if not file.name.lower().endswith('.zip'):
+            expanded.append(file)
+            continue
+        try:
+            archive = zipfile.ZipFile(file)
+        except zipfile.BadZipFile:
+            errors.append(f'{file.name} is not a valid ZIP archive.')
+            continue
+        with archive:
+            members = [info for info in archive.infolist() if not info.is_dir() and not _is_hidden(info.filename)]
+            if len(members) > MAX_ARCHIVE_FILES or sum(info.file_size for info in members) > MAX_ARCHIVE_SIZE:
+                errors.append(
+                    f'{file.name} is too large, archives may hold up to {MAX_ARCHIVE_FILES} files '
+                    f'and {MAX_ARCHIVE_SIZE // (1024 * 1024)} MB.'
+                )
+                continue
+            for info in members:
+                try:
+                    content = archive.read(info)
+                except MEMBER_ERRORS as e:
+                    errors.append(f'{file.name}: {info.filename} could not be extracted ({e}).')
+                    continue
+                expanded.append(ContentFile(content, name=os.path.basename(info.filename)))
+    return expanded, errors
+
+
+def _is_workbook(file):
+    """Whether an uploaded .xlsx file has more than one of the sheets of an accounting workbook"""
+    from openpyxl import load_workbook
+
+    file.seek(0)
+    try:
+        workbook = load_workbook(file, read_only=True)
+        try:
+            names = {name.strip().lower() for name in workbook.sheetnames}
+        finally:
+            workbook.close()
+    except Exception:
+        return False
+    finally:
+        file.seek(0)
+    return sum(title.lower() in names for title, _ in WORKBOOK_SHEETS) > 1
+
+
+def _header(file):
+    """Column names of the first row of an uploaded CSV or Excel file, rewound afterwards"""
+    extension = os.path.splitext(file.name)[1].lower()
+    file.seek(0)
+    try:
+        if extension == '.csv':
+            line = file.readline()
+            if isinstance(line, bytes):
+                line = line.decode('utf-8-sig', errors='replace')
+            return next(csv.reader(io.StringIO(line)), [])
+        if extension == '.xlsx':
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(file, read_only=True, data_only=True)
+            try:
+                row = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+            finally:
+                workbook.close()
+            return [str(value) for value in row if value is not None]
+        import pandas as pd
+        return [str(column) for column in pd.read_excel(file, nrows=0).columns]
+    except Exception:
+        return []
+    finally:
+        file.seek(0)
+
+
+def detect_file_type(file):
+    """
+    WORKBOOK for an .xlsx file with the sheets of an accounting workbook,
+    otherwise EXPENSE, INCOME or DEPARTMENT from the header row of the file,
+    None if it matches none
+    """
+    if file.name.lower().endswith('.xlsx') and _is_workbook(file):
+        return 'WORKBOOK'
+    columns = {column.strip() for column in _header(file)}
+    for column, file_type in TYPE_COLUMNS:
+        if column in columns:
+            return file_type
+    return None
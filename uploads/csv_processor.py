@@ -1,141 +1,627 @@
-import pandas as pd
+"""
+Upload processing for expense, income and department files, and for
+workbooks holding all three as sheets.
+
+CSV files are streamed with the csv module (see uploads.csv_reader). pandas
+and openpyxl are imported inside the functions that read Excel files or
+parse dates that are not ISO 8601, so importing this module, which the
+upload views do, stays cheap.
+
+With UPLOAD_PIPELINE_WORKERS set, chunks are validated in a process pool
+while earlier ones are written (see uploads.pipeline).
+"""
+import functools
+import hashlib
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from finance import summary
+from finance.fingerprints import existing_fingerprints, fingerprints_for
 from finance.models import Expense, Income, Department
+from finance.names import department_key
+from .csv_reader import CsvChunk, iter_csv_chunks, to_date, to_decimal, to_int
 from .models import UploadedFile
+from .pipeline import pipelined
+from .signals import rows_imported
 import logging
 
 logger = logging.getLogger(__name__)
 
-def process_expense_csv(file_path, uploaded_file):
-    """Process expense CSV/Excel file"""
+# Rows read from the file and committed per chunk
+CHUNK_SIZE = 10000
+
+# Rows per INSERT statement issued by bulk_create
+BULK_BATCH_SIZE = 1000
+
+# Rejected rows beyond this are counted but not written to the error report
+MAX_REPORTED_ERRORS = 1000
+
+# Largest absolute amount that fits DecimalField(max_digits=10, decimal_places=2)
+MAX_AMOUNT = 10 ** 8
+
+# Sheets of an accounting workbook (file type WORKBOOK), in import order
+WORKBOOK_SHEETS = (
+    ('Departments', 'DEPARTMENT'),
+    ('Expenses', 'EXPENSE'),
+    ('Income', 'INCOME'),
+)
+
+
+def _iter_chunks(file_path, chunksize=CHUNK_SIZE):
+    """
+    Yield the file in chunks of at most ``chunksize`` rows: CsvChunks for CSV
+    files, DataFrames for Excel files.
+
+    The index keeps counting across chunks so row numbers in error reports
+    refer to the whole file. Legacy ``.xls`` files have no streaming reader
+    and are returned as a single chunk.
+    """
+    if file_path.endswith('.csv'):
+        yield from iter_csv_chunks(file_path, chunksize)
+    elif file_path.endswith('.xlsx'):
+        yield from _iter_xlsx_chunks(file_path, chunksize)
+    else:
+        import pandas as pd
+        yield pd.read_excel(file_path)
+
+
+def _iter_xlsx_chunks(file_path, chunksize):
+    """Stream the first worksheet with openpyxl in read-only mode"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
+        yield from _iter_sheet_chunks(workbook.worksheets[0], chunksize)
+    finally:
+        workbook.close()
+
+
+def _iter_sheet_chunks(worksheet, chunksize):
+    """DataFrame chunks of a read-only worksheet whose first row holds the column names"""
+    import pandas as pd
+
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [str(value).strip() if value is not None else '' for value in header]
+    width = len(columns)
+
+    batch, index = [], []
+    for position, row in enumerate(rows):
+        if all(value is None for value in row):
+            continue
+        # Read-only worksheets may report ragged rows
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        batch.append(row)
+        index.append(position)
+        if len(batch) >= chunksize:
+            yield pd.DataFrame(batch, columns=columns, index=index)
+            batch, index = [], []
+    if batch:
+        yield pd.DataFrame(batch, columns=columns, index=index)
+
+
+def _coerced_chunks(chunks, coerce, workers=None):
+    """
+    ``(chunk, coerce(chunk))`` for every item of ``chunks``, in order. With
+    ``workers`` (default settings.UPLOAD_PIPELINE_WORKERS) of 1 or more, the
+    chunks are read and coerced ahead of the caller in that many processes.
+    """
+    if workers is None:
+        workers = getattr(settings, 'UPLOAD_PIPELINE_WORKERS', 0)
+    if workers < 1:
+        return ((chunk, coerce(chunk)) for chunk in chunks)
+    return pipelined(chunks, coerce, workers)
+
+
+def content_hash(file):
+    """SHA-256 hex digest of an uploaded file, read in chunks and rewound afterwards"""
+    digest = hashlib.sha256()
+    for block in file.chunks():
+        digest.update(block)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def estimate_row_count(file_path):
+    """
+    Cheap data row count used for progress reporting.
+
+    CSV files are counted by newlines without parsing, so quoted multi-line
+    fields make it an estimate. For .xlsx the worksheet dimension is used.
+    """
+    if file_path.endswith('.csv'):
+        lines = 0
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                lines += block.count(b'\n')
+        return max(lines - 1, 0)
+    if file_path.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            return max((workbook.worksheets[0].max_row or 1) - 1, 0)
+        finally:
+            workbook.close()
+    return 0
+
+
+def _record_throughput(uploaded_file, row_count, started):
+    """Set ``rows_per_second``, counting every row read, stored or not, since ``started`` (a perf_counter())"""
+    elapsed = time.perf_counter() - started
+    uploaded_file.rows_per_second = round(row_count / elapsed, 1) if elapsed > 0 else 0
+    logger.info(f"Upload {uploaded_file.pk}: {row_count} rows in {elapsed:.2f}s, {uploaded_file.rows_per_second} rows/s")
+
+
+def _report_progress(uploaded_file, processed_count, skipped_count, duplicate_count=0):
+    """Persist running counters after each committed chunk"""
+    uploaded_file.records_processed = processed_count
+    uploaded_file.records_skipped = skipped_count
+    uploaded_file.records_duplicate = duplicate_count
+    if uploaded_file.total_rows:
+        # Completion is recorded by the job runner, cap the estimate below it
+        done = processed_count + skipped_count + duplicate_count
+        uploaded_file.progress = min(99, done * 100 // uploaded_file.total_rows)
+    UploadedFile.objects.filter(pk=uploaded_file.pk).update(
+        records_processed=processed_count,
+        records_skipped=skipped_count,
+        records_duplicate=duplicate_count,
+        progress=uploaded_file.progress,
+    )
+    logger.info(
+        f"Upload {uploaded_file.pk}: {processed_count} rows processed, {skipped_count} skipped, "
+        f"{duplicate_count} duplicates"
+    )
+
+
+def _parse_dates(values):
+    """Parse a date column in one pass, falling back to per-value parsing only for non-ISO values"""
+    import pandas as pd
+
+    dates = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(values[retry].astype(str), errors='coerce', format='mixed')
+    return dates
+
+
+def _department_checks(df, valid_department_ids, department_names):
+    """
+    department_id of every row and the checks it must pass. Files give either
+    a ``department_id`` column or a ``department`` column of names, which are
+    resolved through ``department_names`` (department_key(name) -> id).
+    """
+    import pandas as pd
+
+    if 'department_id' in df.columns:
+        department_ids = pd.to_numeric(df['department_id'], errors='coerce')
+        invalid_department = department_ids.isna() | (department_ids % 1 != 0)
+        return department_ids, [
+            (invalid_department, 'invalid department_id'),
+            (~invalid_department & ~department_ids.isin(valid_department_ids), 'department does not exist'),
+        ]
+
+    names = df['department'].astype('string').str.strip()
+    department_ids = pd.to_numeric(names.map(department_key, na_action='ignore').map(department_names), errors='coerce')
+    return department_ids, [
+        (names.isna() | (names == ''), 'missing department'),
+        (department_ids.isna(), 'department does not exist'),
+    ]
+
+
+def _coerce_transactions(chunk, text_column, valid_department_ids, department_names=None):
+    """
+    Validate and coerce one chunk of an expense/income file.
+
+    Returns the accepted rows as (department_id, text, amount, date) tuples and
+    a list of (row_number, reason) tuples for the rejected ones. Row numbers
+    match the spreadsheet, i.e. the header is row 1. Runs in pipeline worker
+    processes, so it must not touch the database.
+    """
+    # Expected columns: department_id (or department, by name), <text_column>, amount, date
+    required_columns = [text_column, 'amount', 'date']
+    has_department = 'department_id' in chunk.columns or 'department' in chunk.columns
+    if not has_department or not all(col in chunk.columns for col in required_columns):
+        raise ValueError(
+            f"Missing required columns. Expected: department_id (or department), {', '.join(required_columns)}"
+        )
+
+    if isinstance(chunk, CsvChunk):
+        return _coerce_csv_transactions(chunk, text_column, valid_department_ids, department_names or {})
+    return _coerce_frame_transactions(chunk, text_column, valid_department_ids, department_names)
+
+
+def _coerce_csv_transactions(chunk, text_column, valid_department_ids, department_names):
+    """Row by row coercion of a CsvChunk, only dates that are not ISO 8601 go through pandas"""
+    by_id = 'department_id' in chunk.columns
+    dates = chunk.column('date')
+    parsed_dates = [to_date(value) for value in dates]
+    retry = [position for position, value in enumerate(dates) if parsed_dates[position] is None and value.strip()]
+    if retry:
+        import pandas as pd
+
+        fallback = _parse_dates(pd.Series([dates[position] for position in retry], dtype='object'))
+        for position, parsed in zip(retry, fallback):
+            parsed_dates[position] = None if pd.isna(parsed) else parsed.date()
+
+    rows, errors = [], []
+    columns = zip(
+        chunk.index, chunk.column('department_id' if by_id else 'department'),
+        chunk.column(text_column), chunk.column('amount'), parsed_dates,
+    )
+    for index, department, text, amount, row_date in columns:
+        # Checks run in the same order as for DataFrames, the first failure is reported
+        if by_id:
+            department_id = to_int(department)
+            reason = (
+                'invalid department_id' if department_id is None
+                else 'department does not exist' if department_id not in valid_department_ids
+                else None
+            )
         else:
-            df = pd.read_excel(file_path)
-
-        # Expected columns: department_id, expense_type, amount, date
-        required_columns = ['department_id', 'expense_type', 'amount', 'date']
-        if not all(col in df.columns for col in required_columns):
-            raise ValueError(f"Missing required columns. Expected: {required_columns}")
-
-        processed_count = 0
-        skipped_count = 0
-        for _, row in df.iterrows():
-            try:
-                # Check if department exists
-                department_id = int(row['department_id'])
-                if not Department.objects.filter(id=department_id).exists():
-                    logger.warning(f"Department with ID {department_id} does not exist, skipping expense row")
-                    skipped_count += 1
-                    continue
-
-                Expense.objects.create(
-                    department_id=department_id,
-                    expense_type=str(row['expense_type']),
-                    amount=float(row['amount']),
-                    date=pd.to_datetime(row['date']).date()
-                )
-                processed_count += 1
-            except Exception as e:
-                logger.error(f"Error processing expense row: {e}")
-                skipped_count += 1
-                continue
+            name = department.strip()
+            department_id = department_names.get(department_key(name))
+            reason = 'missing department' if not name else 'department does not exist' if department_id is None else None
+        text = text.strip()
+        amount = to_decimal(amount)
+        reason = reason or (
+            f'missing {text_column}' if not text
+            else 'invalid amount' if amount is None
+            else 'amount out of range' if abs(amount) >= MAX_AMOUNT
+            else 'invalid date' if row_date is None
+            else None
+        )
+        if reason:
+            errors.append((index + 2, reason))
+        else:
+            rows.append((department_id, text, amount, row_date))
+    return rows, errors
+
+
+def _coerce_frame_transactions(df, text_column, valid_department_ids, department_names=None):
+    """Validate and coerce a whole expense/income DataFrame at once"""
+    import pandas as pd
+
+    department_ids, department_checks = _department_checks(df, valid_department_ids, department_names or {})
+    amounts = pd.to_numeric(df['amount'], errors='coerce').round(2)
+    dates = _parse_dates(df['date'])
+    texts = df[text_column].astype('string').str.strip()
+
+    checks = department_checks + [
+        (texts.isna() | (texts == ''), f'missing {text_column}'),
+        (amounts.isna(), 'invalid amount'),
+        (amounts.abs() >= MAX_AMOUNT, 'amount out of range'),
+        (dates.isna(), 'invalid date'),
+    ]
+
+    # Keep only the first failing check per row
+    reasons = pd.Series(pd.NA, index=df.index, dtype='object')
+    for mask, reason in checks:
+        reasons = reasons.mask(mask & reasons.isna(), reason)
+    rejected = reasons.notna()
 
-        uploaded_file.records_processed = processed_count
+    errors = [(int(index) + 2, reason) for index, reason in reasons[rejected].items()]
+
+    accepted = ~rejected
+    rows = list(zip(
+        department_ids[accepted].astype('int64').tolist(),
+        texts[accepted].tolist(),
+        amounts[accepted].tolist(),
+        dates[accepted].dt.date.tolist(),
+    ))
+    return rows, errors
+
+
+def _drop_duplicates(model, rows, seen):
+    """
+    Fingerprint a chunk of cleaned rows and drop those already stored.
+
+    ``seen`` counts the rows of earlier chunks of the same file so repeated
+    rows keep their occurrence numbers. Returns the new rows with their
+    fingerprint appended and the number of duplicates dropped.
+    """
+    fingerprints = fingerprints_for(rows, seen)
+    existing = existing_fingerprints(model, fingerprints)
+    new = [(*row, fingerprint) for row, fingerprint in zip(rows, fingerprints) if fingerprint not in existing]
+    return new, len(rows) - len(new)
+
+
+def _bulk_insert(model, rows, text_column):
+    """
+    Insert one chunk of cleaned, fingerprinted rows with batched bulk_create and
+    add it to the monthly summary, both inside one transaction. bulk_create
+    sends no signals and skips save(), so the fingerprints come with the rows.
+    """
+    with transaction.atomic():
+        batch = []
+        for department_id, text, amount, row_date, fingerprint in rows:
+            batch.append(model(
+                department_id=department_id,
+                amount=amount,
+                date=row_date,
+                fingerprint=fingerprint,
+                **{text_column: text},
+            ))
+            if len(batch) >= BULK_BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+        summary.apply_deltas(
+            summary.kind_for(model),
+            summary.deltas_from_rows((department_id, amount, row_date) for department_id, _, amount, row_date, _ in rows),
+        )
+        rows_imported.send(sender=model)
+
+
+def _format_error_report(errors, skipped_count, prefix=''):
+    lines = [f"{prefix}Row {row}: {reason}" for row, reason in errors[:MAX_REPORTED_ERRORS]]
+    if skipped_count > MAX_REPORTED_ERRORS:
+        lines.append(f"{prefix}... and {skipped_count - MAX_REPORTED_ERRORS} more rejected rows")
+    return "\n".join(lines)
+
+
+def _transaction_coercer(text_column):
+    """_coerce_transactions bound to the departments that exist now, picklable for pipeline workers"""
+    # Both lookups are built once per file and shared by every chunk
+    departments = Department.objects.values_list('name', 'id')
+    return functools.partial(
+        _coerce_transactions,
+        text_column=text_column,
+        valid_department_ids={pk for _, pk in departments},
+        department_names={department_key(name): pk for name, pk in departments},
+    )
+
+
+def _ingest_transactions(coerced_chunks, model, text_column, progress=None):
+    """
+    Fingerprint and insert coerced expense/income chunks, in file order.
+    ``progress(processed, skipped, duplicates)`` is called after every chunk.
+    Returns the processed, skipped and duplicate counts and the first
+    MAX_REPORTED_ERRORS errors.
+    """
+    processed_count = 0
+    skipped_count = 0
+    duplicate_count = 0
+    errors = []
+    seen = Counter()
+    for chunk, (rows, chunk_errors) in coerced_chunks:
+        rows, chunk_duplicates = _drop_duplicates(model, rows, seen)
+        _bulk_insert(model, rows, text_column)
+
+        processed_count += len(rows)
+        skipped_count += len(chunk_errors)
+        duplicate_count += chunk_duplicates
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        if progress:
+            progress(processed_count, skipped_count, duplicate_count)
+    return processed_count, skipped_count, duplicate_count, errors
+
+
+def _process_transactions(file_path, uploaded_file, model, text_column, chunksize=CHUNK_SIZE, workers=None):
+    """
+    Shared bulk ingestion path for expense and income files, committed chunk
+    by chunk. Fingerprinting and inserts stay in this process, in file order.
+    """
+    label = model._meta.verbose_name
+    started = time.perf_counter()
+    try:
+        coerced_chunks = _coerced_chunks(_iter_chunks(file_path, chunksize), _transaction_coercer(text_column), workers)
+        processed_count, skipped_count, duplicate_count, errors = _ingest_transactions(
+            coerced_chunks, model, text_column, progress=functools.partial(_report_progress, uploaded_file),
+        )
+
+        uploaded_file.processing_details = _format_error_report(errors, skipped_count)
+        _record_throughput(uploaded_file, processed_count + skipped_count + duplicate_count, started)
         uploaded_file.processed = True
         uploaded_file.save()
 
         if skipped_count > 0:
-            logger.warning(f"Skipped {skipped_count} expense rows due to errors")
+            logger.warning(f"Skipped {skipped_count} {label} rows due to errors")
+        if duplicate_count > 0:
+            logger.info(f"Skipped {duplicate_count} {label} rows already stored")
 
         return processed_count
 
     except Exception as e:
-        logger.error(f"Error processing expense file: {e}")
+        logger.error(f"Error processing {label} file: {e}")
         uploaded_file.processed = False
         uploaded_file.save()
         raise
 
-def process_income_csv(file_path, uploaded_file):
+def process_expense_csv(file_path, uploaded_file, chunksize=CHUNK_SIZE, workers=None):
+    """Process expense CSV/Excel file"""
+    return _process_transactions(file_path, uploaded_file, Expense, 'expense_type', chunksize, workers)
+
+def process_income_csv(file_path, uploaded_file, chunksize=CHUNK_SIZE, workers=None):
     """Process income CSV/Excel file"""
+    return _process_transactions(file_path, uploaded_file, Income, 'service_type', chunksize, workers)
+
+# Model and text column of each transaction file type
+TRANSACTION_MODELS = {
+    'EXPENSE': (Expense, 'expense_type'),
+    'INCOME': (Income, 'service_type'),
+}
+
+def _coerce_departments(chunk):
+    """Accepted department names of a chunk, first occurrence of each department_key only, and (row_number, reason) of the rejected rows"""
+    # Expected columns: name
+    if 'name' not in chunk.columns:
+        raise ValueError("Missing required column: name")
+
+    max_length = Department._meta.get_field('name').max_length
+    if isinstance(chunk, CsvChunk):
+        names, errors = [], []
+        for index, name in zip(chunk.index, chunk.column('name')):
+            name = name.strip()
+            if not name:
+                errors.append((index + 2, 'missing name'))
+            elif len(name) > max_length:
+                errors.append((index + 2, f'name longer than {max_length} characters'))
+            else:
+                names.append(name)
+        return _first_per_key(names), errors
+
+    import pandas as pd
+
+    names = chunk['name'].astype('string').str.strip()
+    checks = [
+        (names.isna() | (names == ''), 'missing name'),
+        (names.str.len() > max_length, f'name longer than {max_length} characters'),
+    ]
+
+    reasons = pd.Series(pd.NA, index=chunk.index, dtype='object')
+    for mask, reason in checks:
+        reasons = reasons.mask(mask.fillna(False).astype(bool) & reasons.isna(), reason)
+    rejected = reasons.notna()
+
+    errors = [(int(index) + 2, reason) for index, reason in reasons[rejected].items()]
+    return _first_per_key(names[~rejected]), errors
+
+
+def _first_per_key(names):
+    """The first of ``names`` that the database would take for the same name, see department_key"""
+    unique = {}
+    for name in names:
+        unique.setdefault(department_key(name), name)
+    return list(unique.values())
+
+
+def _ingest_departments(coerced_chunks, progress=None):
+    """
+    Insert coerced department chunks, each with one bulk_create that ignores
+    names which already exist, relying on the unique constraint on
+    Department.name instead of a lookup per row. Names are also compared by
+    department_key against the departments there were and the earlier chunks,
+    so a database that compares exactly does not store 'ICU' and 'icu' twice.
+    Returns the processed and skipped counts and the first MAX_REPORTED_ERRORS
+    errors.
+    """
+    processed_count = 0
+    skipped_count = 0
+    errors = []
+    known = {department_key(name) for name in Department.objects.values_list('name', flat=True)}
+    for chunk, (names, chunk_errors) in coerced_chunks:
+        names = [name for name in names if department_key(name) not in known]
+        known.update(department_key(name) for name in names)
+        if names:
+            Department.objects.bulk_create(
+                [Department(name=name) for name in names],
+                batch_size=BULK_BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            rows_imported.send(sender=Department)
+
+        processed_count += len(chunk) - len(chunk_errors)
+        skipped_count += len(chunk_errors)
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        if progress:
+            progress(processed_count, skipped_count)
+    return processed_count, skipped_count, errors
+
+
+def process_department_csv(file_path, uploaded_file, chunksize=CHUNK_SIZE, workers=None):
+    """Process department CSV/Excel file"""
+    started = time.perf_counter()
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
-
-        # Expected columns: department_id, service_type, amount, date
-        required_columns = ['department_id', 'service_type', 'amount', 'date']
-        if not all(col in df.columns for col in required_columns):
-            raise ValueError(f"Missing required columns. Expected: {required_columns}")
-
-        processed_count = 0
-        skipped_count = 0
-        for _, row in df.iterrows():
-            try:
-                # Check if department exists
-                department_id = int(row['department_id'])
-                if not Department.objects.filter(id=department_id).exists():
-                    logger.warning(f"Department with ID {department_id} does not exist, skipping income row")
-                    skipped_count += 1
-                    continue
-
-                Income.objects.create(
-                    department_id=department_id,
-                    service_type=str(row['service_type']),
-                    amount=float(row['amount']),
-                    date=pd.to_datetime(row['date']).date()
-                )
-                processed_count += 1
-            except Exception as e:
-                logger.error(f"Error processing income row: {e}")
-                skipped_count += 1
-                continue
+        processed_count, skipped_count, errors = _ingest_departments(
+            _coerced_chunks(_iter_chunks(file_path, chunksize), _coerce_departments, workers),
+            progress=functools.partial(_report_progress, uploaded_file),
+        )
 
-        uploaded_file.records_processed = processed_count
+        uploaded_file.processing_details = _format_error_report(errors, skipped_count)
+        _record_throughput(uploaded_file, processed_count + skipped_count, started)
         uploaded_file.processed = True
         uploaded_file.save()
 
-        if skipped_count > 0:
-            logger.warning(f"Skipped {skipped_count} income rows due to errors")
-
         return processed_count
 
     except Exception as e:
-        logger.error(f"Error processing income file: {e}")
+        logger.error(f"Error processing department file: {e}")
         uploaded_file.processed = False
         uploaded_file.save()
         raise
 
-def process_department_csv(file_path, uploaded_file):
-    """Process department CSV/Excel file"""
+
+def workbook_sheets(workbook):
+    """
+    ``[(title, file_type, worksheet)]`` of the WORKBOOK_SHEETS an openpyxl
+    workbook has, in import order. Sheet names match case-insensitively.
+    """
+    by_name = {worksheet.title.strip().lower(): worksheet for worksheet in workbook.worksheets}
+    return [
+        (title, file_type, by_name[title.lower()])
+        for title, file_type in WORKBOOK_SHEETS if title.lower() in by_name
+    ]
+
+
+def process_workbook(file_path, uploaded_file, chunksize=CHUNK_SIZE, workers=None):
+    """
+    Import the Departments, Expenses and Income sheets of one .xlsx file.
+
+    The workbook is opened once, in read-only mode, and its sheets are
+    streamed in that order inside a single transaction: expense and income
+    rows can reference departments the same file adds, and a sheet that
+    fails leaves nothing of the workbook behind. Per-sheet counts are kept in
+    ``uploaded_file.sheet_counts``, the totals in the usual counters.
+    """
+    from openpyxl import load_workbook
+
+    started = time.perf_counter()
     try:
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
-
-        # Expected columns: name
-        if 'name' not in df.columns:
-            raise ValueError("Missing required column: name")
-
-        processed_count = 0
-        for _, row in df.iterrows():
-            try:
-                Department.objects.get_or_create(name=str(row['name']))
-                processed_count += 1
-            except Exception as e:
-                logger.error(f"Error processing department row: {e}")
-                continue
-
-        uploaded_file.records_processed = processed_count
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheets = workbook_sheets(workbook)
+            if not sheets:
+                raise ValueError(
+                    f"Workbook has none of the sheets {', '.join(title for title, _ in WORKBOOK_SHEETS)}"
+                )
+
+            sheet_counts = {}
+            reports = []
+            with transaction.atomic():
+                for title, file_type, worksheet in sheets:
+                    chunks = _iter_sheet_chunks(worksheet, chunksize)
+                    if file_type == 'DEPARTMENT':
+                        processed, skipped, errors = _ingest_departments(
+                            _coerced_chunks(chunks, _coerce_departments, workers)
+                        )
+                        sheet_counts[title] = {'processed': processed, 'skipped': skipped}
+                    else:
+                        model, text_column = TRANSACTION_MODELS[file_type]
+                        # Built per sheet, so the departments of the Departments sheet are known
+                        coerced_chunks = _coerced_chunks(chunks, _transaction_coercer(text_column), workers)
+                        processed, skipped, duplicates, errors = _ingest_transactions(
+                            coerced_chunks, model, text_column
+                        )
+                        sheet_counts[title] = {'processed': processed, 'skipped': skipped, 'duplicate': duplicates}
+                    if skipped:
+                        reports.append(_format_error_report(errors, skipped, prefix=f'{title}: '))
+        finally:
+            workbook.close()
+
+        uploaded_file.sheet_counts = sheet_counts
+        uploaded_file.records_processed = sum(counts['processed'] for counts in sheet_counts.values())
+        uploaded_file.records_skipped = sum(counts['skipped'] for counts in sheet_counts.values())
+        uploaded_file.records_duplicate = sum(counts.get('duplicate', 0) for counts in sheet_counts.values())
+        uploaded_file.processing_details = "\n".join(reports)
+        _record_throughput(
+            uploaded_file,
+            uploaded_file.records_processed + uploaded_file.records_skipped + uploaded_file.records_duplicate,
+            started,
+        )
         uploaded_file.processed = True
         uploaded_file.save()
 
-        return processed_count
+        logger.info(f"Upload {uploaded_file.pk}: workbook sheets {sheet_counts}")
+        return uploaded_file.records_processed
 
     except Exception as e:
-        logger.error(f"Error processing department file: {e}")
+        logger.error(f"Error processing workbook: {e}")
         uploaded_file.processed = False
         uploaded_file.save()
         raise
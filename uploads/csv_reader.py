@@ -0,0 +1,99 @@
+"""
+Streaming CSV reader with typed column coercion, standard library only.
+
+Plain CSV uploads are read with the csv module in chunks of rows and their
+values coerced one by one, so neither pandas nor NumPy is imported for them.
+The coercion helpers return None for values they cannot convert, the
+callers turn that into a rejection reason.
+"""
+import csv
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+CENTS = Decimal('0.01')
+
+
+class CsvChunk:
+    """
+    Consecutive data rows of a CSV file. ``index`` numbers the rows from 0
+    across the whole file, blank lines excluded, like a DataFrame chunk.
+    """
+
+    def __init__(self, columns, index, rows):
+        self.columns = columns
+        self.index = index
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, name):
+        position = self.columns.index(name)
+        return [row[position] for row in self.rows]
+
+
+def iter_csv_chunks(file_path, chunksize):
+    """Yield the data rows of a CSV file as CsvChunks of at most ``chunksize`` rows, padded to the header width"""
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        columns = next(reader, None)
+        if columns is None:
+            return
+        width = len(columns)
+
+        rows, index = [], []
+        position = 0
+        for row in reader:
+            if not row:
+                continue
+            rows.append(row[:width] + [''] * (width - len(row)))
+            index.append(position)
+            position += 1
+            if len(rows) >= chunksize:
+                yield CsvChunk(columns, index, rows)
+                rows, index = [], []
+        if rows:
+            yield CsvChunk(columns, index, rows)
+
+
+def to_decimal(value):
+    """A finite Decimal rounded to paise, or None"""
+    try:
+        number = Decimal(value.strip())
+    except InvalidOperation:
+        return None
+    if not number.is_finite():
+        return None
+    try:
+        return number.quantize(CENTS)
+    except InvalidOperation:
+        # Too many digits to round, range checks reject it
+        return number
+
+
+def to_int(value):
+    """An integer, also written as e.g. ``3.0``, or None"""
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        number = Decimal(value.strip())
+    except InvalidOperation:
+        return None
+    if not number.is_finite() or number != number.to_integral_value():
+        return None
+    return int(number)
+
+
+def to_date(value):
+    """A date written in ISO 8601, with or without a time, or None"""
+    value = value.strip()
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return None
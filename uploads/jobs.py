@@ -0,0 +1,168 @@
+import logging
+import time
+from collections import deque, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .csv_processor import (
+    estimate_row_count, process_expense_csv, process_income_csv, process_department_csv, process_workbook,
+)
+from .models import UploadedFile
+from .signals import upload_processed
+
+logger = logging.getLogger(__name__)
+
+PROCESSORS = {
+    'EXPENSE': process_expense_csv,
+    'INCOME': process_income_csv,
+    'DEPARTMENT': process_department_csv,
+    'WORKBOOK': process_workbook,
+}
+
+
+# A kind of background job: ``claim()`` returns the next job or None, ``run(job)`` processes it.
+# ``waiting()``, if given, tells whether jobs are queued that claim() held back.
+JobQueue = namedtuple('JobQueue', ['name', 'claim', 'run', 'waiting'], defaults=[None])
+
+
+def fail_stale_jobs(model):
+    """
+    Mark rows of ``model`` FAILED that have been PROCESSING for longer than
+    BACKGROUND_JOB_TIMEOUT, their worker died without recording an outcome.
+    Returns the number of rows failed.
+    """
+    timeout = getattr(settings, 'BACKGROUND_JOB_TIMEOUT', 3 * 60 * 60)
+    now = timezone.now()
+    failed = model.objects.filter(status='PROCESSING', started_at__lt=now - timedelta(seconds=timeout)).update(
+        status='FAILED',
+        error_message=f'The worker stopped before finishing, no result after {timeout} seconds.',
+        finished_at=now,
+    )
+    if failed:
+        logger.warning(f"Marked {failed} stale {model._meta.verbose_name} job(s) as failed")
+    return failed
+
+
+def claim_next(model, order_by, *conditions):
+    """
+    Move the oldest PENDING row of ``model`` that matches ``conditions`` to
+    PROCESSING and return it, or None. Jobs left PROCESSING by a dead worker
+    are failed first (see fail_stale_jobs).
+
+    The claim is a conditional UPDATE, so several workers polling the same
+    table never pick up the same job.
+    """
+    fail_stale_jobs(model)
+    pending = model.objects.filter(*conditions, status='PENDING').order_by(order_by, 'pk')
+    for pk in pending.values_list('pk', flat=True)[:20]:
+        claimed = model.objects.filter(pk=pk, status='PENDING').update(
+            status='PROCESSING',
+            started_at=timezone.now(),
+        )
+        if claimed:
+            return model.objects.get(pk=pk)
+    return None
+
+
+def departments_settled():
+    """
+    Expense, income and workbook uploads wait until the department and
+    workbook uploads their user queued before them are done, as they may
+    reference the departments those add. Uploads of a batch are queued
+    departments first (see uploads.views). Other users' uploads never hold
+    them up, and a stale PROCESSING upload is failed by claim_next() first.
+    """
+    unfinished_departments = UploadedFile.objects.filter(
+        user=OuterRef('user'),
+        file_type__in=['DEPARTMENT', 'WORKBOOK'],
+        status__in=['PENDING', 'PROCESSING'],
+        uploaded_at__lte=OuterRef('uploaded_at'),
+    ).exclude(pk=OuterRef('pk'))
+    return Q(file_type='DEPARTMENT') | ~Exists(unfinished_departments)
+
+
+def claim_next_upload():
+    return claim_next(UploadedFile, 'uploaded_at', departments_settled())
+
+
+def uploads_waiting():
+    return UploadedFile.objects.filter(status='PENDING').exists()
+
+
+def run_upload(uploaded_file):
+    """Process a claimed upload and record the outcome on it"""
+    try:
+        file_path = uploaded_file.file.path
+        uploaded_file.total_rows = estimate_row_count(file_path)
+        UploadedFile.objects.filter(pk=uploaded_file.pk).update(total_rows=uploaded_file.total_rows)
+
+        PROCESSORS[uploaded_file.file_type](file_path, uploaded_file)
+
+        uploaded_file.status = 'PROCESSED'
+        uploaded_file.progress = 100
+    except ValueError as e:
+        uploaded_file.status = 'FAILED'
+        uploaded_file.error_message = f'File format error: {e}'
+    except Exception as e:
+        logger.exception(f"Upload {uploaded_file.pk} failed")
+        uploaded_file.status = 'FAILED'
+        uploaded_file.error_message = f'Error processing file: {e}'
+
+    uploaded_file.finished_at = timezone.now()
+    uploaded_file.save(update_fields=['status', 'progress', 'error_message', 'finished_at'])
+    # Chunks may have been committed even if the upload failed part way
+    upload_processed.send(sender=UploadedFile, uploaded_file=uploaded_file)
+    return uploaded_file
+
+
+upload_queue = JobQueue('upload', claim_next_upload, run_upload, uploads_waiting)
+
+
+def job_queues():
+    """The queues listed in settings.BACKGROUND_JOB_QUEUES, as dotted paths to JobQueue objects"""
+    paths = getattr(settings, 'BACKGROUND_JOB_QUEUES', ['uploads.jobs.upload_queue'])
+    return [import_string(path) for path in paths]
+
+
+def claim_next_job(queues):
+    """(queue, job) from the first queue with work, or (None, None)"""
+    for queue in queues:
+        job = queue.claim()
+        if job is not None:
+            return queue, job
+    return None, None
+
+
+def worker_loop(poll_interval=2.0, once=False):
+    """
+    Process queued jobs of every queue until interrupted.
+
+    Queues are polled in turn, starting after the one that ran the last job,
+    so a long backlog of one kind does not starve the others. With ``once``
+    the loop exits as soon as every queue is empty, not while jobs only
+    wait for others to finish.
+    """
+    import django
+    # No-op in the parent, required in processes started with "spawn"
+    django.setup()
+
+    queues = deque(job_queues())
+    while True:
+        close_old_connections()
+        queue, job = claim_next_job(queues)
+        if job is None:
+            if once and not any(queue.waiting and queue.waiting() for queue in queues):
+                return
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"Running {queue.name} job {job.pk}")
+        queue.run(job)
+        logger.info(f"{queue.name.capitalize()} job {job.pk} finished with status {job.status}")
+        while queues[-1] is not queue:
+            queues.rotate(-1)
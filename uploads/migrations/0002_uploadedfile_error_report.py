@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='processing_details',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='records_skipped',
+            field=models.IntegerField(default=0),
+        ),
+    ]
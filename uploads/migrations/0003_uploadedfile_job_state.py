@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+def set_existing_status(apps, schema_editor):
+    """Uploads made before the job queue were processed inline, never re-queue them"""
+    UploadedFile = apps.get_model('uploads', 'UploadedFile')
+    UploadedFile.objects.filter(processed=True).update(status='PROCESSED', progress=100)
+    UploadedFile.objects.filter(processed=False).update(status='FAILED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0002_uploadedfile_error_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='error_message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Queued'), ('PROCESSING', 'Processing'), ('PROCESSED', 'Processed'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='total_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(set_existing_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.1 on 2026-10-18 19:01
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_existing_files(apps, schema_editor):
+    """Hash stored uploads so re-uploading them is caught, files no longer on disk are left blank"""
+    UploadedFile = apps.get_model('uploads', 'UploadedFile')
+    for uploaded_file in UploadedFile.objects.exclude(file='').iterator():
+        digest = hashlib.sha256()
+        try:
+            with uploaded_file.file.open('rb') as f:
+                for block in f.chunks():
+                    digest.update(block)
+        except OSError:
+            continue
+        UploadedFile.objects.filter(pk=uploaded_file.pk).update(content_hash=digest.hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0003_uploadedfile_job_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='records_duplicate',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(hash_existing_files, migrations.RunPython.noop),
+    ]
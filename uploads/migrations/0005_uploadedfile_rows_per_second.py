@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0004_uploadedfile_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='rows_per_second',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('uploads', '0005_uploadedfile_rows_per_second'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='sheet_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='uploadedfile',
+            name='file_type',
+            field=models.CharField(choices=[('EXPENSE', 'Expense Data'), ('INCOME', 'Income Data'), ('DEPARTMENT', 'Department Data'), ('WORKBOOK', 'Accounting Workbook')], max_length=20),
+        ),
+    ]
@@ -6,6 +6,14 @@ class UploadedFile(models.Model):
         ('EXPENSE', 'Expense Data'),
         ('INCOME', 'Income Data'),
         ('DEPARTMENT', 'Department Data'),
+        ('WORKBOOK', 'Accounting Workbook'),
+    )
+
+    STATUS_CHOICES = (
+        ('PENDING', 'Queued'),
+        ('PROCESSING', 'Processing'),
+        ('PROCESSED', 'Processed'),
+        ('FAILED', 'Failed'),
     )
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -14,6 +22,23 @@ class UploadedFile(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processed = models.BooleanField(default=False)
     records_processed = models.IntegerField(default=0)
+    records_skipped = models.IntegerField(default=0)
+    records_duplicate = models.IntegerField(default=0)
+    # SHA-256 of the file, identical re-uploads are rejected on arrival
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    processing_details = models.TextField(blank=True)
+    # Rows read per second of processing, stored or not
+    rows_per_second = models.FloatField(null=True, blank=True)
+    # Workbooks: {sheet title: {'processed': n, 'skipped': n, 'duplicate': n}}
+    sheet_counts = models.JSONField(default=dict, blank=True)
+
+    # Background job state, see uploads.jobs
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    total_rows = models.IntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"{self.file_type} - {self.file.name}"
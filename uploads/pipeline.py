@@ -0,0 +1,76 @@
+"""
+Pipelined validation of upload chunks.
+
+Processed sequentially, an upload reads a chunk, validates it and writes it
+before reading the next, on one core. pipelined() overlaps the three stages:
+a reader thread pulls chunks from the file and submits each one to a process
+pool for validation, while the caller, the single database writer, takes
+the results in file order from a bounded queue. At most ``depth`` chunks are
+read ahead, so a slow writer holds the reader back instead of the whole file
+piling up in memory.
+"""
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_DONE = object()
+
+
+def _setup_django():
+    import django
+    # No-op in forked workers, required in processes started with "spawn"
+    django.setup()
+
+
+def pipelined(chunks, coerce, workers, depth=None):
+    """
+    Yield ``(chunk, coerce(chunk))`` for every item of ``chunks``, in order,
+    with ``coerce`` running in ``workers`` processes ahead of the caller.
+
+    ``coerce`` must be picklable, e.g. a module level function or a partial
+    of one, and must not use the database. Errors of the reader or of
+    ``coerce`` are raised in the caller when it reaches the failing chunk.
+    """
+    depth = depth or workers * 2
+    pending = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_setup_django)
+
+    def put(item):
+        # Give up once the caller has stopped taking items
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read():
+        try:
+            for chunk in chunks:
+                if not put((chunk, pool.submit(coerce, chunk))):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+        put(_DONE)
+
+    reader = threading.Thread(target=read, name='upload-reader', daemon=True)
+    reader.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            chunk, future = item
+            yield chunk, future.result()
+    finally:
+        stop.set()
+        reader.join()
+        pool.shutdown(wait=True, cancel_futures=True)
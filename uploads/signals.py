@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent by uploads.jobs once an upload has been processed, successfully or not.
+# Bulk inserts bypass model signals, receivers use this to refresh derived data.
+upload_processed = Signal()
+
+# Sent by uploads.csv_processor inside the transaction of every chunk it writes,
+# with the model of the rows (Expense, Income or Department) as sender.
+rows_imported = Signal()
@@ -1,3 +1,499 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from finance.models import Department, Expense, Income
+
+from .batch import MAX_ARCHIVE_SIZE, detect_file_type
+from . import csv_processor
+from .csv_processor import _iter_chunks, process_department_csv, process_expense_csv, process_workbook
+from .jobs import claim_next_upload, run_upload
+from .models import UploadedFile
+
+
+def process_rows(test, processor, file_type, header, rows, **kwargs):
+    """Run ``processor`` on a CSV of ``rows`` in chunks of two rows and return the refreshed UploadedFile"""
+    handle, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(handle, 'w') as f:
+        f.write(header + '\n' + ''.join(f'{row}\n' for row in rows))
+    test.addCleanup(os.remove, path)
+    uploaded_file = UploadedFile.objects.create(user=test.admin, file_type=file_type)
+    processor(path, uploaded_file, chunksize=2, **kwargs)
+    uploaded_file.refresh_from_db()
+    return uploaded_file
+
+
+class BulkIngestionTests(TestCase):
+    """Expense/income files are validated as a whole and stored with a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def process(self, rows, suffix='.csv'):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        header = ['department_id', 'expense_type', 'amount', 'date']
+        if suffix == '.csv':
+            with open(path, 'w') as f:
+                f.write(','.join(header) + '\n' + ''.join(','.join(row) + '\n' for row in rows))
+        else:
+            from openpyxl import Workbook
+
+            workbook = Workbook()
+            for row in [header, *rows]:
+                workbook.active.append(list(row))
+            workbook.save(path)
+        uploaded_file = UploadedFile.objects.create(user=self.admin, file_type='EXPENSE')
+        with CaptureQueriesContext(connection) as queries:
+            process_expense_csv(path, uploaded_file)
+        uploaded_file.refresh_from_db()
+        return uploaded_file, len(queries)
+
+    def test_rejected_rows_are_reported_by_row_and_reason(self):
+        pk = str(self.cardiology.pk)
+        rows = [
+            (pk, 'Supplies', '40', '2024-03-01'),
+            ('x', 'Supplies', '40', '2024-03-01'),
+            ('9999', 'Supplies', '40', '2024-03-01'),
+            (pk, '', '40', '2024-03-01'),
+            (pk, 'Supplies', 'abc', '2024-03-01'),
+            (pk, 'Supplies', '1e9', '2024-03-01'),
+            (pk, 'Supplies', '40', 'not a date'),
+            (pk, 'Linen', '15.5', '2024-03-02'),
+        ]
+        expected = [
+            'Row 3: invalid department_id',
+            'Row 4: department does not exist',
+            'Row 5: missing expense_type',
+            'Row 6: invalid amount',
+            'Row 7: amount out of range',
+            'Row 8: invalid date',
+        ]
+
+        for suffix in ('.csv', '.xlsx'):
+            with self.subTest(suffix=suffix):
+                uploaded_file, _ = self.process(rows, suffix)
+
+                self.assertEqual((uploaded_file.records_processed, uploaded_file.records_skipped), (2, 6))
+                self.assertEqual(uploaded_file.processing_details.splitlines(), expected)
+                self.assertEqual(
+                    sorted(Expense.objects.values_list('expense_type', 'amount')),
+                    [('Linen', Decimal('15.50')), ('Supplies', Decimal('40.00'))],
+                )
+                Expense.objects.all().delete()
+
+    def test_queries_do_not_grow_with_the_rows(self):
+        pk = str(self.cardiology.pk)
+        _, few = self.process([(pk, 'Supplies', str(amount), '2024-03-01') for amount in range(1, 6)])
+        many_file, many = self.process([(pk, 'Linen', str(amount), '2024-04-01') for amount in range(1, 101)])
+
+        self.assertEqual(many_file.records_processed, 100)
+        self.assertEqual(many, few)
+
+
+class ChunkedReadingTests(TestCase):
+    """Files are read, committed and reported chunk by chunk with the same result for any chunk size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def write(self, suffix, rows):
+        """Path of a CSV or .xlsx file of ``rows``, header row first, empty tuples as blank rows"""
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        if suffix == '.csv':
+            with open(path, 'w') as f:
+                f.write(''.join(','.join(map(str, row)) + '\n' for row in rows))
+        else:
+            from openpyxl import Workbook
+
+            workbook = Workbook()
+            for row in rows:
+                workbook.active.append(row or [None])
+            workbook.save(path)
+        return path
+
+    def rows(self):
+        pk = self.cardiology.pk
+        return [
+            ('department_id', 'expense_type', 'amount', 'date'),
+            (pk, 'Supplies', 10, '2024-03-01'),
+            (pk, 'Linen', 20, '2024-03-02'),
+            (),
+            (pk, 'Supplies', 'abc', '2024-03-03'),
+            (pk, 'Supplies', 10, '2024-03-01'),
+            (pk, 'Gloves', 30, '2024-03-05'),
+        ]
+
+    def process(self, path, chunksize):
+        uploaded_file = UploadedFile.objects.create(user=self.admin, file_type='EXPENSE')
+        process_expense_csv(path, uploaded_file, chunksize=chunksize)
+        uploaded_file.refresh_from_db()
+        return uploaded_file
+
+    def test_blank_rows_do_not_split_chunks(self):
+        for suffix in ('.csv', '.xlsx'):
+            path = self.write(suffix, self.rows())
+            for chunksize, lengths in ((2, [2, 2, 1]), (5, [5]), (100, [5])):
+                with self.subTest(suffix=suffix, chunksize=chunksize):
+                    chunks = list(_iter_chunks(path, chunksize))
+                    self.assertEqual([len(chunk) for chunk in chunks], lengths)
+                    index = [position for chunk in chunks for position in chunk.index]
+                    self.assertEqual(index, sorted(set(index)))
+
+    def test_progress_is_committed_after_every_chunk(self):
+        path = self.write('.csv', self.rows())
+        progress = []
+        report = csv_processor._report_progress
+
+        def record(uploaded_file, *counts):
+            report(uploaded_file, *counts)
+            progress.append((*counts, Expense.objects.count()))
+
+        with patch.object(csv_processor, '_report_progress', record):
+            uploaded_file = self.process(path, chunksize=2)
+
+        # (processed, skipped, duplicates, stored rows) after each of the three chunks
+        self.assertEqual(progress, [(2, 0, 0, 2), (3, 1, 0, 3), (4, 1, 0, 4)])
+        self.assertEqual((uploaded_file.records_processed, uploaded_file.records_skipped), (4, 1))
+        self.assertIn('Row 4: invalid amount', uploaded_file.processing_details)
+
+    def test_result_does_not_depend_on_the_chunk_size(self):
+        for suffix in ('.csv', '.xlsx'):
+            path = self.write(suffix, self.rows())
+            first = self.process(path, chunksize=2)
+            again = self.process(path, chunksize=3)
+
+            self.assertEqual((first.records_processed, first.records_skipped, first.records_duplicate), (4, 1, 0))
+            # The repeated Supplies row keeps its occurrence number across chunk boundaries
+            self.assertEqual((again.records_processed, again.records_skipped, again.records_duplicate), (0, 1, 4))
+            self.assertEqual(Expense.objects.count(), 4)
+            Expense.objects.all().delete()
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReuploadDeduplicationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def process(self, rows):
+        return process_rows(self, process_expense_csv, 'EXPENSE', 'department_id,expense_type,amount,date', rows)
+
+    def test_overlapping_file_only_inserts_new_rows(self):
+        pk = self.cardiology.pk
+        self.process([f'{pk},Supplies,40,2024-03-01', f'{pk},Supplies,40,2024-03-01', f'{pk},Linen,15,2024-03-02'])
+
+        uploaded_file = self.process([
+            f'{pk},Supplies,40.00,2024-03-01',
+            f'{pk},Linen,15,2024-03-02',
+            f'{pk},Supplies,40,2024-03-01',
+            f'{pk},Supplies,40,2024-03-01',
+            f'{pk},Gloves,9,2024-03-03',
+        ])
+
+        self.assertEqual(uploaded_file.records_processed, 2)
+        self.assertEqual(uploaded_file.records_duplicate, 3)
+        self.assertEqual(Expense.objects.filter(expense_type='Supplies').count(), 3)
+        self.assertEqual(Expense.objects.count(), 5)
+        self.assertEqual(Expense.objects.values('fingerprint').distinct().count(), 5)
+
+    def test_saved_rows_are_fingerprinted_like_uploaded_ones(self):
+        Expense.objects.create(department=self.cardiology, expense_type='Supplies', amount=40, date=date(2024, 3, 1))
+
+        uploaded_file = self.process([f'{self.cardiology.pk},Supplies,40,2024-03-01'] * 2)
+
+        self.assertEqual(uploaded_file.records_duplicate, 1)
+        self.assertEqual(Expense.objects.count(), 2)
+
+    def test_identical_file_is_rejected_on_arrival(self):
+        self.client.force_login(self.admin)
+        content = f'department_id,expense_type,amount,date\n{self.cardiology.pk},Supplies,40,2024-03-01\n'.encode()
+
+        for _ in range(2):
+            self.client.post(reverse('upload'), {
+                'file': SimpleUploadedFile('march.csv', content, content_type='text/csv'),
+                'file_type': 'EXPENSE',
+            })
+
+        self.assertEqual(UploadedFile.objects.count(), 1)
+
+
+class DepartmentReferenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def test_department_import_ignores_existing_and_repeated_names(self):
+        uploaded_file = process_rows(
+            self, process_department_csv, 'DEPARTMENT', 'name',
+            ['Cardiology', ' Radiology ', 'Radiology', '" "', 'Pharmacy'],
+        )
+
+        self.assertEqual(sorted(Department.objects.values_list('name', flat=True)), ['Cardiology', 'Pharmacy', 'Radiology'])
+        self.assertEqual(uploaded_file.records_processed, 4)
+        self.assertEqual(uploaded_file.records_skipped, 1)
+
+    def test_transactions_reference_departments_by_name(self):
+        uploaded_file = process_rows(
+            self, process_expense_csv, 'EXPENSE', 'department,expense_type,amount,date',
+            ['Cardiology,Supplies,40,2024-03-01', ' Cardiology ,Linen,15,2024-03-02', 'Oncology,Supplies,40,2024-03-01'],
+        )
+
+        self.assertEqual(Expense.objects.filter(department=self.cardiology).count(), 2)
+        self.assertEqual(uploaded_file.records_skipped, 1)
+        self.assertIn('Row 4: department does not exist', uploaded_file.processing_details)
+
+    def test_names_match_like_the_database_compares_them(self):
+        Department.objects.create(name='Médecine')
+
+        uploaded_file = process_rows(
+            self, process_expense_csv, 'EXPENSE', 'department,expense_type,amount,date',
+            ['cardiology,Supplies,40,2024-03-01', 'CARDIOLOGY ,Linen,15,2024-03-02', 'Medecine,Supplies,40,2024-03-01'],
+        )
+        self.assertEqual(uploaded_file.records_processed, 3)
+        self.assertEqual(Expense.objects.filter(department=self.cardiology).count(), 2)
+
+        process_rows(self, process_department_csv, 'DEPARTMENT', 'name', ['Oncology', 'ONCOLOGY', 'oncology '])
+        self.assertEqual(Department.objects.filter(name__iexact='oncology').count(), 1)
+
+
+class PipelinedProcessingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiology = Department.objects.create(name='Cardiology')
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def test_pipelined_upload_matches_sequential_one(self):
+        pk = self.cardiology.pk
+        rows = [
+            f'{pk},Supplies,40,2024-03-01', f'{pk},Linen,abc,2024-03-02', f'{pk},Supplies,40,2024-03-01',
+            f'{pk},Gloves,9,03/04/2024', f'{pk},Gloves,9,2024-03-05', f'{pk + 1},Linen,15,2024-03-06',
+            f'{pk},Linen,15,2024-03-06',
+        ]
+        header = 'department_id,expense_type,amount,date'
+
+        pipelined = process_rows(self, process_expense_csv, 'EXPENSE', header, rows, workers=2)
+        stored = sorted(Expense.objects.values_list('expense_type', 'amount', 'date', 'fingerprint'))
+        Expense.objects.all().delete()
+        sequential = process_rows(self, process_expense_csv, 'EXPENSE', header, rows, workers=0)
+
+        self.assertEqual(sorted(Expense.objects.values_list('expense_type', 'amount', 'date', 'fingerprint')), stored)
+        for field in ('records_processed', 'records_skipped', 'records_duplicate', 'processing_details'):
+            self.assertEqual(getattr(pipelined, field), getattr(sequential, field), field)
+        self.assertEqual(pipelined.records_processed, 5)
+        self.assertGreater(pipelined.rows_per_second, 0)
+
+    def test_pipelined_upload_reports_missing_columns(self):
+        with self.assertRaisesMessage(ValueError, 'Missing required columns'):
+            process_rows(self, process_expense_csv, 'EXPENSE', 'department_id,amount,date', ['1,40,2024-03-01'], workers=2)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class BatchUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def post(self, *files):
+        self.client.force_login(self.admin)
+        return self.client.post(reverse('upload'), {'file': list(files), 'file_type': 'AUTO'})
+
+    def test_page_only_limits_archives_to_the_server_maximum(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('upload'))
+
+        self.assertContains(response, f'const maxArchiveSize = {MAX_ARCHIVE_SIZE};')
+        self.assertNotContains(response, '10 * 1024 * 1024')
+
+    def test_archive_is_queued_by_header_with_departments_first(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('march/expenses.csv', 'department,expense_type,amount,date\nNeurology,Supplies,40,2024-03-01\n')
+            zf.writestr('march/departments.csv', 'name\nNeurology\n')
+            zf.writestr('__MACOSX/march/._departments.csv', 'resource fork')
+        self.post(SimpleUploadedFile('march.zip', archive.getvalue(), content_type='application/zip'))
+
+        self.assertEqual(sorted(UploadedFile.objects.values_list('file_type', flat=True)), ['DEPARTMENT', 'EXPENSE'])
+        department_upload = claim_next_upload()
+        self.assertEqual(department_upload.file_type, 'DEPARTMENT')
+        # The expense file may reference the new department, it waits until that upload is done
+        self.assertIsNone(claim_next_upload())
+
+        run_upload(department_upload)
+        run_upload(claim_next_upload())
+
+        self.assertEqual(Expense.objects.get().department.name, 'Neurology')
+
+    def test_other_users_department_uploads_do_not_hold_up_the_queue(self):
+        other = User.objects.create_user(username='other', password='pass', role='ADMIN')
+        UploadedFile.objects.create(user=other, file_type='DEPARTMENT', status='PROCESSING', started_at=timezone.now())
+        expense_upload = UploadedFile.objects.create(user=self.admin, file_type='EXPENSE')
+
+        self.assertEqual(claim_next_upload(), expense_upload)
+
+    def test_corrupt_archive_members_are_rejected_one_by_one(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('departments.csv', 'name\nNeurology\n')
+            zf.writestr('expenses.csv', 'department,expense_type,amount,date\n' + 'Neurology,Supplies,40,2024-03-01\n' * 50)
+        content = bytearray(archive.getvalue())
+        # Garble the deflate stream of the second member, its header stays readable
+        with zipfile.ZipFile(io.BytesIO(bytes(content))) as zf:
+            info = zf.getinfo('expenses.csv')
+        data_start = info.header_offset + 30 + len(info.filename.encode()) + len(info.extra)
+        content[data_start:data_start + 8] = b'\xff' * 8
+
+        response = self.post(SimpleUploadedFile('march.zip', bytes(content), content_type='application/zip'))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(UploadedFile.objects.values_list('file_type', flat=True)), ['DEPARTMENT'])
+
+    def test_unrecognised_files_are_rejected_one_by_one(self):
+        self.post(
+            SimpleUploadedFile('income.csv', b'department_id,service_type,amount,date\n', content_type='text/csv'),
+            SimpleUploadedFile('notes.csv', b'author,comment\n', content_type='text/csv'),
+            SimpleUploadedFile('notes.txt', b'month-end', content_type='text/plain'),
+        )
+
+        self.assertEqual(list(UploadedFile.objects.values_list('file_type', flat=True)), ['INCOME'])
+
+
+class WorkbookImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def workbook(self, sheets):
+        """Path of an .xlsx file with ``{title: rows}`` as its sheets, header row first"""
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+        for title, rows in sheets.items():
+            worksheet = workbook.create_sheet(title)
+            for row in rows:
+                worksheet.append(row)
+        handle, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(handle)
+        workbook.save(path)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def process(self, path):
+        uploaded_file = UploadedFile.objects.create(user=self.admin, file_type='WORKBOOK')
+        process_workbook(path, uploaded_file, chunksize=2)
+        uploaded_file.refresh_from_db()
+        return uploaded_file
+
+    def test_sheets_are_imported_in_dependency_order(self):
+        path = self.workbook({
+            'Income': [['department', 'service_type', 'amount', 'date'], ['Neurology', 'Consultation', 250, '2024-03-01']],
+            'Expenses': [
+                ['department', 'expense_type', 'amount', 'date'],
+                ['Neurology', 'Supplies', 40, '2024-03-01'],
+                ['Neurology', 'Linen', 'abc', '2024-03-02'],
+                ['Oncology', 'Supplies', 15, '2024-03-03'],
+            ],
+            'departments': [['name'], ['Neurology']],
+        })
+        with open(path, 'rb') as f:
+            self.assertEqual(detect_file_type(ContentFile(f.read(), name='march.xlsx')), 'WORKBOOK')
+
+        uploaded_file = self.process(path)
+
+        self.assertEqual(uploaded_file.sheet_counts, {
+            'Departments': {'processed': 1, 'skipped': 0},
+            'Expenses': {'processed': 1, 'skipped': 2, 'duplicate': 0},
+            'Income': {'processed': 1, 'skipped': 0, 'duplicate': 0},
+        })
+        self.assertEqual((uploaded_file.records_processed, uploaded_file.records_skipped), (3, 2))
+        self.assertIn('Expenses: Row 3: invalid amount', uploaded_file.processing_details)
+        self.assertEqual(Expense.objects.get().department.name, 'Neurology')
+        self.assertEqual(Income.objects.get().department.name, 'Neurology')
+
+    def test_failing_sheet_rolls_back_the_whole_workbook(self):
+        path = self.workbook({
+            'Departments': [['name'], ['Neurology']],
+            'Expenses': [['department', 'expense_type', 'amount', 'date'], ['Neurology', 'Supplies', 40, '2024-03-01']],
+            'Income': [['department', 'amount', 'date'], ['Neurology', 250, '2024-03-01']],
+        })
+
+        with self.assertRaisesMessage(ValueError, 'Missing required columns'):
+            self.process(path)
+
+        self.assertFalse(Department.objects.exists())
+        self.assertFalse(Expense.objects.exists())
+
+
+class JobClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    def test_racing_workers_claim_each_job_exactly_once(self):
+        jobs = [UploadedFile.objects.create(user=self.admin, file_type='EXPENSE') for _ in range(2)]
+        update = QuerySet.update
+        claimed_meanwhile = []
+
+        def update_after_another_worker(queryset, **kwargs):
+            # The other worker runs between this worker's read of the queue and its claim
+            if kwargs.get('status') == 'PROCESSING' and not claimed_meanwhile:
+                claimed_meanwhile.append(None)
+                claimed_meanwhile[0] = claim_next_upload()
+            return update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', autospec=True, side_effect=update_after_another_worker):
+            claimed = claim_next_upload()
+
+        self.assertEqual(claimed_meanwhile, [jobs[0]])
+        self.assertEqual(claimed, jobs[1])
+        self.assertEqual(set(UploadedFile.objects.values_list('status', flat=True)), {'PROCESSING'})
+        self.assertIsNone(claim_next_upload())
+
+
+class StaleJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='pass', role='ADMIN')
+
+    @override_settings(BACKGROUND_JOB_TIMEOUT=600)
+    def test_job_of_a_dead_worker_is_failed_on_the_next_claim(self):
+        stale = UploadedFile.objects.create(
+            user=self.admin, file_type='EXPENSE', status='PROCESSING', started_at=timezone.now() - timedelta(hours=1),
+        )
+        running = UploadedFile.objects.create(
+            user=self.admin, file_type='EXPENSE', status='PROCESSING', started_at=timezone.now() - timedelta(minutes=5),
+        )
+        queued = UploadedFile.objects.create(user=self.admin, file_type='EXPENSE')
+
+        self.assertEqual(claim_next_upload(), queued)
+
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, 'FAILED')
+        self.assertIn('worker stopped', stale.error_message)
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(running.status, 'PROCESSING')
@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import upload_file, upload_history
+from .views import upload_file, upload_history, upload_status
 
 urlpatterns = [
     path('upload/', upload_file, name='upload'),
     path('history/', upload_history, name='upload_history'),
+    path('status/', upload_status, name='upload_status'),
 ]
@@ -1,73 +1,126 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from .batch import ALLOWED_EXTENSIONS, MAX_ARCHIVE_SIZE, QUEUE_ORDER, detect_file_type, expand_archives
+from .csv_processor import content_hash
 from .models import UploadedFile
-from .csv_processor import process_expense_csv, process_income_csv, process_department_csv
 import os
 from accounts.decorators import admin_required, admin_or_expense_user_required, admin_or_income_user_required
 
+def _type_denied(user_role, file_type):
+    """Why ``user_role`` may not upload ``file_type`` files, None if it may"""
+    if file_type == 'DEPARTMENT' and user_role != 'ADMIN':
+        return 'Only administrators can upload department data.'
+    elif file_type == 'EXPENSE' and user_role not in ['ADMIN', 'EXPENSE_USER']:
+        return 'Access denied. Insufficient privileges for expense uploads.'
+    elif file_type == 'INCOME' and user_role not in ['ADMIN', 'INCOME_USER']:
+        return 'Access denied. Insufficient privileges for income uploads.'
+    elif file_type == 'WORKBOOK' and user_role != 'ADMIN':
+        return 'Only administrators can upload accounting workbooks.'
+    return None
+
 @login_required
 def upload_file(request):
+    """
+    Queue one or more files, or ZIP archives of them. With file_type AUTO
+    the type of each file is detected from its header row.
+    """
     if request.method == 'POST':
-        file = request.FILES.get('file')
-        file_type = request.POST.get('file_type')
+        files = request.FILES.getlist('file')
+        requested_type = request.POST.get('file_type')
 
-        if not file or not file_type:
+        if not files or not requested_type:
             messages.error(request, 'Please select a file and file type.')
             return redirect('upload')
-
-        # Check user permissions based on file type
-        user_role = request.user.role
-        if file_type == 'DEPARTMENT' and user_role != 'ADMIN':
-            messages.error(request, 'Only administrators can upload department data.')
-            return redirect('upload')
-        elif file_type == 'EXPENSE' and user_role not in ['ADMIN', 'EXPENSE_USER']:
-            messages.error(request, 'Access denied. Insufficient privileges for expense uploads.')
-            return redirect('upload')
-        elif file_type == 'INCOME' and user_role not in ['ADMIN', 'INCOME_USER']:
-            messages.error(request, 'Access denied. Insufficient privileges for income uploads.')
+        if requested_type != 'AUTO' and requested_type not in dict(UploadedFile.FILE_TYPES):
+            messages.error(request, 'Unknown file type.')
             return redirect('upload')
 
-        # Validate file extension
-        allowed_extensions = ['.csv', '.xlsx', '.xls']
-        file_extension = os.path.splitext(file.name)[1].lower()
+        files, errors = expand_archives(files)
+        accepted = []
+        for file in files:
+            # Validate file extension
+            if os.path.splitext(file.name)[1].lower() not in ALLOWED_EXTENSIONS:
+                errors.append(f'{file.name}: Only CSV and Excel files are allowed.')
+                continue
 
-        if file_extension not in allowed_extensions:
-            messages.error(request, 'Only CSV and Excel files are allowed.')
-            return redirect('upload')
+            file_type = detect_file_type(file) if requested_type == 'AUTO' else requested_type
+            if file_type is None:
+                errors.append(f'{file.name}: could not tell the data type from its header row.')
+                continue
+            if file_type == 'WORKBOOK' and not file.name.lower().endswith('.xlsx'):
+                errors.append(f'{file.name}: accounting workbooks must be Excel (.xlsx) files.')
+                continue
 
-        # Save uploaded file record
-        uploaded_file = UploadedFile.objects.create(
-            user=request.user,
-            file=file,
-            file_type=file_type
-        )
+            # Check user permissions based on file type
+            denied = _type_denied(request.user.role, file_type)
+            if denied:
+                errors.append(f'{file.name}: {denied}' if len(files) > 1 else denied)
+                continue
+            accepted.append((file_type, file))
 
-        try:
-            file_path = uploaded_file.file.path
+        # Departments are queued first, the other files of the batch wait for them
+        accepted.sort(key=lambda item: QUEUE_ORDER.get(item[0], len(QUEUE_ORDER)))
+        queued = []
+        with transaction.atomic():
+            for file_type, file in accepted:
+                # Identical files are rejected before they are stored or parsed
+                file_hash = content_hash(file)
+                previous = (
+                    UploadedFile.objects.filter(content_hash=file_hash, file_type=file_type)
+                    .exclude(status='FAILED')
+                    .order_by('uploaded_at')
+                    .first()
+                )
+                if previous:
+                    messages.warning(
+                        request,
+                        f'{file.name} is identical to a file uploaded on '
+                        f'{previous.uploaded_at:%b %d, %Y}, it was not processed again.'
+                    )
+                    continue
 
-            if file_type == 'EXPENSE':
-                processed_count = process_expense_csv(file_path, uploaded_file)
-                messages.success(request, f'Successfully processed {processed_count} expense records.')
-            elif file_type == 'INCOME':
-                processed_count = process_income_csv(file_path, uploaded_file)
-                messages.success(request, f'Successfully processed {processed_count} income records.')
-            elif file_type == 'DEPARTMENT':
-                processed_count = process_department_csv(file_path, uploaded_file)
-                messages.success(request, f'Successfully processed {processed_count} department records.')
+                # Save uploaded file record, processing happens in the background worker
+                UploadedFile.objects.create(
+                    user=request.user,
+                    file=file,
+                    file_type=file_type,
+                    content_hash=file_hash,
+                )
+                queued.append(file.name)
 
-        except ValueError as e:
-            messages.error(request, f'File format error: {str(e)}')
-        except Exception as e:
-            messages.error(request, f'Error processing file: {str(e)}')
-            # Clean up the uploaded file record if processing failed
-            uploaded_file.delete()
+        for error in errors:
+            messages.error(request, error)
+        if len(queued) == 1:
+            messages.info(request, f'{queued[0]} has been queued for processing. Progress is shown below.')
+        elif queued:
+            messages.info(request, f'{len(queued)} files have been queued for processing. Progress is shown below.')
 
+        if errors and not queued:
+            return redirect('upload')
         return redirect('upload_history')
 
-    return render(request, 'uploads/upload_new.html')
+    return render(request, 'uploads/upload_new.html', {'max_archive_size': MAX_ARCHIVE_SIZE})
 
 @login_required
 def upload_history(request):
     uploads = UploadedFile.objects.filter(user=request.user).order_by('-uploaded_at')
-    return render(request, 'uploads/history_new.html', {'uploads': uploads})
+    stats = uploads.aggregate(
+        total=Count('id'),
+        processed=Count('id', filter=Q(status='PROCESSED')),
+        in_progress=Count('id', filter=Q(status__in=['PENDING', 'PROCESSING'])),
+        failed=Count('id', filter=Q(status='FAILED')),
+    )
+    return render(request, 'uploads/history_new.html', {'uploads': uploads, 'stats': stats})
+
+@login_required
+def upload_status(request):
+    """Progress of the current user's uploads, polled by the history page"""
+    ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.isdigit()]
+    uploads = UploadedFile.objects.filter(user=request.user, id__in=ids).values(
+        'id', 'status', 'progress', 'records_processed', 'records_skipped', 'error_message'
+    )
+    return JsonResponse({'uploads': list(uploads)})